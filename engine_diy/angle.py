@@ -121,3 +121,38 @@ class Angle(object):
     def fromRadians(radians):
         return Angle(radians * 180 / math.pi)
 
+
+# Binary Angle Measurement
+#
+# Doom's angles are unsigned 32 bit integers covering a full
+# turn, so 0x40000000 is 90 degrees and wrapping around is a
+# mask instead of a modulo and a loop. Trig goes through
+# tables indexed by the top 13 bits of an angle:
+#   finesine     sin for 5/4 of a turn, finecosine is the
+#                same table a quarter turn further in
+#   finetangent  tan over -90 to 90 degrees
+#   tantoangle   atan of slopes 0 - 1 in 1/2048 steps, used
+#                by ViewTransform.pointsToAngles
+# The tables hold floats rather than 16.16 fixed point since
+# the renderers here work in floats. doomhistory works on the
+# raw BAM integers and these tables, there is no angle object
+
+ANG45 = 0x20000000
+ANG90 = 0x40000000
+ANG180 = 0x80000000
+ANG270 = 0xC0000000
+ANGLEMASK = 0xFFFFFFFF
+BAMPERDEG = 0x100000000 / 360
+
+FINEANGLES = 8192
+FINEMASK = FINEANGLES - 1
+ANGLETOFINESHIFT = 19 # BAM >> 19 = fine angle
+SLOPERANGE = 2048
+
+finesine = [math.sin((i + 0.5) * 2 * math.pi / FINEANGLES) for i in range(FINEANGLES * 5 // 4)]
+finecosine = finesine[FINEANGLES // 4:]
+finetangent = [math.tan((i - FINEANGLES // 4 + 0.5) * 2 * math.pi / FINEANGLES) for i in range(FINEANGLES // 2)]
+tantoangle = [int(math.atan(i / SLOPERANGE) * 0x100000000 / (2 * math.pi)) for i in range(SLOPERANGE + 1)]
+
+def degToBam(deg):
+    return int(round(deg * BAMPERDEG)) & ANGLEMASK
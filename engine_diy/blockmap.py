@@ -0,0 +1,219 @@
+import numpy as np
+
+# BLOCKMAP spatial index
+#
+# Doom cuts the map into a grid of 128x128 unit cells and stores
+# for every cell the linedefs that touch it. The lump is:
+#
+#   int16  originX, originY, columns, rows
+#   uint16 offsets[columns * rows]   (in 2 byte words from lump start)
+#   blocklists: 0x0000, linedef ids ..., 0xFFFF
+#
+# Large maps overflow the 16 bit offsets and some WADs ship
+# without a blockmap at all, in both cases the grid is rebuilt
+# from the LINEDEFS
+#
+# Cells are kept in CSR form: the linedefs of cell c are
+# cellLines[cellOffsets[c]:cellOffsets[c + 1]]
+
+class Blockmap(object):
+    CELLSIZE = 128
+
+    def __init__(self):
+        self.originX = 0
+        self.originY = 0
+        self.columns = 0
+        self.rows = 0
+        self.cellOffsets = None # int32 (columns * rows + 1)
+        self.cellLines = None # int32 linedef ids
+        self.thingOffsets = None # int32 (columns * rows + 1)
+        self.cellThings = None # int32 thing ids
+        self.generated = False
+
+    # parses the lump, falls back to generating the grid from
+    # the map's linedefs when it is missing or overflowed
+    def fromLump(data, map):
+        blockmap = Blockmap()
+        if blockmap.parse(data) is False:
+            blockmap.generate(map)
+        blockmap.linkThings(map)
+        return blockmap
+
+    def parse(self, data):
+        if len(data) < 8:
+            return False
+        words = np.frombuffer(data[:len(data) // 2 * 2], dtype='<u2')
+        originX, originY, columns, rows = words[0:4].astype(np.int16).tolist()
+        cellCount = columns * rows
+        if columns <= 0 or rows <= 0 or len(words) < 4 + cellCount:
+            return False
+        offsets = words[4:4 + cellCount].astype(np.int64)
+        # every blocklist must sit after the offset table and
+        # open with the 0 marker, wrapped (overflowed) offsets
+        # land somewhere else
+        if offsets.min() < 4 + cellCount or offsets.max() >= len(words):
+            return False
+        if np.any(words[offsets] != 0):
+            return False
+        terminators = np.flatnonzero(words == 0xFFFF)
+        ends = np.searchsorted(terminators, offsets + 1)
+        if np.any(ends >= len(terminators)):
+            return False
+        starts = offsets + 1
+        lengths = terminators[ends] - starts
+
+        self.originX = originX
+        self.originY = originY
+        self.columns = columns
+        self.rows = rows
+        self.cellOffsets = np.zeros(cellCount + 1, dtype=np.int32)
+        np.cumsum(lengths, out=self.cellOffsets[1:])
+        # gather every list into one flat array
+        within = np.arange(self.cellOffsets[-1]) - np.repeat(self.cellOffsets[:-1], lengths)
+        self.cellLines = words[np.repeat(starts, lengths) + within].astype(np.int32)
+        self.generated = False
+        return True
+
+    # builds the grid from LINEDEFS the way node builders do,
+    # a linedef is listed in every cell its segment touches
+    def generate(self, map):
+        v1 = map.vertices_xy[map.linedef_v1].astype(np.int64)
+        v2 = map.vertices_xy[map.linedef_v2].astype(np.int64)
+        self.originX = int(min(v1[:, 0].min(), v2[:, 0].min())) - 8
+        self.originY = int(min(v1[:, 1].min(), v2[:, 1].min())) - 8
+        maxX = int(max(v1[:, 0].max(), v2[:, 0].max()))
+        maxY = int(max(v1[:, 1].max(), v2[:, 1].max()))
+        self.columns = (maxX - self.originX) // Blockmap.CELLSIZE + 1
+        self.rows = (maxY - self.originY) // Blockmap.CELLSIZE + 1
+
+        cells = []
+        lines = []
+        for i in range(len(v1)):
+            touched = self.getSegmentCells(v1[i, 0], v1[i, 1], v2[i, 0], v2[i, 1])
+            cells.append(touched)
+            lines.append(np.full(len(touched), i, dtype=np.int32))
+        self.setCells(np.concatenate(cells), np.concatenate(lines))
+        self.generated = True
+
+    # stores (cell, linedef) pairs as CSR
+    def setCells(self, cells, lines):
+        order = np.argsort(cells, kind='stable')
+        counts = np.bincount(cells, minlength=self.columns * self.rows)
+        self.cellOffsets = np.zeros(self.columns * self.rows + 1, dtype=np.int32)
+        np.cumsum(counts, out=self.cellOffsets[1:])
+        self.cellLines = lines[order]
+
+    # bins the map's things by cell
+    def linkThings(self, map):
+        cellCount = self.columns * self.rows
+        cx, cy = self.getCells(map.thing_xy[:, 0], map.thing_xy[:, 1])
+        inside = (cx >= 0) & (cx < self.columns) & (cy >= 0) & (cy < self.rows)
+        cells = (cy * self.columns + cx)[inside]
+        things = np.flatnonzero(inside).astype(np.int32)
+        order = np.argsort(cells, kind='stable')
+        counts = np.bincount(cells, minlength=cellCount)
+        self.thingOffsets = np.zeros(cellCount + 1, dtype=np.int32)
+        np.cumsum(counts, out=self.thingOffsets[1:])
+        self.cellThings = things[order]
+
+    def getCell(self, x, y):
+        return int((x - self.originX) // Blockmap.CELLSIZE), int((y - self.originY) // Blockmap.CELLSIZE)
+
+    def getCells(self, xs, ys):
+        cx = (np.asarray(xs, dtype=np.int64) - self.originX) // Blockmap.CELLSIZE
+        cy = (np.asarray(ys, dtype=np.int64) - self.originY) // Blockmap.CELLSIZE
+        return cx, cy
+
+    # cell indices inside the grid covered by a box
+    def getBoxCells(self, x1, y1, x2, y2):
+        cx1, cy1 = self.getCell(min(x1, x2), min(y1, y2))
+        cx2, cy2 = self.getCell(max(x1, x2), max(y1, y2))
+        cx1, cy1 = max(cx1, 0), max(cy1, 0)
+        cx2, cy2 = min(cx2, self.columns - 1), min(cy2, self.rows - 1)
+        if cx1 > cx2 or cy1 > cy2:
+            return np.zeros(0, dtype=np.int64)
+        cys, cxs = np.mgrid[cy1:cy2 + 1, cx1:cx2 + 1]
+        return (cys * self.columns + cxs).ravel()
+
+    # cells of the box around a segment that the segment
+    # actually passes through (touching counts)
+    def getSegmentCells(self, x1, y1, x2, y2):
+        cells = self.getBoxCells(x1, y1, x2, y2)
+        if len(cells) <= 1:
+            return cells
+        left = (cells % self.columns) * Blockmap.CELLSIZE + self.originX
+        bottom = (cells // self.columns) * Blockmap.CELLSIZE + self.originY
+        dx = x2 - x1
+        dy = y2 - y1
+        # side of each cell corner relative to the segment
+        sides = np.stack([
+            (left - x1) * dy - (bottom - y1) * dx,
+            (left + Blockmap.CELLSIZE - x1) * dy - (bottom - y1) * dx,
+            (left - x1) * dy - (bottom + Blockmap.CELLSIZE - y1) * dx,
+            (left + Blockmap.CELLSIZE - x1) * dy - (bottom + Blockmap.CELLSIZE - y1) * dx,
+        ])
+        crossed = (sides.min(axis=0) <= 0) & (sides.max(axis=0) >= 0)
+        return cells[crossed]
+
+    def gatherLines(self, cells):
+        if len(cells) == 0:
+            return np.zeros(0, dtype=np.int32)
+        starts = self.cellOffsets[cells]
+        lengths = self.cellOffsets[cells + 1] - starts
+        within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return np.unique(self.cellLines[np.repeat(starts, lengths) + within])
+
+    def linesInCell(self, cx, cy):
+        if cx < 0 or cy < 0 or cx >= self.columns or cy >= self.rows:
+            return np.zeros(0, dtype=np.int32)
+        c = cy * self.columns + cx
+        return self.cellLines[self.cellOffsets[c]:self.cellOffsets[c + 1]]
+
+    # linedef ids listed in any cell the box overlaps, this is
+    # the broad phase, lines may not touch the box itself
+    def linesInBox(self, x1, y1, x2, y2):
+        return self.gatherLines(self.getBoxCells(x1, y1, x2, y2))
+
+    # linedef ids that the segment x1,y1 -> x2,y2 crosses
+    def linesCrossedBySegment(self, map, x1, y1, x2, y2):
+        lines = self.gatherLines(self.getSegmentCells(x1, y1, x2, y2))
+        if len(lines) == 0:
+            return lines
+        a = map.vertices_xy[map.linedef_v1[lines]].astype(np.float64)
+        b = map.vertices_xy[map.linedef_v2[lines]].astype(np.float64)
+        dx = x2 - x1
+        dy = y2 - y1
+        # segment endpoints on either side of each line and
+        # line endpoints on either side of the segment
+        s1 = (a[:, 0] - x1) * dy - (a[:, 1] - y1) * dx
+        s2 = (b[:, 0] - x1) * dy - (b[:, 1] - y1) * dx
+        lx = b[:, 0] - a[:, 0]
+        ly = b[:, 1] - a[:, 1]
+        t1 = (x1 - a[:, 0]) * ly - (y1 - a[:, 1]) * lx
+        t2 = (x2 - a[:, 0]) * ly - (y2 - a[:, 1]) * lx
+        crossed = (s1 * s2 <= 0) & (t1 * t2 <= 0)
+        return lines[crossed]
+
+    def thingsInCell(self, cx, cy):
+        if cx < 0 or cy < 0 or cx >= self.columns or cy >= self.rows:
+            return np.zeros(0, dtype=np.int32)
+        c = cy * self.columns + cx
+        return self.cellThings[self.thingOffsets[c]:self.thingOffsets[c + 1]]
+
+    # flat arrays for Map.exportData
+    def exportData(self):
+        return {
+            "blockmap_header": np.array([self.originX, self.originY, self.columns, self.rows, int(self.generated)], dtype=np.int32),
+            "blockmap_offsets": self.cellOffsets,
+            "blockmap_lines": self.cellLines,
+        }
+
+    def fromData(data, map):
+        blockmap = Blockmap()
+        header = data["blockmap_header"].tolist()
+        blockmap.originX, blockmap.originY, blockmap.columns, blockmap.rows = header[0:4]
+        blockmap.generated = header[4] == 1
+        blockmap.cellOffsets = data["blockmap_offsets"]
+        blockmap.cellLines = data["blockmap_lines"]
+        blockmap.linkThings(map)
+        return blockmap
@@ -0,0 +1,44 @@
+import numpy as np
+
+# Floor and ceiling flats
+#
+# Flats are the raw 64x64 palette index lumps between F_START
+# and F_END (FF_START and FF_END in PWADs), stored row by row
+# so pixel x, y sits at y * 64 + x. Unlike textures they have
+# no header and need no composing
+
+class Flat(object):
+    SIZE = 64
+
+    def __init__(self, name, data):
+        self.name = name
+        self.pixels = np.frombuffer(data[:Flat.SIZE * Flat.SIZE], dtype=np.uint8).reshape(Flat.SIZE, Flat.SIZE) # [y, x]
+        self.flat = self.pixels.reshape(-1)
+
+    # palette indices at world coordinates, flats tile every
+    # 64 units so only the low 6 bits of each coordinate count
+    def sample(self, xs, ys):
+        xs = np.asarray(xs).astype(np.int64) & (Flat.SIZE - 1)
+        ys = np.asarray(ys).astype(np.int64) & (Flat.SIZE - 1)
+        return self.flat[ys * Flat.SIZE + xs]
+
+class FlatManager(object):
+
+    def __init__(self, wad):
+        self.flats = {}
+        lumps = wad.getLumpsBetween(("F_START", "FF_START"), ("F_END", "FF_END"))
+        for name, data in lumps.items():
+            # skip anything not a full flat, like nested markers
+            if len(data) >= Flat.SIZE * Flat.SIZE:
+                self.flats[name.upper()] = Flat(name.upper(), data)
+
+    def hasFlat(self, name):
+        return name.upper() in self.flats
+
+    # Flat or None for unknown names
+    def getFlat(self, name):
+        return self.flats.get(name.upper())
+
+    # the sky is drawn from the sky texture, not its flat
+    def isSky(self, name):
+        return name.upper() == "F_SKY1"
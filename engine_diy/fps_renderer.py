@@ -1,14 +1,32 @@
 import random, math
+import numpy as np
+from bisect import bisect_left
 from engine_diy.player import Player
-from engine_diy.angle import Angle
-from engine_diy.segment_range import SolidSegmentRange
+from engine_diy.angle import *
+from engine_diy.segment_range import SolidSegmentList
+from engine_diy.view import ViewTransform
+from engine_diy.framebuffer import Framebuffer
+from engine_diy.wall_spans import WallSpans
+from engine_diy.visplane import VisplaneList
+from engine_diy.lighting import Lighting
 from engine_diy.map import *
 
 class FpsRenderer(object):
+    # corners of a bounding box (top, bottom, left, right) that
+    # bound it as seen from each of the 9 regions around it,
+    # indexed by boxY * 4 + boxX, see checkBspBox
+    BOXCORNERS = [
+        (3, 0, 2, 1), (3, 0, 2, 0), (3, 1, 2, 0), None,
+        (2, 0, 2, 1), None,         (3, 1, 3, 0), None,
+        (2, 0, 3, 1), (2, 1, 3, 1), (2, 1, 3, 0), None,
+    ]
+
     def __init__(self, map, player, game, fov, width, height, xOffset, yOffset):
         self.map = map
         self.player = player
         self.game = game
+        self.canvas = game # what the view is drawn with, game or framebuffer
+        self.framebuffer = None # optional Framebuffer, see useFramebuffer
 
         self.f_fov = fov
         self.f_width = width
@@ -16,8 +34,10 @@ class FpsRenderer(object):
         self.f_xOffset = xOffset
         self.f_yOffset = yOffset
 
-        self.wallColors = {} # helper to map a texture to a single color (until textures are added)
+        self.wallColors = {} # helper to map a texture to a single color
+        self.graphics = None # optional Graphics of the map's WAD, walls take their texture's average color
         self.onSegInspect = None # function pointer for helping to visualize segs in fps viewport
+        self.view = ViewTransform(map) # angles and distances to every vertex, updated once per frame
 
         self.f_halfWidth = width / 2
         self.f_halfHeight = height / 2
@@ -49,16 +69,50 @@ class FpsRenderer(object):
             self.doomportals_ceilingClipHeight.append(-1)
             self.doomportals_floorClipHeight.append(int(self.f_height))
 
-        self.doomhistory_screenXToAngleLookup = []
+        # doomhistory works in BAM integers (see angle.py) and
+        # keeps ints and floats in its lookups, not Angle objects
+        self.doomhistory_fov = degToBam(fov)
+        self.doomhistory_halfFov = degToBam(fov / 2)
+        self.doomhistory_spanLimit = int(fov * 2 * BAMPERDEG) # unmasked so 180+ fovs compare right
+        self.doomhistory_viewAngle = 0 # player angle in BAM, set every frame
+        self.doomhistory_screenXToAngleLookup = [] # BAM from the view direction
+        self.doomhistory_screenXToAngleCos = []
         for i in range(0, width + 1):
             f_angle = math.atan((self.f_halfWidth - i) / float(self.f_distancePlayerToScreen)) * 180 / math.pi
-            self.doomhistory_screenXToAngleLookup.append(Angle(f_angle))
+            self.doomhistory_screenXToAngleLookup.append(degToBam(f_angle))
+            self.doomhistory_screenXToAngleCos.append(math.cos(math.radians(f_angle)))
+        # screen x of every fine angle once rotated so the view
+        # direction sits at 90, doom's viewangletox
+        self.doomhistory_fineAngleToScreenX = []
+        for i in range(0, FINEANGLES):
+            f_tan = finetangent[i & (FINEANGLES // 2 - 1)] # tan(angle - 90)
+            self.doomhistory_fineAngleToScreenX.append(int(self.f_distancePlayerToScreen - round(f_tan * self.f_halfWidth)))
+        self.doomhistory_fineAngleToScreenXArray = np.array(self.doomhistory_fineAngleToScreenX, dtype=np.int64)
+        # per frame results of doomhistory_clipSegsToFov
+        self.doomhistory_visibleSegs = [] # sorted IDs of segs in the fov
+        self.doomhistory_visibleClips = [] # (v1Angle, v2Angle, v1xScreen, v2xScreen) of each visible seg
         self.doomhistory_ceilingClipHeight = []
         self.doomhistory_floorClipHeight = []
         for i in range(0, self.f_width):
             self.doomhistory_ceilingClipHeight.append(-1)
             self.doomhistory_floorClipHeight.append(int(self.f_height))
         self.doomhistory_frameSegsDrawData = []
+        self.doomhistory_visibleSubsectors = [] # IDs of the subsectors the BSP walk reached
+        # textured walls sample the texture of every wall pixel
+        # along the ray of its column
+        self.doomhistory_textured = True
+        self.doomhistory_screenXToRadians = np.arctan((self.f_halfWidth - np.arange(width + 1)) / self.f_distancePlayerToScreen)
+        self.doomhistory_wallPixels = np.zeros((int(height), int(width), 4), dtype=np.uint8) # [y, x] rgba
+        # portal modes step the heights of wide wall fragments at
+        # once with WallSpans, False keeps the column by column loop
+        self.wallSpans = True
+        # colormap rows by light level and distance
+        self.lighting = Lighting(width)
+        # floors and ceilings of the portal modes
+        self.visplanes = VisplaneList(width, height, self.f_distancePlayerToScreen, self.lighting)
+        self.drawPlanes = True
+        # things of doomhistory
+        self.drawSprites = True
 
         self.debug = False
 
@@ -70,11 +124,128 @@ class FpsRenderer(object):
                 print(r, end='')
         print('')
 
+    # doom's R_CheckBBox, given to Map.renderBspNodes to skip BSP
+    # subtrees whose bounding box is outside the fov or behind
+    # columns the segList already has covered by solid walls
+    def checkBspBox(self, box):
+        x = self.player.x
+        y = self.player.y
+        # find where the player is around the box
+        if x <= box[2]:
+            boxX = 0
+        elif x < box[3]:
+            boxX = 1
+        else:
+            boxX = 2
+        if y >= box[0]:
+            boxY = 0
+        elif y > box[1]:
+            boxY = 1
+        else:
+            boxY = 2
+        boxPos = boxY * 4 + boxX
+        if boxPos == 5:
+            # inside the box
+            return True
+        corners = FpsRenderer.BOXCORNERS[boxPos]
+        x1 = box[corners[0]]
+        y1 = box[corners[1]]
+        x2 = box[corners[2]]
+        y2 = box[corners[3]]
+
+        # corner angles from the view direction, 0 - 360
+        viewDeg = self.player.angle.deg
+        angle1 = (math.degrees(math.atan2(y1 - y, x1 - x)) - viewDeg) % 360
+        angle2 = (math.degrees(math.atan2(y2 - y, x2 - x)) - viewDeg) % 360
+        span = (angle1 - angle2) % 360
+        if span >= 180:
+            # sitting on a line of the box
+            return True
+        halfFov = self.f_fov / 2
+        # clip to the fov, out if entirely to one side
+        tspan = (angle1 + halfFov) % 360
+        if tspan > self.f_fov:
+            tspan -= self.f_fov
+            if tspan >= span:
+                return False
+            angle1 = halfFov
+        tspan = (halfFov - angle2) % 360
+        if tspan > self.f_fov:
+            tspan -= self.f_fov
+            if tspan >= span:
+                return False
+            angle2 = -halfFov
+
+        # same projection as the walls, left of center is positive
+        if angle1 > 180:
+            angle1 -= 360
+        if angle2 > 180:
+            angle2 -= 360
+        sx1 = int(self.f_distancePlayerToScreen - round(math.tan(math.radians(angle1)) * self.f_halfWidth))
+        sx2 = int(self.f_distancePlayerToScreen - round(math.tan(math.radians(angle2)) * self.f_halfWidth))
+        if sx1 == sx2:
+            # walls this thin are never drawn
+            return False
+
+        # hidden when a single solid range covers it, sx2 is
+        # the first column right of the box as in R_CheckBBox
+        return not self.segList.isRangeCovered(sx1, sx2 - 1)
+
+    # given to Map.renderBspNodes to stop the walk once solid
+    # walls cover every column
+    def isScreenFull(self):
+        return self.segList.isFull()
+
+    # draw the view into a software Framebuffer presented with
+    # one drawPixels per frame instead of a GL call per line
+    def useFramebuffer(self, enabled = True):
+        if enabled:
+            self.framebuffer = Framebuffer(self.f_width, self.f_height, self.f_xOffset, self.f_yOffset)
+            self.canvas = self.framebuffer
+        else:
+            self.framebuffer = None
+            self.canvas = self.game
+
+    def beginFrame(self):
+        if self.framebuffer is not None:
+            self.framebuffer.clear()
+
+    def endFrame(self):
+        if self.framebuffer is not None:
+            self.game.drawPixels([self.f_xOffset, self.f_yOffset], self.framebuffer.pixels)
+
+    # finds the floor and ceiling visplanes of a wall fragment
+    # and marks the openings around it, clip arrays as they are
+    # before the wall is drawn
+    def markVisplanes(self, seg, v1xScreen, v2xScreen, RD, ceilingClip, floorClip):
+        if not self.drawPlanes:
+            return
+        sector = seg.frontSector
+        ceilingPlane = None
+        floorPlane = None
+        if RD.b_updateCeiling:
+            ceilingPlane = self.visplanes.findPlane(sector.ceilingHeight, sector.ceilingTexture, sector.lightLevel, v1xScreen, v2xScreen)
+        if RD.b_updateFloor:
+            floorPlane = self.visplanes.findPlane(sector.floorHeight, sector.floorTexture, sector.lightLevel, v1xScreen, v2xScreen)
+        self.visplanes.markWall(RD, v1xScreen, v2xScreen, ceilingClip, floorClip, ceilingPlane, floorPlane)
+
+    # pixels is the frame's textured walls when there are any,
+    # planes are filled into them and both go up together
+    def drawVisplanes(self, pixels = None):
+        if self.drawPlanes:
+            pixels = self.visplanes.draw(self.graphics, self.getWallColor, pixels)
+        if pixels is not None:
+            self.canvas.drawPixels([self.f_xOffset, self.f_yOffset], pixels)
+
     def getWallColor(self, textureId, lightLevel = None):
         if textureId in self.wallColors:
             rgba = self.wallColors[textureId]
         else:
-            rgba = (random.uniform(0, 1), random.uniform(0, 1), random.uniform(0, 1), 1)
+            rgba = None
+            if self.graphics is not None:
+                rgba = self.graphics.textures.getAverageColor(textureId)
+            if rgba is None:
+                rgba = (random.uniform(0, 1), random.uniform(0, 1), random.uniform(0, 1), 1)
             self.wallColors[textureId] = rgba
         # adjust for light level
         if lightLevel is not None: # 0 - 255
@@ -89,6 +260,9 @@ class FpsRenderer(object):
     ###############################
 
     def edges_render(self, solidOnly = False, onSegInspect = None):
+        self.beginFrame()
+        # angles and distances from the player to every vertex
+        self.view.update(self.player.x, self.player.y)
         # loop over all segs
         for i, seg in enumerate(self.map.segs):
             linedef = seg.linedef
@@ -111,17 +285,19 @@ class FpsRenderer(object):
                 # wall edge1
                 fpsStart = [v1xScreen + self.f_xOffset, self.f_yOffset]
                 fpsEnd = [v1xScreen + self.f_xOffset, self.f_height + self.f_yOffset]
-                self.game.drawLine(fpsStart, fpsEnd, (1,1,0,1), 1)
+                self.canvas.drawLine(fpsStart, fpsEnd, (1,1,0,1), 1)
 
                 # wall edge 2
                 fpsStart = [v2xScreen + self.f_xOffset, self.f_yOffset]
                 fpsEnd = [v2xScreen + self.f_xOffset, self.f_height + self.f_yOffset]
-                self.game.drawLine(fpsStart, fpsEnd, (1,0,1,1), 1)
+                self.canvas.drawLine(fpsStart, fpsEnd, (1,0,1,1), 1)
+
+        self.endFrame()
 
     def edges_clipVerticesToFov(self, v1, v2):
         fov = Angle(self.f_fov)
-        v1Angle = self.player.angleToVertex(v1)
-        v2Angle = self.player.angleToVertex(v2)
+        v1Angle = Angle(self.view.angles[v1.ID])
+        v2Angle = Angle(self.view.angles[v2.ID])
         spanAngle = v1Angle.subA(v2Angle)
         if spanAngle.gteF(self.f_fov * 2):
             return None
@@ -193,18 +369,23 @@ class FpsRenderer(object):
     ##############################
 
     def wallcull_render(self, onSegInspect = None):
+        self.beginFrame()
 
         # optional function pointer when we inspect a visible seg
         self.onSegInspect = onSegInspect
         self.wallRenderer = self.wallcull_renderRange
 
+        # angles and distances from the player to every vertex
+        self.view.update(self.player.x, self.player.y)
+
         # clear our clipping list of walls
-        self.segList = [SolidSegmentRange(-100000, -1)]
-        self.segList.append(SolidSegmentRange(self.f_width, 100000))
+        self.segList = SolidSegmentList(self.f_width)
         self.clippings = {} # dict of segIds to screenXs
 
         # render 3d viewport
-        self.map.renderBspNodes(self.player.x, self.player.y, self.wallcull_renderSubsector)
+        self.map.renderBspNodes(self.player.x, self.player.y, self.wallcull_renderSubsector, self.checkBspBox, self.isScreenFull)
+
+        self.endFrame()
 
     def wallcull_renderRange(self, seg, segPair, angles):
         # get unique color for this line
@@ -217,7 +398,7 @@ class FpsRenderer(object):
         # ranges are exclusive of eachothers start and end
         # so add +1 to width (not for now because I like the line)
         width = segPair[1] - segPair[0] # + 1
-        self.game.drawRectangle(fpsStart, width, self.f_height, rgba)
+        self.canvas.drawRectangle(fpsStart, width, self.f_height, rgba)
 
     def wallcull_renderSubsector(self, subsector):
         # iterate segs in subsector
@@ -259,8 +440,8 @@ class FpsRenderer(object):
 
     def wallcull_clipVerticesToFov(self, v1, v2):
         fov = Angle(self.f_fov)
-        v1Angle = self.player.angleToVertex(v1)
-        v2Angle = self.player.angleToVertex(v2)
+        v1Angle = Angle(self.view.angles[v1.ID])
+        v2Angle = Angle(self.view.angles[v2.ID])
         spanAngle = v1Angle.subA(v2Angle)
         if spanAngle.gteF(self.f_fov * 2):
             return None
@@ -309,87 +490,13 @@ class FpsRenderer(object):
 
         return v1Angle, v2Angle
 
-    # python DIY linked lists are a nightmare
-    # because of the pass-object-by-reference
-    # nature of variables
-    # when I change next and prev values on a
-    # node it changes it for that copy of the
-    # variable, and not for the underlying reference
-    # TODO take a seg and implement StoreWallRange
-    # so that we can update the segs display range
+    # draws the parts of the wall not already hidden behind
+    # solid walls and marks its columns covered
     def wallcull_clipWall(self, seg, segList, wallStart, wallEnd, clippings, angles, rangeRenderer):
-        if len(segList) < 2:
-            return
-        segId = seg.ID
-        segRange = None
-        segIndex = None
-        # skip all segments that end before this wall starts
-        i=0
-        while (i < len(segList) and segList[i].xEnd < wallStart - 1):
-            i += 1
-        segIndex = i
-        segRange = segList[segIndex]
-        # should always have a node since we cap our ends with
-        # "infinity"
-        # START to OVERLAP
-        if wallStart < segRange.xStart:
-            # found a position in the node list
-            # are they overlapping?
-            if wallEnd < segRange.xStart - 1:
-                # all of the wall is visible to insert it
-                # STOREWALL
-                # StoreWallRange(seg, CurrentWall.XStart, CurrentWall.XEnd);
-                clippings[segId] = (wallStart, wallEnd)
-                rangeRenderer(seg, clippings[segId], angles)
-                segList.insert(segIndex, SolidSegmentRange(wallStart, wallEnd))
-                # go to next wall
-                return
-            # if not overlapping, end is already included
-            # so just update the start
-            # STOREWALL
-            # StoreWallRange(seg, CurrentWall.XStart, FoundClipWall->XStart - 1);
-            clippings[segId] = (wallStart,  segRange.xStart - 1)
-            rangeRenderer(seg, clippings[segId], angles)
-            segRange.xStart = wallStart
-        # FULL OVERLAPPED
-        # this part is already occupied
-        if wallEnd <= segRange.xEnd:
-            return # go to next wall
-
-        # CHOP AND MERGE
-        # start by looking at the next entry in the list
-        # is the next entry within the current wall range?
-        nextSegIndex = segIndex
-        nextSegRange = segRange
-        while wallEnd >= segList[nextSegIndex + 1].xStart - 1:
-            # STOREWALL
-            # StoreWallRange(seg, NextWall->XEnd + 1, next(NextWall, 1)->XStart - 1);
-            clippings[segId] = (nextSegRange.xEnd + 1,  segList[nextSegIndex + 1].xStart - 1)
-            rangeRenderer(seg, clippings[segId], angles)
-
-            nextSegIndex += 1
-            nextSegRange = segList[nextSegIndex]
-            # partially clipped by other walls, store each fragment
-            if wallEnd <= nextSegRange.xEnd:
-                segRange.xEnd = nextSegRange.xEnd
-                if nextSegIndex != segIndex:
-                    segIndex += 1
-                    nextSegIndex += 1
-                    del segList[segIndex:nextSegIndex]
-                return
-
-        # wall precedes all known segments
-        # STOREWALL
-        # StoreWallRange(seg, NextWall->XEnd + 1, CurrentWall.XEnd);
-        clippings[segId] = (nextSegRange.xEnd + 1,  wallEnd)
-        rangeRenderer(seg, clippings[segId], angles)
-        segRange.xEnd = wallEnd
-
-        if (nextSegIndex != segIndex):
-            segIndex += 1
-            nextSegIndex += 1
-            del segList[segIndex:nextSegIndex]
-        return
+        for fragment in segList.clipSolid(wallStart, wallEnd):
+            # StoreWallRange(seg, fragment start, fragment end)
+            clippings[seg.ID] = fragment
+            rangeRenderer(seg, fragment, angles)
 
 
 
@@ -402,18 +509,23 @@ class FpsRenderer(object):
     ################################
 
     def wolfenstein_render(self, onSegInspect = None):
+        self.beginFrame()
 
         # optional function pointer when we inspect a visible seg
         self.onSegInspect = onSegInspect
         self.wallRenderer = self.wolfenstein_renderWall
 
+        # angles and distances from the player to every vertex
+        self.view.update(self.player.x, self.player.y)
+
         # clear our clipping list of walls
-        self.segList = [SolidSegmentRange(-100000, -1)]
-        self.segList.append(SolidSegmentRange(self.f_width, 100000))
+        self.segList = SolidSegmentList(self.f_width)
         self.clippings = {} # dict of segIds to screenXs
 
         # render 3d viewport
-        self.map.renderBspNodes(self.player.x, self.player.y, self.wolfenstein_renderSubsector)
+        self.map.renderBspNodes(self.player.x, self.player.y, self.wolfenstein_renderSubsector, self.checkBspBox, self.isScreenFull)
+
+        self.endFrame()
 
     def wolfenstein_renderSubsector(self, subsector):
         # iterate segs in subsector
@@ -455,8 +567,8 @@ class FpsRenderer(object):
 
     def wolfenstein_clipVerticesToFov(self, v1, v2):
         fov = Angle(self.f_fov)
-        v1Angle = self.player.angleToVertex(v1)
-        v2Angle = self.player.angleToVertex(v2)
+        v1Angle = Angle(self.view.angles[v1.ID])
+        v2Angle = Angle(self.view.angles[v2.ID])
         spanAngle = v1Angle.subA(v2Angle)
         if spanAngle.gteF(self.f_fov * 2):
             return None
@@ -514,8 +626,8 @@ class FpsRenderer(object):
 
         # we have v1 and v2, do calculations for v1 and v2
         # separately then interpolate values in between
-        distanceToV1 = self.player.distanceToVertex(v1)
-        distanceToV2 = self.player.distanceToVertex(v2)
+        distanceToV1 = self.view.distances[v1.ID]
+        distanceToV2 = self.view.distances[v2.ID]
 
         # fix that clipped seg angles are weird
         # cant get this to not divide by zero so commenting out
@@ -541,13 +653,13 @@ class FpsRenderer(object):
         rcy = ceilingV2onScreen + self.f_yOffset
         lfy = floorV1onScreen + self.f_yOffset
         rfy = floorV2onScreen + self.f_yOffset
-        self.game.drawLine([lx, lcy], [lx, lfy], rgba, 1)
+        self.canvas.drawLine([lx, lcy], [lx, lfy], rgba, 1)
         # right side
-        self.game.drawLine([rx, rcy], [rx, rfy], rgba, 1)
+        self.canvas.drawLine([rx, rcy], [rx, rfy], rgba, 1)
         # top
-        self.game.drawLine([lx, lcy], [rx, rcy], rgba, 1)
+        self.canvas.drawLine([lx, lcy], [rx, rcy], rgba, 1)
         # bottom
-        self.game.drawLine([lx, lfy], [rx, rfy], rgba, 1)
+        self.canvas.drawLine([lx, lfy], [rx, rfy], rgba, 1)
 
     def wolfenstein_calculateCeilingFloorHeight(self, seg, vxScreen, distanceToV):
         # return ceilingVOnScreen, floorVOnScreen
@@ -597,87 +709,13 @@ class FpsRenderer(object):
 
         return distanceToV
 
-    # python DIY linked lists are a nightmare
-    # because of the pass-object-by-reference
-    # nature of variables
-    # when I change next and prev values on a
-    # node it changes it for that copy of the
-    # variable, and not for the underlying reference
-    # TODO take a seg and implement StoreWallRange
-    # so that we can update the segs display range
+    # draws the parts of the wall not already hidden behind
+    # solid walls and marks its columns covered
     def wolfenstein_clipWall(self, seg, segList, wallStart, wallEnd, clippings, angles, rangeRenderer):
-        if len(segList) < 2:
-            return
-        segId = seg.ID
-        segRange = None
-        segIndex = None
-        # skip all segments that end before this wall starts
-        i=0
-        while (i < len(segList) and segList[i].xEnd < wallStart - 1):
-            i += 1
-        segIndex = i
-        segRange = segList[segIndex]
-        # should always have a node since we cap our ends with
-        # "infinity"
-        # START to OVERLAP
-        if wallStart < segRange.xStart:
-            # found a position in the node list
-            # are they overlapping?
-            if wallEnd < segRange.xStart - 1:
-                # all of the wall is visible to insert it
-                # STOREWALL
-                # StoreWallRange(seg, CurrentWall.XStart, CurrentWall.XEnd);
-                clippings[segId] = (wallStart, wallEnd)
-                rangeRenderer(seg, clippings[segId], angles)
-                segList.insert(segIndex, SolidSegmentRange(wallStart, wallEnd))
-                # go to next wall
-                return
-            # if not overlapping, end is already included
-            # so just update the start
-            # STOREWALL
-            # StoreWallRange(seg, CurrentWall.XStart, FoundClipWall->XStart - 1);
-            clippings[segId] = (wallStart,  segRange.xStart - 1)
-            rangeRenderer(seg, clippings[segId], angles)
-            segRange.xStart = wallStart
-        # FULL OVERLAPPED
-        # this part is already occupied
-        if wallEnd <= segRange.xEnd:
-            return # go to next wall
-
-        # CHOP AND MERGE
-        # start by looking at the next entry in the list
-        # is the next entry within the current wall range?
-        nextSegIndex = segIndex
-        nextSegRange = segRange
-        while wallEnd >= segList[nextSegIndex + 1].xStart - 1:
-            # STOREWALL
-            # StoreWallRange(seg, NextWall->XEnd + 1, next(NextWall, 1)->XStart - 1);
-            clippings[segId] = (nextSegRange.xEnd + 1,  segList[nextSegIndex + 1].xStart - 1)
-            rangeRenderer(seg, clippings[segId], angles)
-
-            nextSegIndex += 1
-            nextSegRange = segList[nextSegIndex]
-            # partially clipped by other walls, store each fragment
-            if wallEnd <= nextSegRange.xEnd:
-                segRange.xEnd = nextSegRange.xEnd
-                if nextSegIndex != segIndex:
-                    segIndex += 1
-                    nextSegIndex += 1
-                    del segList[segIndex:nextSegIndex]
-                return
-
-        # wall precedes all known segments
-        # STOREWALL
-        # StoreWallRange(seg, NextWall->XEnd + 1, CurrentWall.XEnd);
-        clippings[segId] = (nextSegRange.xEnd + 1,  wallEnd)
-        rangeRenderer(seg, clippings[segId], angles)
-        segRange.xEnd = wallEnd
-
-        if (nextSegIndex != segIndex):
-            segIndex += 1
-            nextSegIndex += 1
-            del segList[segIndex:nextSegIndex]
-        return
+        for fragment in segList.clipSolid(wallStart, wallEnd):
+            # StoreWallRange(seg, fragment start, fragment end)
+            clippings[seg.ID] = fragment
+            rangeRenderer(seg, fragment, angles)
 
 
 
@@ -690,17 +728,22 @@ class FpsRenderer(object):
     ################################
 
     def doomsolids_render(self, onSegInspect = None):
+        self.beginFrame()
         # optional function pointer when we inspect a visible seg
         self.onSegInspect = onSegInspect
         self.wallRenderer = self.doomsolids_renderWall
 
+        # angles and distances from the player to every vertex
+        self.view.update(self.player.x, self.player.y)
+
         # clear our clipping list of walls
-        self.segList = [SolidSegmentRange(-100000, -1)]
-        self.segList.append(SolidSegmentRange(self.f_width, 100000))
+        self.segList = SolidSegmentList(self.f_width)
         self.clippings = {} # dict of segIds to screenXs
 
         # render 3d viewport
-        self.map.renderBspNodes(self.player.x, self.player.y, self.doomsolids_renderSubsector)
+        self.map.renderBspNodes(self.player.x, self.player.y, self.doomsolids_renderSubsector, self.checkBspBox, self.isScreenFull)
+
+        self.endFrame()
 
     def doomsolids_renderSubsector(self, subsector):
         # iterate segs in subsector
@@ -767,7 +810,7 @@ class FpsRenderer(object):
         # normal angle is 90deg to wall
         segToPlayerAngle = angle90.subA(normalToV1Angle)
 
-        f_distanceToV1 = self.player.distanceToVertex(v1)
+        f_distanceToV1 = self.view.distances[v1.ID]
         f_distanceToNormal = segToPlayerAngle.getSin() * f_distanceToV1
 
         v1ScaleFactor = self.doomsolids_getScaleFactor(v1xScreen, segToNormalAngle, f_distanceToNormal)
@@ -797,7 +840,7 @@ class FpsRenderer(object):
         while iXCurrent <= v2xScreen:
             drawStart = [iXCurrent + self.f_xOffset, ceilingEnd + self.f_yOffset]
             drawEnd = [iXCurrent + self.f_xOffset, floorStart + self.f_yOffset]
-            self.game.drawLine(drawStart, drawEnd, rgba, 1)
+            self.canvas.drawLine(drawStart, drawEnd, rgba, 1)
             iXCurrent += 1
             ceilingEnd += ceilingStep
             floorStart += floorStep
@@ -840,8 +883,8 @@ class FpsRenderer(object):
     def doomsolids_clipVerticesToFov(self, v1, v2):
         a_fov = Angle(self.f_fov)
 
-        v1Angle = self.player.angleToVertex(v1)
-        v2Angle = self.player.angleToVertex(v2)
+        v1Angle = Angle(self.view.angles[v1.ID])
+        v2Angle = Angle(self.view.angles[v2.ID])
 
         a_spanAngle = v1Angle.subA(v2Angle)
         if a_spanAngle.gteF(self.f_fov * 2):
@@ -893,90 +936,13 @@ class FpsRenderer(object):
 
         return v1Angle, v2Angle, v1AngleFromPlayer, v2AngleFromPlayer
 
-    # python DIY linked lists are a nightmare
-    # because of the pass-object-by-reference
-    # nature of variables
-    # when I change next and prev values on a
-    # node it changes it for that copy of the
-    # variable, and not for the underlying reference
-    # TODO take a seg and implement StoreWallRange
-    # so that we can update the segs display range
+    # draws the parts of the wall not already hidden behind
+    # solid walls and marks its columns covered
     def doomsolids_clipWall(self, seg, segList, v1xScreen, v2xScreen, v1Angle, v2Angle, clippings, rangeRenderer):
-        if len(segList) < 2:
-            return
-
-        segId = seg.ID
-        segRange = None
-        segIndex = None
-        # skip all segments that end before this wall starts
-        i=0
-        while (i < len(segList) and segList[i].xEnd < v1xScreen - 1):
-            i += 1
-        segIndex = i
-        segRange = segList[segIndex]
-
-        # should always have a node since we cap our ends with
-        # "infinity"
-        # START to OVERLAP
-        if v1xScreen < segRange.xStart:
-            # found a position in the node list
-            # are they overlapping?
-            if v2xScreen < segRange.xStart - 1:
-                # all of the wall is visible to insert it
-                # STOREWALL
-                # StoreWallRange(seg, CurrentWall.XStart, CurrentWall.XEnd);
-                clippings[segId] = (v1xScreen, v2xScreen)
-                rangeRenderer(seg, clippings[segId], v1Angle, v2Angle)
-                segList.insert(segIndex, SolidSegmentRange(v1xScreen, v2xScreen))
-                # go to next wall
-                return
-            # if not overlapping, end is already included
-            # so just update the start
-            # STOREWALL
-            # StoreWallRange(seg, CurrentWall.XStart, FoundClipWall->XStart - 1);
-            clippings[segId] = (v1xScreen,  segRange.xStart - 1)
-            rangeRenderer(seg, clippings[segId], v1Angle, v2Angle)
-            segRange.xStart = v1xScreen
-
-        # FULL OVERLAPPED
-        # this part is already occupied
-        if v2xScreen <= segRange.xEnd:
-            return # go to next wall
-
-        # CHOP AND MERGE
-        # start by looking at the next entry in the list
-        # is the next entry within the current wall range?
-        nextSegIndex = segIndex
-        nextSegRange = segRange
-        while v2xScreen >= segList[nextSegIndex + 1].xStart - 1:
-            # STOREWALL
-            # StoreWallRange(seg, NextWall->XEnd + 1, next(NextWall, 1)->XStart - 1);
-            clippings[segId] = (nextSegRange.xEnd + 1,  segList[nextSegIndex + 1].xStart - 1)
-            rangeRenderer(seg, clippings[segId], v1Angle, v2Angle)
-
-            nextSegIndex += 1
-            nextSegRange = segList[nextSegIndex]
-            # partially clipped by other walls, store each fragment
-            if v2xScreen <= nextSegRange.xEnd:
-                segRange.xEnd = nextSegRange.xEnd
-                if nextSegIndex != segIndex:
-                    segIndex += 1
-                    nextSegIndex += 1
-                    del segList[segIndex:nextSegIndex]
-                return
-
-        # wall precedes all known segments
-        # STOREWALL
-        # StoreWallRange(seg, NextWall->XEnd + 1, CurrentWall.XEnd);
-        clippings[segId] = (nextSegRange.xEnd + 1,  v2xScreen)
-        rangeRenderer(seg, clippings[segId], v1Angle, v2Angle)
-        segRange.xEnd = v2xScreen
-
-        if (nextSegIndex != segIndex):
-            segIndex += 1
-            nextSegIndex += 1
-            del segList[segIndex:nextSegIndex]
-        return
+        for fragment in segList.clipSolid(v1xScreen, v2xScreen):
+            # StoreWallRange(seg, fragment start, fragment end)
+            clippings[seg.ID] = fragment
+            rangeRenderer(seg, fragment, v1Angle, v2Angle)
 
 
 
@@ -988,21 +954,30 @@ class FpsRenderer(object):
     #################################
 
     def doomportals_render(self, onSegInspect = None):
+        self.beginFrame()
         # optional function pointer when we inspect a visible seg
         self.onSegInspect = onSegInspect
         self.wallRenderer = self.doomportals_renderWall
 
+        # angles and distances from the player to every vertex
+        self.view.update(self.player.x, self.player.y)
+
         # clear our clipping list of walls
-        self.segList = [SolidSegmentRange(-100000, -1)]
-        self.segList.append(SolidSegmentRange(self.f_width, 100000))
+        self.segList = SolidSegmentList(self.f_width)
         # clear our ceiling and floor clipping lists for portaled walls
         for i,v in enumerate(self.doomportals_ceilingClipHeight):
             self.doomportals_ceilingClipHeight[i] = -1; # reset
         for i,v in enumerate(self.doomportals_floorClipHeight):
             self.doomportals_floorClipHeight[i] = int(self.f_height)
+        self.visplanes.clear(self.player.x, self.player.y, self.player.getEyeZ(), self.player.angle.deg)
 
         # render 3d viewport
-        self.map.renderBspNodes(self.player.x, self.player.y, self.doomportals_renderSubsector)
+        self.map.renderBspNodes(self.player.x, self.player.y, self.doomportals_renderSubsector, self.checkBspBox, self.isScreenFull)
+
+        # floors and ceilings go in the rows the walls left open
+        self.drawVisplanes()
+
+        self.endFrame()
 
     def doomportals_renderSubsector(self, subsector):
         # iterate segs in subsector
@@ -1113,7 +1088,7 @@ class FpsRenderer(object):
         # normal angle is 90deg to wall
         segToPlayerAngle = angle90.subA(normalToV1Angle)
 
-        RD.f_distanceToV1 = self.player.distanceToVertex(v1)
+        RD.f_distanceToV1 = self.view.distances[v1.ID]
         RD.f_distanceToNormal = segToPlayerAngle.getSin() * RD.f_distanceToV1
 
         RD.f_v1ScaleFactor = self.doomportals_getScaleFactor(v1xScreen, segToNormalAngle, RD.f_distanceToNormal)
@@ -1156,8 +1131,16 @@ class FpsRenderer(object):
                 RD.b_drawLowerSection = True
                 RD.f_lowerHeightStep = -(RD.f_backSectorFloor * RD.f_steps)
                 RD.i_lowerHeight = int(self.f_halfHeight - (RD.f_backSectorFloor * RD.f_v1ScaleFactor))
+        else:
+            self.doomportals_ceilingFloorUpdate(seg, RD)
 
-        self.doomportals_renderSegment(seg, v1xScreen, v2xScreen, RD)
+        # floor and ceiling openings, before the wall clips them
+        self.markVisplanes(seg, v1xScreen, v2xScreen, RD, self.doomportals_ceilingClipHeight, self.doomportals_floorClipHeight)
+
+        if self.wallSpans and v2xScreen - v1xScreen + 1 >= WallSpans.MINCOLUMNS:
+            self.doomportals_renderSpans(seg, v1xScreen, v2xScreen, RD)
+        else:
+            self.doomportals_renderSegment(seg, v1xScreen, v2xScreen, RD)
 
     # Method in DOOM engine that calculated a wall height
     # scale factor given a distance of the wall from the screen
@@ -1198,15 +1181,20 @@ class FpsRenderer(object):
         if seg.backSector is None:
             RD.b_updateCeiling = True
             RD.b_updateFloor = True
-            return
+        else:
+            RD.b_updateCeiling = RD.f_backSectorCeiling != RD.f_frontSectorCeiling
+            RD.b_updateFloor = RD.f_backSectorFloor != RD.f_frontSectorFloor
 
-        RD.b_updateCeiling = RD.f_backSectorCeiling != RD.f_frontSectorCeiling
-        RD.b_updateFloor = RD.f_backSectorFloor != RD.f_frontSectorFloor
+            # another flat or light is another visplane
+            if seg.backSector.ceilingTexture != seg.frontSector.ceilingTexture or seg.backSector.lightLevel != seg.frontSector.lightLevel:
+                RD.b_updateCeiling = True
+            if seg.backSector.floorTexture != seg.frontSector.floorTexture or seg.backSector.lightLevel != seg.frontSector.lightLevel:
+                RD.b_updateFloor = True
 
-        if seg.backSector.ceilingHeight <= seg.frontSector.floorHeight or seg.backSector.floorHeight >= seg.frontSector.ceilingHeight:
-            # closed door
-            RD.b_updateCeiling = True
-            RD.b_updateFloor = True
+            if seg.backSector.ceilingHeight <= seg.frontSector.floorHeight or seg.backSector.floorHeight >= seg.frontSector.ceilingHeight:
+                # closed door
+                RD.b_updateCeiling = True
+                RD.b_updateFloor = True
 
         if seg.frontSector.ceilingHeight <= self.player.getEyeZ():
             # below view plane
@@ -1252,6 +1240,21 @@ class FpsRenderer(object):
 
             iXCurrent += 1
 
+    # doomportals_renderSegment with the heights of every column
+    # worked out by WallSpans, only the drawing is left per column
+    def doomportals_renderSpans(self, seg, v1xScreen, v2xScreen, RD):
+        spans = WallSpans(RD, v1xScreen, v2xScreen, seg.backSector is not None,
+                          self.doomportals_ceilingClipHeight, self.doomportals_floorClipHeight, self.f_height)
+        for i,x in enumerate(spans.xs):
+            drawX = x + self.f_xOffset
+            if seg.backSector is None:
+                self.canvas.drawLine([drawX, spans.ceilingEnd[i] + self.f_yOffset], [drawX, spans.floorStart[i] + self.f_yOffset], RD.rgba, 1)
+                continue
+            if RD.b_drawUpperSection and spans.upperDrawn[i]:
+                self.canvas.drawLine([drawX, spans.ceilingEnd[i] + self.f_yOffset], [drawX, spans.upper[i] + self.f_yOffset], RD.rgba, 1)
+            if RD.b_drawLowerSection and spans.lowerDrawn[i]:
+                self.canvas.drawLine([drawX, spans.lower[i] + self.f_yOffset], [drawX, spans.floorStart[i] + self.f_yOffset], RD.rgba, 1)
+
     def doomportals_drawUpperSection(self, RD, iXCurrent, i_currentCeilingEnd):
         if RD.b_drawUpperSection:
             i_upperHeight = RD.i_upperHeight
@@ -1264,11 +1267,11 @@ class FpsRenderer(object):
                 # DRAW LINE
                 drawStart = [iXCurrent + self.f_xOffset, i_currentCeilingEnd + self.f_yOffset]
                 drawEnd = [iXCurrent + self.f_xOffset, i_upperHeight + self.f_yOffset]
-                self.game.drawLine(drawStart, drawEnd, RD.rgba, 1)
+                self.canvas.drawLine(drawStart, drawEnd, RD.rgba, 1)
                 self.doomportals_ceilingClipHeight[iXCurrent] = i_upperHeight
             else:
                 self.doomportals_ceilingClipHeight[iXCurrent] = i_currentCeilingEnd - 1
-        else:
+        elif RD.b_updateCeiling:
             self.doomportals_ceilingClipHeight[iXCurrent] = i_currentCeilingEnd - 1
 
     def doomportals_drawLowerSection(self, RD, iXCurrent, i_currentFloorStart):
@@ -1283,18 +1286,18 @@ class FpsRenderer(object):
                 # DRAW LINE
                 drawStart = [iXCurrent + self.f_xOffset, i_lowerHeight + self.f_yOffset]
                 drawEnd = [iXCurrent + self.f_xOffset, i_currentFloorStart + self.f_yOffset]
-                self.game.drawLine(drawStart, drawEnd, RD.rgba, 1)
+                self.canvas.drawLine(drawStart, drawEnd, RD.rgba, 1)
                 self.doomportals_floorClipHeight[iXCurrent] = i_lowerHeight
             else:
                 self.doomportals_floorClipHeight[iXCurrent] = i_currentFloorStart + 1
-        else:
+        elif RD.b_updateFloor:
             self.doomportals_floorClipHeight[iXCurrent] = i_currentFloorStart + 1
 
     def doomportals_drawMiddleSection(self, RD, iXCurrent, i_currentCeilingEnd, i_currentFloorStart):
         # DRAW LINE
         drawStart = [iXCurrent + self.f_xOffset, i_currentCeilingEnd + self.f_yOffset]
         drawEnd = [iXCurrent + self.f_xOffset, i_currentFloorStart + self.f_yOffset]
-        self.game.drawLine(drawStart, drawEnd, RD.rgba, 1)
+        self.canvas.drawLine(drawStart, drawEnd, RD.rgba, 1)
         self.doomportals_ceilingClipHeight[iXCurrent] = self.f_height # full clip
         self.doomportals_floorClipHeight[iXCurrent] = -1 # full clip
 
@@ -1302,8 +1305,8 @@ class FpsRenderer(object):
     def doomportals_clipVerticesToFov(self, v1, v2):
         a_fov = Angle(self.f_fov)
 
-        v1Angle = self.player.angleToVertex(v1)
-        v2Angle = self.player.angleToVertex(v2)
+        v1Angle = Angle(self.view.angles[v1.ID])
+        v2Angle = Angle(self.view.angles[v2.ID])
 
         a_spanAngle = v1Angle.subA(v2Angle)
         if a_spanAngle.gteF(self.f_fov * 2):
@@ -1355,145 +1358,19 @@ class FpsRenderer(object):
 
         return v1Angle, v2Angle, v1AngleFromPlayer, v2AngleFromPlayer
 
-    # python DIY linked lists are a nightmare
-    # because of the pass-object-by-reference
-    # nature of variables
-    # when I change next and prev values on a
-    # node it changes it for that copy of the
-    # variable, and not for the underlying reference
-    # TODO take a seg and implement StoreWallRange
-    # so that we can update the segs display range
+    # draws the parts of the wall not already hidden behind
+    # solid walls and marks its columns covered
     def doomportals_clipSolidWall(self, seg, segList, v1xScreen, v2xScreen, v1Angle, v2Angle, rangeRenderer):
-        if len(segList) < 2:
-            return
-
-        segId = seg.ID
-        segRange = None
-        segIndex = None
-        # skip all segments that end before this wall starts
-        i=0
-        while (i < len(segList) and segList[i].xEnd < v1xScreen - 1):
-            i += 1
-        segIndex = i
-        segRange = segList[segIndex]
-
-        # should always have a node since we cap our ends with
-        # "infinity"
-        # START to OVERLAP
-        if v1xScreen < segRange.xStart:
-            # found a position in the node list
-            # are they overlapping?
-            if v2xScreen < segRange.xStart - 1:
-                # all of the wall is visible to insert it
-                # STOREWALL
-                # StoreWallRange(seg, CurrentWall.XStart, CurrentWall.XEnd);
-                rangeRenderer(seg, v1xScreen, v2xScreen, v1Angle, v2Angle)
-                segList.insert(segIndex, SolidSegmentRange(v1xScreen, v2xScreen))
-                # go to next wall
-                return
-            # if not overlapping, end is already included
-            # so just update the start
-            # STOREWALL
-            # StoreWallRange(seg, CurrentWall.XStart, FoundClipWall->XStart - 1);
-            rangeRenderer(seg, v1xScreen,  segRange.xStart - 1, v1Angle, v2Angle)
-            segRange.xStart = v1xScreen
-
-        # FULL OVERLAPPED
-        # this part is already occupied
-        if v2xScreen <= segRange.xEnd:
-            return # go to next wall
-
-        # CHOP AND MERGE
-        # start by looking at the next entry in the list
-        # is the next entry within the current wall range?
-        nextSegIndex = segIndex
-        nextSegRange = segRange
-        while v2xScreen >= segList[nextSegIndex + 1].xStart - 1:
-            # STOREWALL
-            # StoreWallRange(seg, NextWall->XEnd + 1, next(NextWall, 1)->XStart - 1);
-            rangeRenderer(seg, nextSegRange.xEnd + 1,  segList[nextSegIndex + 1].xStart - 1, v1Angle, v2Angle)
-
-            nextSegIndex += 1
-            nextSegRange = segList[nextSegIndex]
-            # partially clipped by other walls, store each fragment
-            if v2xScreen <= nextSegRange.xEnd:
-                segRange.xEnd = nextSegRange.xEnd
-                if nextSegIndex != segIndex:
-                    segIndex += 1
-                    nextSegIndex += 1
-                    del segList[segIndex:nextSegIndex]
-                return
-
-        # wall precedes all known segments
-        # STOREWALL
-        # StoreWallRange(seg, NextWall->XEnd + 1, CurrentWall.XEnd);
-        rangeRenderer(seg, nextSegRange.xEnd + 1,  v2xScreen, v1Angle, v2Angle)
-        segRange.xEnd = v2xScreen
-
-        if (nextSegIndex != segIndex):
-            segIndex += 1
-            nextSegIndex += 1
-            del segList[segIndex:nextSegIndex]
-        return
+        for xStart, xEnd in segList.clipSolid(v1xScreen, v2xScreen):
+            # StoreWallRange(seg, xStart, xEnd)
+            rangeRenderer(seg, xStart, xEnd, v1Angle, v2Angle)
 
     # Very similar to clipSolidWall but does not
     # modify the segList
     def doomportals_clipPortalWall(self, seg, segList, v1xScreen, v2xScreen, v1Angle, v2Angle, rangeRenderer):
-        # find clip window
-        segId = seg.ID
-        segRange = None
-        segIndex = None
-        # skip all segments that end before this wall starts
-        i=0
-        while (i < len(segList) and segList[i].xEnd < v1xScreen - 1):
-            i += 1
-        segIndex = i
-        segRange = segList[segIndex]
-
-        # should always have a node since we cap our ends with
-        # "infinity"
-        # START to OVERLAP
-        if v1xScreen < segRange.xStart:
-            # found a position in the node list
-            # are they overlapping?
-            if v2xScreen < segRange.xStart - 1:
-                # all of the wall is visible to insert it
-                # STOREWALL
-                # StoreWallRange(seg, CurrentWall.XStart, CurrentWall.XEnd);
-                rangeRenderer(seg, v1xScreen, v2xScreen, v1Angle, v2Angle)
-                # go to next wall
-                return
-            # if not overlapping, end is already included
-            # so just update the start
-            # STOREWALL
-            # StoreWallRange(seg, CurrentWall.XStart, FoundClipWall->XStart - 1);
-            rangeRenderer(seg, v1xScreen,  segRange.xStart - 1, v1Angle, v2Angle)
-
-        # FULL OVERLAPPED
-        # this part is already occupied
-        if v2xScreen <= segRange.xEnd:
-            return # go to next wall
-
-        # CHOP AND MERGE
-        # start by looking at the next entry in the list
-        # is the next entry within the current wall range?
-        nextSegIndex = segIndex
-        nextSegRange = segRange
-        while v2xScreen >= segList[nextSegIndex + 1].xStart - 1:
-            # STOREWALL
-            # StoreWallRange(seg, NextWall->XEnd + 1, next(NextWall, 1)->XStart - 1);
-            rangeRenderer(seg, nextSegRange.xEnd + 1,  segList[nextSegIndex + 1].xStart - 1, v1Angle, v2Angle)
-
-            nextSegIndex += 1
-            nextSegRange = segList[nextSegIndex]
-            # partially clipped by other walls, store each fragment
-            if v2xScreen <= nextSegRange.xEnd:
-                return
-
-        # wall precedes all known segments
-        # STOREWALL
-        # StoreWallRange(seg, NextWall->XEnd + 1, CurrentWall.XEnd);
-        rangeRenderer(seg, nextSegRange.xEnd + 1,  v2xScreen, v1Angle, v2Angle)
+        for xStart, xEnd in segList.clipPortal(v1xScreen, v2xScreen):
+            # StoreWallRange(seg, xStart, xEnd)
+            rangeRenderer(seg, xStart, xEnd, v1Angle, v2Angle)
 
 
 
@@ -1545,6 +1422,32 @@ class FpsRenderer(object):
             self.middleSection = []
             self.lowerSection = []
 
+            # wall scale across the seg for texturing
+            self.i_v1xScreen = 0
+            self.f_v1ScaleFactor = 0
+            self.f_steps = 0
+
+            # clip rows the seg leaves on its columns, doom's
+            # drawseg silhouettes for the things behind it
+            self.i_v2xScreen = 0
+            self.f_v2ScaleFactor = 0
+            self.topClip = None # ceiling clip of v1x - v2x, None without a top silhouette
+            self.bottomClip = None # floor clip of v1x - v2x, None without a bottom silhouette
+
+    # a thing projected to the screen, doom's vissprite
+    class doomhistory_VisSprite(object):
+        def __init__(self):
+            self.sprite = None
+            self.b_flipped = False
+            self.f_scale = 0 # screen pixels per world unit at the thing
+            self.f_left = 0 # screen x of the patch's left edge
+            self.f_top = 0 # screen y of the patch's top edge
+            self.i_x1 = 0 # first and last screen x it covers
+            self.i_x2 = 0
+            self.lightNum = 0
+            self.f_x = 0 # world position
+            self.f_y = 0
+
     class doomhistory_SingleDrawLine(object):
         def __init__(self):
             self.x1 = 0
@@ -1553,82 +1456,347 @@ class FpsRenderer(object):
             self.x2 = 0
 
     def doomhistory_render(self, lineMode = False, onSegInspect = None):
+        self.beginFrame()
         # optional function pointer when we inspect a visible seg
         self.onSegInspect = onSegInspect
         self.wallRenderer = self.doomhistory_renderWall
         self.doomhistory_frameSegsDrawData.clear()
+        self.doomhistory_visibleSubsectors.clear()
         self.doomhistory_lineMode = lineMode
+        self.doomhistory_viewAngle = degToBam(self.player.angle.deg)
+
+        # angles and distances from the player to every vertex
+        self.view.update(self.player.x, self.player.y)
+        # cull segs facing away or outside the fov for the whole map
+        self.doomhistory_clipSegsToFov()
 
         # clear our clipping list of walls
-        self.segList = [SolidSegmentRange(-100000, -1)]
-        self.segList.append(SolidSegmentRange(self.f_width, 100000))
+        self.segList = SolidSegmentList(self.f_width)
         # clear our ceiling and floor clipping lists for portaled walls
         for i,v in enumerate(self.doomhistory_ceilingClipHeight):
             self.doomhistory_ceilingClipHeight[i] = -1; # reset
         for i,v in enumerate(self.doomhistory_floorClipHeight):
             self.doomhistory_floorClipHeight[i] = int(self.f_height)
+        self.visplanes.clear(self.player.x, self.player.y, self.player.getEyeZ(), self.player.angle.deg)
 
         # render 3d viewport
         # This no longer draws but stores what to draw in the section lists of FrameSegDrawData
-        self.map.renderBspNodes(self.player.x, self.player.y, self.doomhistory_renderSubsector)
+        self.map.renderBspNodes(self.player.x, self.player.y, self.doomhistory_renderSubsector, self.checkBspBox, self.isScreenFull)
 
-        self.doomhistory_drawStoredSegs()
-
-    def doomhistory_drawStoredSegs(self):
+        if lineMode:
+            self.doomhistory_drawStoredSegs()
+        else:
+            pixels = None
+            if self.doomhistory_textured and self.graphics is not None and self.graphics.colormap is not None:
+                pixels = self.doomhistory_wallPixels
+                pixels.fill(0)
+                self.doomhistory_drawStoredSegs(pixels)
+            else:
+                self.doomhistory_drawStoredSegs()
+            # floors and ceilings go in the rows the walls left open,
+            # things over both, as one layer over any wall lines
+            if self.drawPlanes:
+                pixels = self.visplanes.draw(self.graphics, self.getWallColor, pixels)
+            if self.drawSprites:
+                pixels = self.doomhistory_drawSprites(pixels)
+            if pixels is not None:
+                self.canvas.drawPixels([self.f_xOffset, self.f_yOffset], pixels)
+
+        self.endFrame()
+
+    # pixels given draws textured walls into them
+    def doomhistory_drawStoredSegs(self, pixels = None):
         for i,d in enumerate(self.doomhistory_frameSegsDrawData):
+            if pixels is not None:
+                self.doomhistory_drawTexturedSeg(d, pixels)
+                continue
             frontSidedef = d.seg.linedef.frontSidedef
             frontSector = frontSidedef.sector
+            # lit per column by distance, not by the sector alone
+            lightNum = self.lighting.getLightNum(frontSector.lightLevel, d.seg.startVertex, d.seg.endVertex)
             if d.b_drawUpperSection:
-                rgba = self.getWallColor(frontSidedef.upperTexture, frontSector.lightLevel)
-                self.doomhistory_drawSection(d.upperSection, rgba)
+                rgba = self.getWallColor(frontSidedef.upperTexture)
+                self.doomhistory_drawSection(d.upperSection, rgba, d, lightNum)
             if d.b_drawMiddleSection:
-                rgba = self.getWallColor(frontSidedef.middleTexture, frontSector.lightLevel)
-                self.doomhistory_drawSection(d.middleSection, rgba)
+                rgba = self.getWallColor(frontSidedef.middleTexture)
+                self.doomhistory_drawSection(d.middleSection, rgba, d, lightNum)
             if d.b_drawLowerSection:
-                rgba = self.getWallColor(frontSidedef.lowerTexture, frontSector.lightLevel)
-                self.doomhistory_drawSection(d.lowerSection, rgba)
+                rgba = self.getWallColor(frontSidedef.lowerTexture)
+                self.doomhistory_drawSection(d.lowerSection, rgba, d, lightNum)
+
+    def doomhistory_drawTexturedSeg(self, d, pixels):
+        seg = d.seg
+        sidedef = seg.linedef.backSidedef if seg.direction else seg.linedef.frontSidedef
+        flags = seg.linedef.flags
+        eyeZ = self.player.getEyeZ()
+        worldTop = seg.frontSector.ceilingHeight - eyeZ
+        lightNum = self.lighting.getLightNum(seg.frontSector.lightLevel, seg.startVertex, seg.endVertex)
+
+        # texture row 0 of each section relative to the eye,
+        # following doom's pegging
+        sections = []
+        if d.b_drawUpperSection:
+            # hangs from the back ceiling unless pegged to the top
+            texture = self.graphics.textures.getTexture(sidedef.upperTexture)
+            textureMid = worldTop
+            if texture is not None and not flags & Linedef.Flags.DONTPEGTOP:
+                textureMid = seg.backSector.ceilingHeight + texture.height - eyeZ
+            sections.append((d.upperSection, sidedef.upperTexture, texture, textureMid))
+        if d.b_drawMiddleSection:
+            # hangs from the ceiling unless pegged to the floor
+            texture = self.graphics.textures.getTexture(sidedef.middleTexture)
+            textureMid = worldTop
+            if texture is not None and flags & Linedef.Flags.DONTPEGBOTTOM:
+                textureMid = seg.frontSector.floorHeight + texture.height - eyeZ
+            sections.append((d.middleSection, sidedef.middleTexture, texture, textureMid))
+        if d.b_drawLowerSection:
+            # starts at the back floor unless pegged to the bottom,
+            # then lines up with a wall from the front ceiling
+            texture = self.graphics.textures.getTexture(sidedef.lowerTexture)
+            textureMid = seg.backSector.floorHeight - eyeZ
+            if flags & Linedef.Flags.DONTPEGBOTTOM:
+                textureMid = worldTop
+            sections.append((d.lowerSection, sidedef.lowerTexture, texture, textureMid))
+
+        for sectionList, textureName, texture, textureMid in sections:
+            if texture is None:
+                # missing textures stay flat colors
+                self.doomhistory_drawSection(sectionList, self.getWallColor(textureName), d, lightNum)
+            else:
+                self.doomhistory_drawTexturedSection(d, sidedef, sectionList, texture, textureMid + sidedef.yOffset, lightNum, pixels)
 
-    def doomhistory_drawSection(self, sectionList, rgba):
+    # samples every pixel of a section's columns from the texture
+    # in one gather, rows as the flat lines would cover them
+    def doomhistory_drawTexturedSection(self, d, sidedef, sectionList, texture, textureMid, lightNum, pixels):
+        if len(sectionList) == 0:
+            return
+        xs = np.array([line.x1 for line in sectionList], dtype=np.int64)
+        rowStart = np.ceil(np.array([line.y1 for line in sectionList], dtype=np.float64) - 0.5)
+        rowEnd = np.ceil(np.array([line.y2 for line in sectionList], dtype=np.float64) - 0.5)
+        rowStart = np.clip(rowStart, 0, self.f_height).astype(np.int64)
+        rowEnd = np.clip(rowEnd, 0, self.f_height).astype(np.int64)
+        yStart = int(rowStart.min())
+        yEnd = int(rowEnd.max())
+        if yStart >= yEnd:
+            return
+        rows = np.arange(yStart, yEnd)
+        spans = (rows[:, None] >= rowStart[None, :]) & (rows[:, None] < rowEnd[None, :])
+        rowIndex, columnIndex = np.nonzero(spans)
+        ys = rows[rowIndex]
+
+        # texture u where each column's ray meets the wall, as the
+        # distance along the seg from its start vertex
+        seg = d.seg
+        v1 = seg.startVertex
+        v2 = seg.endVertex
+        segDx = v2.x - v1.x
+        segDy = v2.y - v1.y
+        segLength = math.hypot(segDx, segDy)
+        angles = math.radians(self.player.angle.deg) + self.doomhistory_screenXToRadians[xs]
+        rayXs = np.cos(angles)
+        rayYs = np.sin(angles)
+        toPlayerX = self.player.x - v1.x
+        toPlayerY = self.player.y - v1.y
+        with np.errstate(divide='ignore', invalid='ignore'):
+            us = (toPlayerX * rayYs - toPlayerY * rayXs) * segLength / (segDx * rayYs - segDy * rayXs)
+        us = np.floor(np.nan_to_num(us) + seg.offset + sidedef.xOffset)
+
+        # texture v steps by 1 / scale per screen row
+        scales = d.f_v1ScaleFactor + d.f_steps * (xs - d.i_v1xScreen)
+        vs = np.floor(textureMid - (self.f_halfHeight - (ys + 0.5)) / scales[columnIndex])
+
+        # one colormap row per column, then one lookup for all pixels
+        lights = self.lighting.getWallLights(lightNum, scales)
+        rgb = self.graphics.colormap.shade(lights[columnIndex], texture.sample(us[columnIndex], vs))
+        # a line at x lands in pixel column x - 1
+        columns = xs[columnIndex] - 1
+        inside = columns >= 0
+        pixels[ys[inside], columns[inside], :3] = rgb[inside]
+        pixels[ys[inside], columns[inside], 3] = 255
+
+    # d and lightNum darken each line by the colormap row its
+    # column's scale factor picks
+    def doomhistory_drawSection(self, sectionList, rgba, d = None, lightNum = None):
+        colors = None
+        if d is not None and len(sectionList) > 0:
+            xs = np.array([line.x1 for line in sectionList])
+            lights = self.lighting.getWallLights(lightNum, d.f_v1ScaleFactor + d.f_steps * (xs - d.i_v1xScreen))
+            colors = [(rgba[0] * b, rgba[1] * b, rgba[2] * b, rgba[3]) for b in self.lighting.getBrightness(lights).tolist()]
         for i,line in enumerate(sectionList):
+            if colors is not None:
+                rgba = colors[i]
             drawStart = [line.x1 + self.f_xOffset, line.y1 + self.f_yOffset]
             drawEnd = [line.x2 + self.f_xOffset, line.y2 + self.f_yOffset]
             if self.doomhistory_lineMode:
                 if i % 4 == 0:
-                    self.game.drawLine(drawStart, drawEnd, rgba, 2)
+                    self.canvas.drawLine(drawStart, drawEnd, rgba, 2)
             else:
-                self.game.drawLine(drawStart, drawEnd, rgba, 1)
+                self.canvas.drawLine(drawStart, drawEnd, rgba, 1)
+
+    # doom's R_DrawMasked for things: the things standing in the
+    # subsectors the BSP walk reached are projected, then drawn
+    # far to near into pixels, each clipped by the silhouettes
+    # of the segs in front of it. Without pixels the things go
+    # into cleared doomhistory_wallPixels. Returns the pixels,
+    # None when there were none and no thing was drawn
+    def doomhistory_drawSprites(self, pixels = None):
+        if self.graphics is None or self.graphics.colormap is None:
+            return pixels
+        visSprites = self.doomhistory_projectSprites()
+        if len(visSprites) == 0:
+            return pixels
+        if pixels is None:
+            pixels = self.doomhistory_wallPixels
+            pixels.fill(0)
+        visSprites.sort(key=lambda visSprite: visSprite.f_scale)
+
+        # every silhouette column of the frame in flat arrays, a
+        # sprite picks the columns of the segs in front of it and
+        # merges them into its clip rows in one go
+        drawSegs = [d for d in self.doomhistory_frameSegsDrawData if d.topClip is not None or d.bottomClip is not None]
+        if len(drawSegs) > 0:
+            segX1 = np.array([d.i_v1xScreen for d in drawSegs], dtype=np.int64)
+            segX2 = np.array([d.i_v2xScreen for d in drawSegs], dtype=np.int64)
+            segScales = np.array([(d.f_v1ScaleFactor, d.f_v2ScaleFactor) for d in drawSegs], dtype=np.float64)
+            segMinScale = segScales.min(axis=1)
+            segMaxScale = segScales.max(axis=1)
+            segVertices = np.array([(d.seg.startVertex.x, d.seg.startVertex.y, d.seg.endVertex.x, d.seg.endVertex.y) for d in drawSegs], dtype=np.float64)
+            counts = segX2 - segX1 + 1
+            silhouetteSeg = np.repeat(np.arange(len(drawSegs)), counts)
+            silhouetteX = np.concatenate([np.arange(d.i_v1xScreen, d.i_v2xScreen + 1) for d in drawSegs])
+            silhouetteTop = np.concatenate([d.topClip if d.topClip is not None else np.full(count, -1.0) for d, count in zip(drawSegs, counts)])
+            silhouetteBottom = np.concatenate([d.bottomClip if d.bottomClip is not None else np.full(count, self.f_height) for d, count in zip(drawSegs, counts)])
+            playerSide = FpsRenderer.doomhistory_pointOnSide(self.player.x, self.player.y, segVertices)
+
+        for visSprite in visSprites:
+            xs = np.arange(visSprite.i_x1, visSprite.i_x2 + 1)
+            topClip = np.full(len(xs), -1.0)
+            bottomClip = np.full(len(xs), self.f_height)
+            if len(drawSegs) > 0:
+                # a seg is behind the thing when it is farther all
+                # along, or partly and the thing is on its near side
+                overlaps = (segX1 <= visSprite.i_x2) & (segX2 >= visSprite.i_x1)
+                behind = (segMaxScale < visSprite.f_scale) | ((segMinScale < visSprite.f_scale)\
+                    & (FpsRenderer.doomhistory_pointOnSide(visSprite.f_x, visSprite.f_y, segVertices) == playerSide))
+                inFront = overlaps & ~behind
+                if inFront.any():
+                    columns = inFront[silhouetteSeg] & (silhouetteX >= visSprite.i_x1) & (silhouetteX <= visSprite.i_x2)
+                    np.maximum.at(topClip, silhouetteX[columns] - visSprite.i_x1, silhouetteTop[columns])
+                    np.minimum.at(bottomClip, silhouetteX[columns] - visSprite.i_x1, silhouetteBottom[columns])
+            self.doomhistory_drawSprite(visSprite, xs, topClip, bottomClip, pixels)
+        return pixels
+
+    # -1, 0 or 1 for the side of every seg's line the point
+    # x, y is on, segVertices rows are x1, y1, x2, y2
+    @staticmethod
+    def doomhistory_pointOnSide(x, y, segVertices):
+        return np.sign((segVertices[:, 2] - segVertices[:, 0]) * (y - segVertices[:, 1])\
+            - (segVertices[:, 3] - segVertices[:, 1]) * (x - segVertices[:, 0]))
+
+    # R_ProjectSprite for the things of every reached subsector
+    def doomhistory_projectSprites(self):
+        MINZ = 4 # things closer than this are behind the screen
+        visSprites = []
+        subsectorThings = self.map.getSubsectorThings()
+        radians = math.radians(self.player.angle.deg)
+        cos = math.cos(radians)
+        sin = math.sin(radians)
+        eyeZ = self.player.getEyeZ()
+        for subsectorID in self.doomhistory_visibleSubsectors:
+            things = subsectorThings.get(subsectorID)
+            if things is None:
+                continue
+            sector = self.map.subsectors[subsectorID].firstSeg.frontSector
+            for thing in things:
+                dx = thing.x - self.player.x
+                dy = thing.y - self.player.y
+                # depth along the view direction and offset to its left
+                depth = dx * cos + dy * sin
+                if depth < MINZ:
+                    continue
+                side = dy * cos - dx * sin
+
+                # rotation of the thing as seen from the player
+                viewAngle = math.degrees(math.atan2(dy, dx))
+                rotation = int(((viewAngle - thing.angle + 202.5) % 360) // 45)
+                spriteFlipped = self.graphics.sprites.getThingSprite(thing.type, rotation)
+                if spriteFlipped is None:
+                    continue
+                sprite, flipped = spriteFlipped
+
+                scale = self.f_distancePlayerToScreen / depth
+                left = self.f_halfWidth - (side + sprite.leftOffset) * scale
+                right = left + sprite.width * scale
+                # columns whose clip rows exist, like the walls
+                x1 = max(int(math.ceil(left)), 1)
+                x2 = min(int(math.ceil(right)) - 1, int(self.f_width) - 1)
+                if x1 > x2:
+                    continue
+
+                visSprite = FpsRenderer.doomhistory_VisSprite()
+                visSprite.sprite = sprite
+                visSprite.b_flipped = flipped
+                visSprite.f_scale = scale
+                visSprite.f_left = left
+                visSprite.f_top = self.f_halfHeight - (sector.floorHeight + sprite.topOffset - eyeZ) * scale
+                visSprite.i_x1 = x1
+                visSprite.i_x2 = x2
+                visSprite.lightNum = self.lighting.getLightNum(sector.lightLevel)
+                visSprite.f_x = thing.x
+                visSprite.f_y = thing.y
+                visSprites.append(visSprite)
+        return visSprites
+
+    # samples the sprite's pixels for columns xs in one gather,
+    # rows from topClip up to bottomClip of each column are open
+    def doomhistory_drawSprite(self, visSprite, xs, topClip, bottomClip, pixels):
+        sprite = visSprite.sprite
+        scale = visSprite.f_scale
+        # rows with centers on the patch
+        yStart = max(int(math.ceil(visSprite.f_top - 0.5)), 0)
+        yEnd = min(int(math.ceil(visSprite.f_top + sprite.height * scale - 0.5)), int(self.f_height))
+        if yStart >= yEnd:
+            return
+        rows = np.arange(yStart, yEnd)
+        us = np.clip(((xs - visSprite.f_left) / scale).astype(np.int64), 0, sprite.width - 1)
+        if visSprite.b_flipped:
+            us = sprite.width - 1 - us
+        vs = np.clip(((rows + 0.5 - visSprite.f_top) / scale).astype(np.int64), 0, sprite.height - 1)
+
+        opaque = sprite.mask[us[None, :], vs[:, None]]
+        opaque &= (rows[:, None] >= topClip[None, :]) & (rows[:, None] < bottomClip[None, :])
+        rowIndex, columnIndex = np.nonzero(opaque)
+        if len(rowIndex) == 0:
+            return
+
+        lights = self.lighting.getWallLights(visSprite.lightNum, scale)
+        rgb = self.graphics.colormap.shade(lights, sprite.pixels[us[columnIndex], vs[rowIndex]])
+        # a line at x lands in pixel column x - 1
+        pixels[rows[rowIndex], xs[columnIndex] - 1, :3] = rgb
+        pixels[rows[rowIndex], xs[columnIndex] - 1, 3] = 255
 
     def doomhistory_renderSubsector(self, subsector):
-        # iterate segs in subsector
-        for i in range(subsector.segCount):
-            segId = subsector.firstSegID + i
-            seg = self.map.segs[segId]
-            linedef = seg.linedef
+        # things are only drawn in subsectors the walk reached
+        self.doomhistory_visibleSubsectors.append(subsector.ID)
 
-            v1 = seg.startVertex
-            v2 = seg.endVertex
-            # four angles
-            angles = self.doomhistory_clipVerticesToFov(v1, v2)
+        # only segs that survived doomhistory_clipSegsToFov,
+        # found by bisecting the subsector's seg ID range
+        visibleSegs = self.doomhistory_visibleSegs
+        lo = bisect_left(visibleSegs, subsector.firstSegID)
+        hi = bisect_left(visibleSegs, subsector.firstSegID + subsector.segCount, lo)
+        for i in range(lo, hi):
+            seg = self.map.segs[visibleSegs[i]]
 
-            if angles is not None:
-                if self.onSegInspect is not None:
-                    self.onSegInspect(seg, v1, v2)
+            if self.onSegInspect is not None:
+                self.onSegInspect(seg, seg.startVertex, seg.endVertex)
 
-                v1Angle = angles[0]
-                v2Angle = angles[1]
-                v1AngleFromPlayer = angles[2]
-                v2AngleFromPlayer = angles[3]
-
-                self.doomhistory_addWallInFov(seg, v1Angle, v2Angle, v1AngleFromPlayer, v2AngleFromPlayer)
+            v1Angle, v2Angle, v1xScreen, v2xScreen = self.doomhistory_visibleClips[i]
+            self.doomhistory_addWallInFov(seg, v1Angle, v2Angle, v1xScreen, v2xScreen)
 
-    def doomhistory_addWallInFov(self, seg, v1Angle, v2Angle, v1AngleFromPlayer, v2AngleFromPlayer):
+    def doomhistory_addWallInFov(self, seg, v1Angle, v2Angle, v1xScreen, v2xScreen):
         v1 = seg.startVertex
         v2 = seg.endVertex
 
-        # get screen projection Xs
-        v1xScreen = self.doomhistory_angleToScreen(v1AngleFromPlayer)
-        v2xScreen = self.doomhistory_angleToScreen(v2AngleFromPlayer)
-
         # skip same pixel wall
         if v1xScreen == v2xScreen:
             return
@@ -1669,15 +1837,15 @@ class FpsRenderer(object):
         RD.rgba = self.getWallColor(frontSidedef.middleTexture, frontSector.lightLevel)
 
         # calculate distance to first edge of the wall
-        angle90 = Angle(90)
-        segToNormalAngle = Angle(seg.getAngle() + angle90.deg)
-        normalToV1Angle = segToNormalAngle.subA(v1Angle)
+        # (seg angles are stored as the top 16 bits of a BAM)
+        segToNormalAngle = ((seg.angle << 16) + ANG90) & ANGLEMASK
+        normalToV1Angle = (segToNormalAngle - v1Angle) & ANGLEMASK
 
         # normal angle is 90deg to wall
-        segToPlayerAngle = angle90.subA(normalToV1Angle)
+        segToPlayerAngle = (ANG90 - normalToV1Angle) & ANGLEMASK
 
-        RD.f_distanceToV1 = self.player.distanceToVertex(v1)
-        RD.f_distanceToNormal = segToPlayerAngle.getSin() * RD.f_distanceToV1
+        RD.f_distanceToV1 = self.view.distances[v1.ID]
+        RD.f_distanceToNormal = finesine[segToPlayerAngle >> ANGLETOFINESHIFT] * RD.f_distanceToV1
 
         RD.f_v1ScaleFactor = self.doomhistory_getScaleFactor(v1xScreen, segToNormalAngle, RD.f_distanceToNormal)
         RD.f_v2ScaleFactor = self.doomhistory_getScaleFactor(v2xScreen, segToNormalAngle, RD.f_distanceToNormal)
@@ -1719,8 +1887,16 @@ class FpsRenderer(object):
                 RD.b_drawLowerSection = True
                 RD.f_lowerHeightStep = -(RD.f_backSectorFloor * RD.f_steps)
                 RD.i_lowerHeight = int(self.f_halfHeight - (RD.f_backSectorFloor * RD.f_v1ScaleFactor))
+        else:
+            self.doomhistory_ceilingFloorUpdate(seg, RD)
 
-        self.doomhistory_renderSegment(seg, v1xScreen, v2xScreen, RD)
+        # floor and ceiling openings, before the wall clips them
+        self.markVisplanes(seg, v1xScreen, v2xScreen, RD, self.doomhistory_ceilingClipHeight, self.doomhistory_floorClipHeight)
+
+        if self.wallSpans and v2xScreen - v1xScreen + 1 >= WallSpans.MINCOLUMNS:
+            self.doomhistory_renderSpans(seg, v1xScreen, v2xScreen, RD)
+        else:
+            self.doomhistory_renderSegment(seg, v1xScreen, v2xScreen, RD)
 
     # Method in DOOM engine that calculated a wall height
     # scale factor given a distance of the wall from the screen
@@ -1730,46 +1906,41 @@ class FpsRenderer(object):
         MAX_SCALEFACTOR = 64.0
         MIN_SCALEFACTOR = 0.00390625
 
-        angle90 = Angle(90)
-        screenXAngle = self.doomhistory_screenXToAngleLookup[vxScreen] # Angle object
-        skewAngle = screenXAngle.addA(self.player.angle).subA(segToNormalAngle)
+        screenXAngle = self.doomhistory_screenXToAngleLookup[vxScreen] # BAM
+        skewAngle = (screenXAngle + self.doomhistory_viewAngle - segToNormalAngle) & ANGLEMASK
 
         # get scale factor
-        screenXAngleCos = screenXAngle.getCos()
-        skewAngleCos = skewAngle.getCos()
+        screenXAngleCos = self.doomhistory_screenXToAngleCos[vxScreen]
+        skewAngleCos = finecosine[skewAngle >> ANGLETOFINESHIFT]
         scaleFactor = (self.f_distancePlayerToScreen * skewAngleCos) / (distanceToNormal * screenXAngleCos)
 
         # clamp
         scaleFactor = min(MAX_SCALEFACTOR, max(MIN_SCALEFACTOR, scaleFactor))
         return scaleFactor
 
+    # angle is a BAM rotated so the view direction is at 90
     def doomhistory_angleToScreen(self, angle):
-        ix = 0
-        # TODO should these be 90 or fov?
-        if angle.gtF(90):
-            # left side
-            a_newAngle = Angle(angle.deg - 90)
-            ix = self.f_distancePlayerToScreen - round(a_newAngle.getTan() * self.f_halfWidth)
-        else:
-            # right side
-            a_newAngle = Angle(90 - angle.deg)
-            ix = round(a_newAngle.getTan() * self.f_halfWidth) + self.f_distancePlayerToScreen
-        return int(ix)
+        return self.doomhistory_fineAngleToScreenX[angle >> ANGLETOFINESHIFT]
 
     def doomhistory_ceilingFloorUpdate(self, seg, RD):
         # RD is a reference so that is correct in we need to modify its contents
         if seg.backSector is None:
             RD.b_updateCeiling = True
             RD.b_updateFloor = True
-            return
+        else:
+            RD.b_updateCeiling = RD.f_backSectorCeiling != RD.f_frontSectorCeiling
+            RD.b_updateFloor = RD.f_backSectorFloor != RD.f_frontSectorFloor
 
-        RD.b_updateCeiling = RD.f_backSectorCeiling != RD.f_frontSectorCeiling
-        RD.b_updateFloor = RD.f_backSectorFloor != RD.f_frontSectorFloor
+            # another flat or light is another visplane
+            if seg.backSector.ceilingTexture != seg.frontSector.ceilingTexture or seg.backSector.lightLevel != seg.frontSector.lightLevel:
+                RD.b_updateCeiling = True
+            if seg.backSector.floorTexture != seg.frontSector.floorTexture or seg.backSector.lightLevel != seg.frontSector.lightLevel:
+                RD.b_updateFloor = True
 
-        if seg.backSector.ceilingHeight <= seg.frontSector.floorHeight or seg.backSector.floorHeight >= seg.frontSector.ceilingHeight:
-            # closed door
-            RD.b_updateCeiling = True
-            RD.b_updateFloor = True
+            if seg.backSector.ceilingHeight <= seg.frontSector.floorHeight or seg.backSector.floorHeight >= seg.frontSector.ceilingHeight:
+                # closed door
+                RD.b_updateCeiling = True
+                RD.b_updateFloor = True
 
         if seg.frontSector.ceilingHeight <= self.player.getEyeZ():
             # below view plane
@@ -1786,6 +1957,9 @@ class FpsRenderer(object):
         segDrawData.b_drawUpperSection = RD.b_drawUpperSection
         segDrawData.b_drawMiddleSection = seg.backSector is None
         segDrawData.b_drawLowerSection = RD.b_drawLowerSection
+        segDrawData.i_v1xScreen = v1xScreen
+        segDrawData.f_v1ScaleFactor = RD.f_v1ScaleFactor
+        segDrawData.f_steps = RD.f_steps
 
         iXCurrent = v1xScreen
         while iXCurrent <= v2xScreen:
@@ -1823,9 +1997,57 @@ class FpsRenderer(object):
             iXCurrent += 1
 
         # Save our draw data for this seg to the list
-        if segDrawData.b_drawUpperSection or segDrawData.b_drawMiddleSection or segDrawData.b_drawLowerSection:
+        self.doomhistory_storeSilhouette(seg, v1xScreen, v2xScreen, RD, segDrawData)
+        if segDrawData.b_drawUpperSection or segDrawData.b_drawMiddleSection or segDrawData.b_drawLowerSection\
+                or segDrawData.topClip is not None or segDrawData.bottomClip is not None:
+            self.doomhistory_frameSegsDrawData.append(segDrawData)
+
+    # doomhistory_renderSegment with the heights of every column
+    # worked out by WallSpans, only the lines are made per column
+    def doomhistory_renderSpans(self, seg, v1xScreen, v2xScreen, RD):
+        segDrawData = FpsRenderer.doomhistory_FrameSegDrawData()
+        segDrawData.seg = seg;
+        segDrawData.b_drawUpperSection = RD.b_drawUpperSection
+        segDrawData.b_drawMiddleSection = seg.backSector is None
+        segDrawData.b_drawLowerSection = RD.b_drawLowerSection
+        segDrawData.i_v1xScreen = v1xScreen
+        segDrawData.f_v1ScaleFactor = RD.f_v1ScaleFactor
+        segDrawData.f_steps = RD.f_steps
+
+        spans = WallSpans(RD, v1xScreen, v2xScreen, seg.backSector is not None,
+                          self.doomhistory_ceilingClipHeight, self.doomhistory_floorClipHeight, self.f_height)
+        if seg.backSector is None:
+            for i,x in enumerate(spans.xs):
+                self.doomhistory_addLineToSection(segDrawData.middleSection, x, spans.ceilingEnd[i], spans.floorStart[i])
+        else:
+            for i,x in enumerate(spans.xs):
+                if RD.b_drawUpperSection and spans.upperDrawn[i]:
+                    self.doomhistory_addLineToSection(segDrawData.upperSection, x, spans.ceilingEnd[i], spans.upper[i])
+                if RD.b_drawLowerSection and spans.lowerDrawn[i]:
+                    self.doomhistory_addLineToSection(segDrawData.lowerSection, x, spans.lower[i], spans.floorStart[i])
+
+        # Save our draw data for this seg to the list
+        self.doomhistory_storeSilhouette(seg, v1xScreen, v2xScreen, RD, segDrawData)
+        if segDrawData.b_drawUpperSection or segDrawData.b_drawMiddleSection or segDrawData.b_drawLowerSection\
+                or segDrawData.topClip is not None or segDrawData.bottomClip is not None:
             self.doomhistory_frameSegsDrawData.append(segDrawData)
 
+    # copies the clip rows a seg left on its columns, things
+    # behind the seg are clipped to them. Solid walls hide all
+    # of their columns, portals only clip where they moved a clip
+    def doomhistory_storeSilhouette(self, seg, v1xScreen, v2xScreen, RD, segDrawData):
+        segDrawData.i_v2xScreen = v2xScreen
+        segDrawData.f_v2ScaleFactor = RD.f_v2ScaleFactor
+        count = v2xScreen - v1xScreen + 1
+        if seg.backSector is None:
+            segDrawData.topClip = np.full(count, self.f_height, dtype=np.float64)
+            segDrawData.bottomClip = np.full(count, -1, dtype=np.float64)
+            return
+        if RD.b_drawUpperSection or RD.b_updateCeiling:
+            segDrawData.topClip = np.array(self.doomhistory_ceilingClipHeight[v1xScreen:v2xScreen + 1], dtype=np.float64)
+        if RD.b_drawLowerSection or RD.b_updateFloor:
+            segDrawData.bottomClip = np.array(self.doomhistory_floorClipHeight[v1xScreen:v2xScreen + 1], dtype=np.float64)
+
     def doomhistory_drawUpperSection(self, RD, iXCurrent, i_currentCeilingEnd, segDrawData):
         if RD.b_drawUpperSection:
             i_upperHeight = RD.i_upperHeight
@@ -1840,7 +2062,7 @@ class FpsRenderer(object):
                 self.doomhistory_ceilingClipHeight[iXCurrent] = i_upperHeight
             else:
                 self.doomhistory_ceilingClipHeight[iXCurrent] = i_currentCeilingEnd - 1
-        else:
+        elif RD.b_updateCeiling:
             self.doomhistory_ceilingClipHeight[iXCurrent] = i_currentCeilingEnd - 1
 
     def doomhistory_drawLowerSection(self, RD, iXCurrent, i_currentFloorStart, segDrawData):
@@ -1857,7 +2079,7 @@ class FpsRenderer(object):
                 self.doomhistory_floorClipHeight[iXCurrent] = i_lowerHeight
             else:
                 self.doomhistory_floorClipHeight[iXCurrent] = i_currentFloorStart + 1
-        else:
+        elif RD.b_updateFloor:
             self.doomhistory_floorClipHeight[iXCurrent] = i_currentFloorStart + 1
 
     def doomhistory_drawMiddleSection(self, RD, iXCurrent, i_currentCeilingEnd, i_currentFloorStart, segDrawData):
@@ -1874,200 +2096,57 @@ class FpsRenderer(object):
         line.y2 = i_currentFloorStart
         sectionList.append(line)
 
-    # needs to return 4 angles
-    def doomhistory_clipVerticesToFov(self, v1, v2):
-        a_fov = Angle(self.f_fov)
-
-        v1Angle = self.player.angleToVertex(v1)
-        v2Angle = self.player.angleToVertex(v2)
-
-        a_spanAngle = v1Angle.subA(v2Angle)
-        if a_spanAngle.gteF(self.f_fov * 2):
-            return None
-        # Cases
-        #  ~: Seg left and right are in fov and fully visible
-        #  A: Seg is all the way to the left and not visible
-        #  B: Seg is to the right and not visible
-        #  C: Right part of seg is visible and left is clipped
-        #  D: Left part of seg is visible and right is clipped
-        #  E: Left and right are clipped but middle is visible
-        # segs must be facing us
-        # segs are made of two vertices
-        # rotate the seg minus the player angle
-        v1AngleFromPlayer = v1Angle.subA(self.player.angle)
-        v2AngleFromPlayer = v2Angle.subA(self.player.angle)
-        # this puts their vertices around the 0 degree
-        # left side of FOV is 45
-        # right side of FOV = -45 (315)
-        # if we rotate player to 45 then
-        # left side is at 90
-        # right side is at 0 (no negative comparisons)
-        # if V1 is > 90 its outside
-        # if V2 is < 0 its outside
-
-        # v1 test:
-        a_halfFov = a_fov.divF(2)
-        a_v1Moved = v1AngleFromPlayer.addA(a_halfFov)
-        if a_v1Moved.gtA(a_fov):
-            # v1 is outside the fov
-            # check if angle of v1 to v2 is also outside fov
-            # by comparing how far v1 is away from fov
-            # if more than dist v1 to v2 then the angle outside fov
-            a_v1MovedAngle = a_v1Moved.subA(a_fov)
-            if a_v1MovedAngle.gteA(a_spanAngle):
-                return None
-
-            # v2 is valid, clip v1
-            v1AngleFromPlayer = a_halfFov.new()
-
-        # v2 test: (we cant have angle < 0 so subtract angle from halffov)
-        a_v2Moved = a_halfFov.subA(v2AngleFromPlayer)
-        if a_v2Moved.gtA(a_fov):
-            v2AngleFromPlayer = a_halfFov.neg()
-
-        # rerotate angles
-        v1AngleFromPlayer.iaddA(a_fov)
-        v2AngleFromPlayer.iaddA(a_fov)
-
-        return v1Angle, v2Angle, v1AngleFromPlayer, v2AngleFromPlayer
-
-    # python DIY linked lists are a nightmare
-    # because of the pass-object-by-reference
-    # nature of variables
-    # when I change next and prev values on a
-    # node it changes it for that copy of the
-    # variable, and not for the underlying reference
-    # TODO take a seg and implement StoreWallRange
-    # so that we can update the segs display range
+    # clips every seg of the map to the fov in one numpy pass,
+    # keeps the IDs of the segs facing us inside the fov with
+    # their angles and clipped screen xs. Vertex angles are
+    # rotated by the view angle plus half the fov so the fov
+    # spans 0 - fov with no negative compares: a seg whose v1 is
+    # past the left edge by at least its span is out, else v1 is
+    # clipped to the left edge and a v2 past the right edge to
+    # the right edge, like doomportals_clipVerticesToFov
+    def doomhistory_clipSegsToFov(self):
+        fov = self.doomhistory_fov
+        halfFov = self.doomhistory_halfFov
+        v1Angle = self.view.bamArray[self.map.seg_v1]
+        v2Angle = self.view.bamArray[self.map.seg_v2]
+
+        # facing us
+        spanAngle = (v1Angle - v2Angle) & ANGLEMASK
+        visible = spanAngle < self.doomhistory_spanLimit
+
+        v1AngleFromPlayer = (v1Angle - self.doomhistory_viewAngle) & ANGLEMASK
+        v2AngleFromPlayer = (v2Angle - self.doomhistory_viewAngle) & ANGLEMASK
+
+        # v1 outside the fov, drop the seg if v2 is outside too
+        # else clip v1 to the left edge
+        v1Moved = (v1AngleFromPlayer + halfFov) & ANGLEMASK
+        v1Outside = v1Moved > fov
+        visible &= ~(v1Outside & (((v1Moved - fov) & ANGLEMASK) >= spanAngle))
+        v1AngleFromPlayer[v1Outside] = halfFov
+
+        # v2 outside the fov, clip to the right edge
+        v2Moved = (halfFov - v2AngleFromPlayer) & ANGLEMASK
+        v2AngleFromPlayer[v2Moved > fov] = -halfFov & ANGLEMASK
+
+        # rerotate angles and project the survivors
+        segIds = np.flatnonzero(visible)
+        v1xScreen = self.doomhistory_fineAngleToScreenXArray[((v1AngleFromPlayer[segIds] + fov) & ANGLEMASK) >> ANGLETOFINESHIFT]
+        v2xScreen = self.doomhistory_fineAngleToScreenXArray[((v2AngleFromPlayer[segIds] + fov) & ANGLEMASK) >> ANGLETOFINESHIFT]
+
+        self.doomhistory_visibleSegs = segIds.tolist()
+        self.doomhistory_visibleClips = list(zip(v1Angle[segIds].tolist(), v2Angle[segIds].tolist(), v1xScreen.tolist(), v2xScreen.tolist()))
+
+    # draws the parts of the wall not already hidden behind
+    # solid walls and marks its columns covered
     def doomhistory_clipSolidWall(self, seg, segList, v1xScreen, v2xScreen, v1Angle, v2Angle, rangeRenderer):
-        if len(segList) < 2:
-            return
-
-        segId = seg.ID
-        segRange = None
-        segIndex = None
-        # skip all segments that end before this wall starts
-        i=0
-        while (i < len(segList) and segList[i].xEnd < v1xScreen - 1):
-            i += 1
-        segIndex = i
-        segRange = segList[segIndex]
-
-        # should always have a node since we cap our ends with
-        # "infinity"
-        # START to OVERLAP
-        if v1xScreen < segRange.xStart:
-            # found a position in the node list
-            # are they overlapping?
-            if v2xScreen < segRange.xStart - 1:
-                # all of the wall is visible to insert it
-                # STOREWALL
-                # StoreWallRange(seg, CurrentWall.XStart, CurrentWall.XEnd);
-                rangeRenderer(seg, v1xScreen, v2xScreen, v1Angle, v2Angle)
-                segList.insert(segIndex, SolidSegmentRange(v1xScreen, v2xScreen))
-                # go to next wall
-                return
-            # if not overlapping, end is already included
-            # so just update the start
-            # STOREWALL
-            # StoreWallRange(seg, CurrentWall.XStart, FoundClipWall->XStart - 1);
-            rangeRenderer(seg, v1xScreen,  segRange.xStart - 1, v1Angle, v2Angle)
-            segRange.xStart = v1xScreen
-
-        # FULL OVERLAPPED
-        # this part is already occupied
-        if v2xScreen <= segRange.xEnd:
-            return # go to next wall
-
-        # CHOP AND MERGE
-        # start by looking at the next entry in the list
-        # is the next entry within the current wall range?
-        nextSegIndex = segIndex
-        nextSegRange = segRange
-        while v2xScreen >= segList[nextSegIndex + 1].xStart - 1:
-            # STOREWALL
-            # StoreWallRange(seg, NextWall->XEnd + 1, next(NextWall, 1)->XStart - 1);
-            rangeRenderer(seg, nextSegRange.xEnd + 1,  segList[nextSegIndex + 1].xStart - 1, v1Angle, v2Angle)
-
-            nextSegIndex += 1
-            nextSegRange = segList[nextSegIndex]
-            # partially clipped by other walls, store each fragment
-            if v2xScreen <= nextSegRange.xEnd:
-                segRange.xEnd = nextSegRange.xEnd
-                if nextSegIndex != segIndex:
-                    segIndex += 1
-                    nextSegIndex += 1
-                    del segList[segIndex:nextSegIndex]
-                return
-
-        # wall precedes all known segments
-        # STOREWALL
-        # StoreWallRange(seg, NextWall->XEnd + 1, CurrentWall.XEnd);
-        rangeRenderer(seg, nextSegRange.xEnd + 1,  v2xScreen, v1Angle, v2Angle)
-        segRange.xEnd = v2xScreen
-
-        if (nextSegIndex != segIndex):
-            segIndex += 1
-            nextSegIndex += 1
-            del segList[segIndex:nextSegIndex]
-        return
+        for xStart, xEnd in segList.clipSolid(v1xScreen, v2xScreen):
+            # StoreWallRange(seg, xStart, xEnd)
+            rangeRenderer(seg, xStart, xEnd, v1Angle, v2Angle)
 
     # Very similar to clipSolidWall but does not
     # modify the segList
     def doomhistory_clipPortalWall(self, seg, segList, v1xScreen, v2xScreen, v1Angle, v2Angle, rangeRenderer):
-        # find clip window
-        segId = seg.ID
-        segRange = None
-        segIndex = None
-        # skip all segments that end before this wall starts
-        i=0
-        while (i < len(segList) and segList[i].xEnd < v1xScreen - 1):
-            i += 1
-        segIndex = i
-        segRange = segList[segIndex]
-
-        # should always have a node since we cap our ends with
-        # "infinity"
-        # START to OVERLAP
-        if v1xScreen < segRange.xStart:
-            # found a position in the node list
-            # are they overlapping?
-            if v2xScreen < segRange.xStart - 1:
-                # all of the wall is visible to insert it
-                # STOREWALL
-                # StoreWallRange(seg, CurrentWall.XStart, CurrentWall.XEnd);
-                rangeRenderer(seg, v1xScreen, v2xScreen, v1Angle, v2Angle)
-                # go to next wall
-                return
-            # if not overlapping, end is already included
-            # so just update the start
-            # STOREWALL
-            # StoreWallRange(seg, CurrentWall.XStart, FoundClipWall->XStart - 1);
-            rangeRenderer(seg, v1xScreen,  segRange.xStart - 1, v1Angle, v2Angle)
-
-        # FULL OVERLAPPED
-        # this part is already occupied
-        if v2xScreen <= segRange.xEnd:
-            return # go to next wall
-
-        # CHOP AND MERGE
-        # start by looking at the next entry in the list
-        # is the next entry within the current wall range?
-        nextSegIndex = segIndex
-        nextSegRange = segRange
-        while v2xScreen >= segList[nextSegIndex + 1].xStart - 1:
-            # STOREWALL
-            # StoreWallRange(seg, NextWall->XEnd + 1, next(NextWall, 1)->XStart - 1);
-            rangeRenderer(seg, nextSegRange.xEnd + 1,  segList[nextSegIndex + 1].xStart - 1, v1Angle, v2Angle)
-
-            nextSegIndex += 1
-            nextSegRange = segList[nextSegIndex]
-            # partially clipped by other walls, store each fragment
-            if v2xScreen <= nextSegRange.xEnd:
-                return
-
-        # wall precedes all known segments
-        # STOREWALL
-        # StoreWallRange(seg, NextWall->XEnd + 1, CurrentWall.XEnd);
-        rangeRenderer(seg, nextSegRange.xEnd + 1,  v2xScreen, v1Angle, v2Angle)
+        for xStart, xEnd in segList.clipPortal(v1xScreen, v2xScreen):
+            # StoreWallRange(seg, xStart, xEnd)
+            rangeRenderer(seg, xStart, xEnd, v1Angle, v2Angle)
 
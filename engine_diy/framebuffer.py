@@ -0,0 +1,170 @@
+import math
+import numpy as np
+
+# Software framebuffer for the fps viewport
+#
+# Takes the same drawLine/drawRectangle calls as Game2D but
+# rasterizes them into an RGBA uint8 array, so a frame made of
+# hundreds of wall columns ends up as one Game2D.drawPixels
+# upload instead of a glBegin/glEnd pair per column
+#
+# Calls are in window coordinates like Game2D, xOffset/yOffset
+# is where the framebuffer sits in the window. Pixel (x, y)
+# covers [x, x+1) x [y, y+1) and shapes pick their pixels with
+# the same center and tie rules as Mesa's GL rasterizer so both
+# paths give the same image. Pixels never drawn keep alpha 0
+# so whatever is behind the viewport shows through
+
+class Framebuffer(object):
+    def __init__(self, width, height, xOffset=0, yOffset=0):
+        self.width = int(width)
+        self.height = int(height)
+        self.xOffset = xOffset
+        self.yOffset = yOffset
+        self.pixels = np.zeros((self.height, self.width, 4), dtype=np.uint8) # [y, x] rgba
+        self.colors = {} # rgba floats -> uint8 color, walls reuse a few colors every frame
+
+    def clear(self):
+        self.pixels.fill(0)
+
+    def toColor(self, rgba):
+        key = tuple(rgba)
+        if key not in self.colors:
+            self.colors[key] = np.array([int(round(min(max(c, 0), 1) * 255)) for c in rgba], dtype=np.uint8)
+        return self.colors[key]
+
+    # writes a color into pixels[index], blending like
+    # GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA when not opaque
+    def fill(self, index, rgba):
+        color = self.toColor(rgba)
+        if color[3] == 255:
+            self.pixels[index] = color
+            return
+        alpha = color[3] / 255.0
+        self.pixels[index] = np.rint(color * alpha + self.pixels[index] * (1.0 - alpha)).astype(np.uint8)
+
+    # rectangle corners snap to 1/256 of a pixel like GL's
+    def snap(self, v):
+        return round(v * 256) / 256.0
+
+    # rows a vertical line covers walking from start to end,
+    # first and one past last. GL draws the rows whose centers
+    # lie from start up to but excluding end, except that an end
+    # less than 1/512 of a pixel under a center counts as just
+    # over it, a side effect of its float32 vertices and
+    # subpixel snapping
+    def columnRange(self, start, end):
+        if start <= end:
+            return self.columnEdge(start, True), self.columnEdge(end, True)
+        return self.columnEdge(end, False), self.columnEdge(start, False)
+
+    def columnEdge(self, v, down):
+        v = float(np.float32(v)) # GL vertices are float32
+        if down and v - math.floor(v) == 0.5:
+            return int(math.floor(v))
+        return int(math.floor(v + 0.5 + 0.5 / 256))
+
+    def drawLine(self, start, end, rgba, width):
+        x1 = start[0] - self.xOffset
+        y1 = start[1] - self.yOffset
+        x2 = end[0] - self.xOffset
+        y2 = end[1] - self.yOffset
+        width = int(width)
+        # wide lines repeat across the minor axis
+        offsets = [k - (width - 1) / 2.0 for k in range(width)]
+        # vertical lines are wall columns, fill them as one slice
+        if x1 == x2:
+            yStart, yEnd = self.columnRange(y1, y2)
+            yStart, yEnd = max(yStart, 0), min(yEnd, self.height)
+            # a line on a column boundary goes to the left column
+            xStart = max(int(math.ceil(x1 + offsets[0])) - 1, 0)
+            xEnd = min(int(math.ceil(x1 + offsets[-1])), self.width)
+            if xStart < xEnd and yStart < yEnd:
+                self.fill((slice(yStart, yEnd), slice(xStart, xEnd)), rgba)
+            return
+        # any other line follows GL's diamond exit rule, a pixel
+        # is drawn when the line leaves the diamond |u| + |v| < 1/2
+        # around its center on the way to end. u runs along the
+        # major axis, v across it
+        yMajor = abs(y2 - y1) > abs(x2 - x1)
+        if yMajor:
+            u1, u2, v1, v2 = y1, y2, x1, x2
+        else:
+            u1, u2, v1, v2 = x1, x2, y1, y2
+        slope = (v2 - v1) / (u2 - u1)
+        us = np.arange(math.floor(min(u1, u2)) - 1, math.floor(max(u1, u2)) + 2)
+        centers = us + 0.5
+        drawnUs = []
+        drawnVs = []
+        for offset in offsets:
+            vs = v1 + offset + (centers - u1) * slope
+            # the pixel across the line at each center, rounding
+            # toward the left and the bottom of the window
+            pixelVs = np.ceil(vs) - 1 if yMajor else np.floor(vs)
+            d = vs - (pixelVs + 0.5)
+            # distance from the center to where the line leaves
+            # the diamond, forward along u or backward
+            with np.errstate(divide='ignore'):
+                if u2 > u1:
+                    exits = centers + np.minimum((0.5 - d) / (1 + slope), (0.5 + d) / (1 - slope))
+                    drawn = (u1 < exits) & (exits <= u2)
+                else:
+                    exits = centers - np.minimum((0.5 - d) / (1 - slope), (0.5 + d) / (1 + slope))
+                    drawn = (u2 <= exits) & (exits < u1)
+            drawnUs.append(us[drawn])
+            drawnVs.append(pixelVs[drawn])
+        us = np.concatenate(drawnUs).astype(np.int64)
+        vs = np.concatenate(drawnVs).astype(np.int64)
+        xs, ys = (vs, us) if yMajor else (us, vs)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        if inside.any():
+            self.fill((ys[inside], xs[inside]), rgba)
+
+    # rectangles fill the pixels whose centers they cover, a
+    # center on the edge counts on the left and bottom sides
+    def drawRectangle(self, pos, width, height, rgba):
+        x1 = self.snap(pos[0] - self.xOffset)
+        y1 = self.snap(pos[1] - self.yOffset)
+        x2 = self.snap(pos[0] + width - self.xOffset)
+        y2 = self.snap(pos[1] + height - self.yOffset)
+        xStart = max(int(math.ceil(min(x1, x2) - 0.5)), 0)
+        xEnd = min(int(math.ceil(max(x1, x2) - 0.5)), self.width)
+        yStart = max(int(math.floor(min(y1, y2) + 0.5)), 0)
+        yEnd = min(int(math.floor(max(y1, y2) + 0.5)), self.height)
+        if xStart < xEnd and yStart < yEnd:
+            self.fill((slice(yStart, yEnd), slice(xStart, xEnd)), rgba)
+
+    # filled circle of the pixels whose centers are within radius
+    def drawPoint(self, pos, rgba, radius):
+        x = pos[0] - self.xOffset
+        y = pos[1] - self.yOffset
+        xStart, xEnd = max(int(math.floor(x - radius)), 0), min(int(math.ceil(x + radius)), self.width)
+        yStart, yEnd = max(int(math.floor(y - radius)), 0), min(int(math.ceil(y + radius)), self.height)
+        if xStart >= xEnd or yStart >= yEnd:
+            return
+        xs = np.arange(xStart, xEnd) + 0.5 - x
+        ys = np.arange(yStart, yEnd) + 0.5 - y
+        inside = ys[:, None] ** 2 + xs[None, :] ** 2 <= radius * radius
+        rows, cols = np.nonzero(inside)
+        self.fill((rows + yStart, cols + xStart), rgba)
+
+    # composites an RGBA uint8 array by its alpha with its top
+    # left corner at pos, like Game2D.drawPixels
+    def drawPixels(self, pos, pixels):
+        x = int(pos[0] - self.xOffset)
+        y = int(pos[1] - self.yOffset)
+        xStart, yStart = max(x, 0), max(y, 0)
+        xEnd = min(x + pixels.shape[1], self.width)
+        yEnd = min(y + pixels.shape[0], self.height)
+        if xStart >= xEnd or yStart >= yEnd:
+            return
+        src = pixels[yStart - y:yEnd - y, xStart - x:xEnd - x].astype(np.float64)
+        dst = self.pixels[yStart:yEnd, xStart:xEnd]
+        alpha = src[:, :, 3:4] / 255.0
+        dst[...] = np.rint(src * alpha + dst * (1.0 - alpha)).astype(np.uint8)
+
+    def drawBox(self, tl, tr, br, bl, rgba, width):
+        self.drawLine(tl, tr, rgba, width)
+        self.drawLine(tr, br, rgba, width)
+        self.drawLine(br, bl, rgba, width)
+        self.drawLine(bl, tl, rgba, width)
@@ -1,4 +1,5 @@
 import pygame, os, math
+import numpy as np
 from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
@@ -13,6 +14,14 @@ class Game2D(object):
         self.keyHoldCallbacks = {}
         self.mouseMoveCallbacks = []
         self.keyHolds = {}
+        # lines, rectangles and points are queued per frame and
+        # drawn with one glDrawArrays per run of calls sharing a
+        # primitive and line width, set False to draw each call
+        # immediately
+        self.batching = True
+        self.batches = [] # [glMode, lineWidth, vertices, colors] in draw order
+        self.circles = {} # segment count -> unit circle triangles, see drawPoint
+        self.displayLists = {} # name -> (GL display list, key), see drawCached
 
     def setupWindow(self, width, height):
         self.width = width
@@ -89,10 +98,64 @@ class Game2D(object):
         glLoadIdentity()
 
     def drawEnd(self):
+        self.flush()
         glPopMatrix()
         pygame.display.flip() # buffer swap
 
+    # batch to append to, a new one whenever the primitive or
+    # line width changes so overlapping draws keep their order
+    def getBatch(self, mode, width):
+        if len(self.batches) == 0 or self.batches[-1][0] != mode or self.batches[-1][1] != width:
+            self.batches.append([mode, width, [], []])
+        return self.batches[-1]
+
+    # draws and empties the queued batches, called at drawEnd
+    # and before anything drawn immediately
+    def flush(self):
+        if len(self.batches) == 0:
+            return
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        for mode, width, vertices, colors in self.batches:
+            if width is not None:
+                glLineWidth(width)
+            vertexArray = np.array(vertices, dtype=np.float32)
+            colorArray = np.array(colors, dtype=np.float32)
+            glVertexPointer(2, GL_FLOAT, 0, vertexArray)
+            glColorPointer(4, GL_FLOAT, 0, colorArray)
+            glDrawArrays(mode, 0, len(vertexArray) // 2)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        self.batches = []
+
+    # draws static geometry compiled into a display list by
+    # drawFunc the first time, replaying it every later frame
+    # until key changes, e.g. when the view is zoomed or panned
+    def drawCached(self, name, key, drawFunc):
+        displayList, oldKey = self.displayLists.get(name, (None, None))
+        # keep earlier queued draws out of the list
+        self.flush()
+        if displayList is None or oldKey != key:
+            if displayList is None:
+                displayList = glGenLists(1)
+            glNewList(displayList, GL_COMPILE)
+            drawFunc()
+            self.flush()
+            glEndList()
+            self.displayLists[name] = (displayList, key)
+        glCallList(displayList)
+
+    def invalidateCached(self, name):
+        if name in self.displayLists:
+            glDeleteLists(self.displayLists[name][0], 1)
+            del self.displayLists[name]
+
     def drawLine(self, start, end, rgba, width):
+        if self.batching:
+            batch = self.getBatch(GL_LINES, width)
+            batch[2].extend((start[0], start[1], end[0], end[1]))
+            batch[3].extend((rgba[0], rgba[1], rgba[2], rgba[3]) * 2)
+            return
         glLineWidth(width)
         glColor4f(rgba[0], rgba[1], rgba[2], rgba[3])
         glBegin(GL_LINES)
@@ -100,18 +163,47 @@ class Game2D(object):
         glVertex2f(end[0], end[1])
         glEnd()
 
+    # enough circle segments for edges about 2 pixels long,
+    # rounded to a multiple of 4 so nearby radii share geometry
+    def getCircleSegments(self, radius):
+        return min(max(int(math.ceil(math.pi * radius / 4)) * 4, 8), 128)
+
+    # unit circle as a triangle list, cached per segment count
+    def getCircle(self, segments):
+        if segments not in self.circles:
+            angles = np.arange(segments + 1) * (2 * math.pi / segments)
+            rim = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+            triangles = np.zeros((segments, 3, 2), dtype=np.float32) # center, rim, next rim
+            triangles[:, 1] = rim[:-1]
+            triangles[:, 2] = rim[1:]
+            self.circles[segments] = triangles.reshape(-1, 2)
+        return self.circles[segments]
+
     def drawPoint(self, pos, rgba, radius):
+        circle = self.getCircle(self.getCircleSegments(radius))
+        if self.batching:
+            # scaled and moved into place on the cpu so any number
+            # of points share one draw call
+            batch = self.getBatch(GL_TRIANGLES, None)
+            batch[2].extend((circle * radius + (pos[0], pos[1])).ravel().tolist())
+            batch[3].extend((rgba[0], rgba[1], rgba[2], rgba[3]) * len(circle))
+            return
         glColor4f(rgba[0], rgba[1], rgba[2], rgba[3])
-        glBegin(GL_TRIANGLE_FAN)
-        glVertex2f(pos[0], pos[1]);
-        for angle in range(10, 3610, 2):
-            angle = angle / 10 # convert back down to degrees
-            x2 = pos[0] + math.sin(angle) * radius;
-            y2 = pos[1] + math.cos(angle) * radius;
-            glVertex2f(x2, y2);
-        glEnd()
+        glPushMatrix()
+        glTranslatef(pos[0], pos[1], 0)
+        glScalef(radius, radius, 1)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(2, GL_FLOAT, 0, circle)
+        glDrawArrays(GL_TRIANGLES, 0, len(circle))
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glPopMatrix()
 
     def drawRectangle(self, pos, width, height, rgba):
+        if self.batching:
+            batch = self.getBatch(GL_QUADS, None)
+            batch[2].extend((pos[0], pos[1], pos[0] + width, pos[1], pos[0] + width, pos[1] + height, pos[0], pos[1] + height))
+            batch[3].extend((rgba[0], rgba[1], rgba[2], rgba[3]) * 4)
+            return
         glColor4f(rgba[0], rgba[1], rgba[2], rgba[3])
         glBegin(GL_QUADS)
         glVertex2f(pos[0], pos[1])
@@ -120,6 +212,16 @@ class Game2D(object):
         glVertex2f(pos[0], pos[1] + height)
         glEnd()
 
+    # blits an RGBA uint8 array indexed [y, x] with its top left
+    # corner at pos, a single upload no matter how many pixels
+    def drawPixels(self, pos, pixels):
+        height, width = pixels.shape[0], pixels.shape[1]
+        self.flush()
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        # window positions count from the bottom left, rows go up
+        glWindowPos2i(int(pos[0]), int(self.height - pos[1] - height))
+        glDrawPixels(width, height, GL_RGBA, GL_UNSIGNED_BYTE, pixels[::-1].tobytes())
+
     def drawBox(self, tl, tr, br, bl, rgba, width):
         self.drawLine(tl, tr, rgba, width)
         self.drawLine(tr, br, rgba, width)
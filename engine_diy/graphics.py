@@ -0,0 +1,41 @@
+from engine_diy.palette import Palette, Colormap
+from engine_diy.textures import TextureManager
+from engine_diy.flats import FlatManager
+from engine_diy.sprites import SpriteManager
+
+# Everything needed to put doom's pixels on screen, decoded
+# once per WAD (or WadStack) and shared by all renderers,
+# get it through wad.getGraphics() rather than building one
+#
+# WADs without PLAYPAL or COLORMAP (some PWADs used alone)
+# leave palette and colormap None
+
+class Graphics(object):
+
+    def __init__(self, wad, textureMemoryBudget=32 * 1024 * 1024):
+        self.palette = None
+        self.colormap = None
+        if wad.hasLump("PLAYPAL"):
+            self.palette = Palette(wad.getLump("PLAYPAL"))
+            if wad.hasLump("COLORMAP"):
+                self.colormap = Colormap(wad.getLump("COLORMAP"), self.palette)
+        self.textures = TextureManager(wad, textureMemoryBudget, self.palette)
+        self.flats = FlatManager(wad)
+        self.sprites = SpriteManager(wad)
+
+    # rgb pixels of a flat span: world coordinates xs, ys
+    # shaded by colormap rows lights, None if the flat is
+    # unknown or there is no colormap
+    def shadeFlat(self, name, xs, ys, lights):
+        flat = self.flats.getFlat(name)
+        if flat is None or self.colormap is None:
+            return None
+        return self.colormap.shade(lights, flat.sample(xs, ys))
+
+    # rgb pixels of a texture column: texture column u at
+    # texture rows vs shaded by colormap rows lights
+    def shadeTextureColumn(self, name, u, vs, lights):
+        texture = self.textures.getTexture(name)
+        if texture is None or self.colormap is None:
+            return None
+        return self.colormap.shade(lights, texture.sampleColumn(u, vs))
@@ -0,0 +1,101 @@
+from engine_diy.framebuffer import Framebuffer
+
+# Game2D stand in that needs no window, SDL or GPU
+#
+# Offers the same drawing surface as Game2D so FpsRenderer and
+# the map plots run unchanged on build hosts and in batch jobs.
+# Draws are rasterized into a window sized Framebuffer and can
+# also be recorded as ("line", start, end, rgba, width) style
+# tuples for comparing renders. Input callbacks are accepted
+# and never fire, events() only counts frames
+
+class HeadlessGame(object):
+
+    # rasterize False skips the framebuffer when only the draw
+    # calls or the timing matter
+    def __init__(self, rasterize=True, record=False):
+        self.over = False
+        self.fps = 60
+        self.rasterize = rasterize
+        self.record = record
+        self.calls = [] # draw calls of the current frame when recording
+        self.framebuffer = None
+        self.frames = 0
+        self.width = 0
+        self.height = 0
+
+    def setupWindow(self, width, height):
+        self.width = width
+        self.height = height
+        if self.rasterize:
+            self.framebuffer = Framebuffer(width, height)
+
+    def events(self):
+        pass
+
+    def onKeyUp(self, key, func):
+        pass
+
+    def onKeyDown(self, key, func):
+        pass
+
+    def onKeyHold(self, key, func):
+        pass
+
+    def onMouseMove(self, func):
+        pass
+
+    def setFPS(self, fps):
+        self.fps = fps
+
+    def sleep(self, ms=None):
+        pass
+
+    # window pixels [y, x] rgba of the last frame
+    def getPixels(self):
+        return self.framebuffer.pixels
+
+    def drawStart(self):
+        self.calls = []
+        if self.framebuffer is not None:
+            self.framebuffer.clear()
+
+    def drawEnd(self):
+        self.frames += 1
+
+    def drawLine(self, start, end, rgba, width):
+        if self.record:
+            self.calls.append(("line", tuple(start), tuple(end), tuple(rgba), width))
+        if self.framebuffer is not None:
+            self.framebuffer.drawLine(start, end, rgba, width)
+
+    def drawPoint(self, pos, rgba, radius):
+        if self.record:
+            self.calls.append(("point", tuple(pos), tuple(rgba), radius))
+        if self.framebuffer is not None:
+            self.framebuffer.drawPoint(pos, rgba, radius)
+
+    def drawRectangle(self, pos, width, height, rgba):
+        if self.record:
+            self.calls.append(("rectangle", tuple(pos), width, height, tuple(rgba)))
+        if self.framebuffer is not None:
+            self.framebuffer.drawRectangle(pos, width, height, rgba)
+
+    def drawPixels(self, pos, pixels):
+        if self.record:
+            self.calls.append(("pixels", tuple(pos), pixels.copy()))
+        if self.framebuffer is not None:
+            self.framebuffer.drawPixels(pos, pixels)
+
+    def drawBox(self, tl, tr, br, bl, rgba, width):
+        self.drawLine(tl, tr, rgba, width)
+        self.drawLine(tr, br, rgba, width)
+        self.drawLine(br, bl, rgba, width)
+        self.drawLine(bl, tl, rgba, width)
+
+    # nothing to cache without GL, static layers draw every frame
+    def drawCached(self, name, key, drawFunc):
+        drawFunc()
+
+    def invalidateCached(self, name):
+        pass
@@ -0,0 +1,64 @@
+import numpy as np
+
+# Doom's light diminishing
+#
+# Sector light picks one of 16 light levels and distance then
+# darkens it further, the result is a COLORMAP row (0 full
+# bright - 31 darkest) looked up per pixel by Colormap.shade
+#   scalelight  walls, [light level][wall scale * 16], built for
+#               the screen width since scales grow with it
+#   zlight      floors and ceilings, [light level][distance / 16]
+# Walls running along the x axis are a level darker and along
+# the y axis a level brighter, doom's fake contrast
+
+class Lighting(object):
+    LIGHTLEVELS = 16
+    LIGHTSEGSHIFT = 4 # sector light >> 4 is the light level
+    MAXLIGHTSCALE = 48
+    LIGHTSCALE = 16 # scale factor to scalelight index, fixed point scale >> 12
+    MAXLIGHTZ = 128
+    LIGHTZ = 16 # distance to zlight index, fixed point distance >> 20
+    NUMCOLORMAPS = 32
+    DISTMAP = 2
+
+    def __init__(self, width):
+        self.width = width
+        levels = np.arange(Lighting.LIGHTLEVELS)[:, None]
+        # darkest map each light level starts from up close
+        startMaps = (Lighting.LIGHTLEVELS - 1 - levels) * 2 * Lighting.NUMCOLORMAPS // Lighting.LIGHTLEVELS
+
+        # R_ExecuteSetViewSize, scales at other widths than doom's
+        # 320 map back onto the same rows
+        scales = np.arange(Lighting.MAXLIGHTSCALE)[None, :]
+        self.scalelight = np.clip(startMaps - scales * 320 // width // Lighting.DISTMAP, 0, Lighting.NUMCOLORMAPS - 1)
+
+        # R_InitLightTables
+        distances = np.arange(Lighting.MAXLIGHTZ)[None, :]
+        zscales = 160 * 4096 // (distances + 1) >> 12
+        self.zlight = np.clip(startMaps - zscales // Lighting.DISTMAP, 0, Lighting.NUMCOLORMAPS - 1)
+
+    # light level of a sector light 0 - 255, seg vertices add
+    # the fake contrast of walls
+    def getLightNum(self, lightLevel, v1=None, v2=None):
+        lightNum = int(lightLevel) >> Lighting.LIGHTSEGSHIFT
+        if v1 is not None:
+            if v1.y == v2.y:
+                lightNum -= 1
+            elif v1.x == v2.x:
+                lightNum += 1
+        return min(max(lightNum, 0), Lighting.LIGHTLEVELS - 1)
+
+    # colormap rows for wall columns of the given scale factors
+    def getWallLights(self, lightNum, scales):
+        index = np.clip((np.asarray(scales) * Lighting.LIGHTSCALE).astype(np.int64), 0, Lighting.MAXLIGHTSCALE - 1)
+        return self.scalelight[lightNum][index]
+
+    # colormap rows for plane pixels at the given distances
+    def getPlaneLights(self, lightNum, distances):
+        index = np.clip((np.asarray(distances) / Lighting.LIGHTZ).astype(np.int64), 0, Lighting.MAXLIGHTZ - 1)
+        return self.zlight[lightNum][index]
+
+    # how bright a colormap row leaves a color, for walls drawn
+    # with flat colors instead of palette pixels
+    def getBrightness(self, lights):
+        return 1.0 - np.asarray(lights) / float(Lighting.NUMCOLORMAPS)
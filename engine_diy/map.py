@@ -1,4 +1,7 @@
+import struct
+import numpy as np
 from enum import Enum
+from engine_diy.blockmap import Blockmap
 
 class Map(object):
     # used to identify if a node id has the sector bit on the end
@@ -29,6 +32,45 @@ class Map(object):
         self.segs = []
         self.sectors = []
         self.sidedefs = []
+        # Columnar Data
+        # numpy views straight over the lump bytes, filled
+        # by loadLump, the object lists above then become
+        # lazy MapLists that build objects from these bytes
+        self.lumps = {} # Map.Indices -> lump buffer
+        self.records = {} # Map.Indices -> numpy structured array
+        self.vertices_xy = None # (n, 2) int16
+        self.linedef_v1 = None
+        self.linedef_v2 = None
+        self.linedef_flags = None
+        self.linedef_front = None # front sidedef id
+        self.linedef_back = None # back sidedef id (0xFFFF = none)
+        self.sidedef_sector = None
+        self.seg_v1 = None
+        self.seg_v2 = None
+        self.seg_linedef = None
+        self.seg_angle = None # BAM >> 16
+        self.seg_direction = None
+        self.seg_offset = None
+        self.subsector_segCount = None
+        self.subsector_firstSeg = None
+        self.node_partition = None # (n, 4) int16 x, y, dx, dy
+        self.node_boxes = None # (n, 2, 4) int16 front/back top, bottom, left, right
+        self.node_children = None # (n, 2) uint16 front, back
+        self.sector_floor = None
+        self.sector_ceiling = None
+        self.sector_light = None
+        self.thing_xy = None # (n, 2) int16
+        self.thing_type = None
+        # resolved cross references (-1 = none)
+        self.seg_frontSector = None
+        self.seg_backSector = None
+        self.seg_length = None
+        # Spatial Data
+        self.blockmap = None
+        self.reject = None # packed bits, sector a * count + b set = a can't see b
+        self.bspTree = None # per node tuples for renderBspNodes, built on first use
+        self.bspStats = BspStats() # counts of the last renderBspNodes
+        self.subsectorThings = None # subsector ID -> things standing in it, built on first use
         # Meta Data
         self.playerThing = None # a thing
         self.solidLinedefs = []
@@ -40,8 +82,165 @@ class Map(object):
         self.height = None
 
     def createData(self):
-        self.assignPointerData()
-        self.createMetaData()
+        if self.lumps:
+            # objects link themselves as their MapList builds them
+            self.createColumnarMetaData()
+        else:
+            self.assignPointerData()
+            self.createMetaData()
+
+    # takes the raw bytes of a map lump, keeps numpy
+    # views over them and swaps the matching object list
+    # for a lazy one so objects are only built when used
+    def loadLump(self, index, data, itemClass, reader):
+        byteSize = itemClass.sizeof()
+        count = len(data) // byteSize
+        data = data[:count * byteSize]
+        self.lumps[index] = data
+        records = np.frombuffer(data, dtype=itemClass.dtype())
+        self.records[index] = records
+
+        if index == Map.Indices.VERTEXES:
+            self.vertices = MapList(data, itemClass, reader, self.linkVertex)
+            self.vertices_xy = np.frombuffer(data, dtype='<i2').reshape(-1, 2)
+        elif index == Map.Indices.LINEDEFS:
+            self.linedefs = MapList(data, itemClass, reader, self.linkLinedef)
+            self.linedef_v1 = records['startVertexID']
+            self.linedef_v2 = records['endVertexID']
+            self.linedef_flags = records['flags']
+            self.linedef_front = records['frontSidedefID']
+            self.linedef_back = records['backSidedefID']
+        elif index == Map.Indices.SIDEDEFS:
+            self.sidedefs = MapList(data, itemClass, reader, self.linkSidedef)
+            self.sidedef_sector = records['sectorID']
+        elif index == Map.Indices.SECTORS:
+            self.sectors = MapList(data, itemClass, reader, self.linkSector)
+            self.sector_floor = records['floorHeight']
+            self.sector_ceiling = records['ceilingHeight']
+            self.sector_light = records['lightLevel']
+        elif index == Map.Indices.SSECTORS:
+            self.subsectors = MapList(data, itemClass, reader, self.linkSubsector)
+            self.subsector_segCount = records['segCount']
+            self.subsector_firstSeg = records['firstSegID']
+        elif index == Map.Indices.SEGS:
+            self.segs = MapList(data, itemClass, reader, self.linkSeg)
+            self.seg_v1 = records['startVertexID']
+            self.seg_v2 = records['endVertexID']
+            self.seg_linedef = records['linedefID']
+            self.seg_angle = records['angle']
+            self.seg_direction = records['direction']
+            self.seg_offset = records['offset']
+        elif index == Map.Indices.NODES:
+            self.nodes = MapList(data, itemClass, reader, self.linkNode)
+            shorts = np.frombuffer(data, dtype='<i2').reshape(-1, 14)
+            self.node_partition = shorts[:, 0:4]
+            self.node_boxes = shorts[:, 4:12].reshape(-1, 2, 4)
+            self.node_children = np.frombuffer(data, dtype='<u2').reshape(-1, 14)[:, 12:14]
+        elif index == Map.Indices.THINGS:
+            self.things = MapList(data, itemClass, reader, self.linkThing)
+            self.thing_xy = np.frombuffer(data, dtype='<i2').reshape(-1, 5)[:, 0:2]
+            self.thing_type = records['type']
+
+    # REJECT lump, needs the sector lump loaded
+    def loadReject(self, data):
+        sectorCount = len(self.sector_floor)
+        byteCount = (sectorCount * sectorCount + 7) // 8
+        reject = np.frombuffer(data, dtype=np.uint8)
+        if len(reject) < byteCount:
+            # short or missing lump, pairs it doesn't
+            # cover are allowed to see each other
+            padded = np.zeros(byteCount, dtype=np.uint8)
+            padded[:len(reject)] = reject
+            reject = padded
+        self.reject = reject
+
+    # BLOCKMAP lump, needs the linedef and thing lumps loaded
+    def loadBlockmap(self, data):
+        self.blockmap = Blockmap.fromLump(data, self)
+
+    # vectorized version of createMetaData for maps
+    # loaded through loadLump
+    def createColumnarMetaData(self):
+        # map sizing from every vertex used by a linedef
+        used = np.concatenate((self.linedef_v1, self.linedef_v2))
+        xy = self.vertices_xy[used]
+        self.minx = int(xy[:, 0].min())
+        self.maxx = int(xy[:, 0].max())
+        self.miny = int(xy[:, 1].min())
+        self.maxy = int(xy[:, 1].max())
+        self.width = self.maxx - self.minx
+        self.height = self.maxy - self.miny
+
+        # player 1 start thing (last one wins like createMetaData)
+        starts = np.flatnonzero(self.thing_type == Thing.Types.O_PLAYER1)
+        if len(starts) > 0:
+            self.playerThing = self.things[int(starts[-1])]
+
+        # list of only lines that are solid (have 1 side)
+        solids = np.flatnonzero(self.linedef_back == Linedef.nullSideDefID)
+        self.solidLinedefs = [self.linedefs[i] for i in solids.tolist()]
+
+        self.resolveReferences()
+
+    # columnar version of the seg pointers made in linkSeg
+    # plus per seg data derived from them
+    def resolveReferences(self):
+        front = self.linedef_front[self.seg_linedef].astype(np.int32)
+        back = self.linedef_back[self.seg_linedef].astype(np.int32)
+        # direction: 0 same as linedef, 1 opposite
+        flipped = self.seg_direction != 0
+        front, back = np.where(flipped, back, front), np.where(flipped, front, back)
+        self.seg_frontSector = self.sidedefsToSectors(front)
+        self.seg_backSector = self.sidedefsToSectors(back)
+
+        delta = self.vertices_xy[self.seg_v2].astype(np.float64) - self.vertices_xy[self.seg_v1]
+        self.seg_length = np.hypot(delta[:, 0], delta[:, 1])
+
+    def sidedefsToSectors(self, sidedefIDs):
+        sectors = np.full(len(sidedefIDs), -1, dtype=np.int32)
+        valid = sidedefIDs != Linedef.nullSideDefID
+        sectors[valid] = self.sidedef_sector[sidedefIDs[valid]]
+        return sectors
+
+    # flattens everything loadLump and createColumnarMetaData
+    # produced into plain arrays so the map can be stored
+    # or sent to another process and rebuilt with importData
+    def exportData(self):
+        data = {}
+        for index, lump in self.lumps.items():
+            data["lump_{}".format(index)] = np.frombuffer(lump, dtype=np.uint8)
+        data["bounds"] = np.array([self.minx, self.maxx, self.miny, self.maxy], dtype=np.int32)
+        playerThingID = self.playerThing.ID if self.playerThing is not None else -1
+        data["playerThing"] = np.array([playerThingID], dtype=np.int32)
+        data["solidLinedefs"] = np.array([l.ID for l in self.solidLinedefs], dtype=np.int32)
+        data["seg_frontSector"] = self.seg_frontSector
+        data["seg_backSector"] = self.seg_backSector
+        data["seg_length"] = self.seg_length
+        if self.blockmap is not None:
+            data.update(self.blockmap.exportData())
+        if self.reject is not None:
+            data["reject"] = self.reject
+        return data
+
+    # readers maps Map.Indices to the (itemClass, reader)
+    # pair loadLump needs to build objects for that lump
+    def importData(self, data, readers):
+        for index, (itemClass, reader) in readers.items():
+            self.loadLump(index, memoryview(data["lump_{}".format(index)]), itemClass, reader)
+        self.minx, self.maxx, self.miny, self.maxy = data["bounds"].tolist()
+        self.width = self.maxx - self.minx
+        self.height = self.maxy - self.miny
+        playerThingID = int(data["playerThing"][0])
+        if playerThingID >= 0:
+            self.playerThing = self.things[playerThingID]
+        self.solidLinedefs = [self.linedefs[i] for i in data["solidLinedefs"].tolist()]
+        self.seg_frontSector = data["seg_frontSector"]
+        self.seg_backSector = data["seg_backSector"]
+        self.seg_length = data["seg_length"]
+        if "blockmap_header" in data:
+            self.blockmap = Blockmap.fromData(data, self)
+        if "reject" in data:
+            self.reject = data["reject"]
 
     # helper method to get min and
     # max values of the maps coords
@@ -87,60 +286,89 @@ class Map(object):
         # VERTEXES
         for i,v in enumerate(self.vertices):
             v.ID = i
+            self.linkVertex(v)
         # LINEDEFS
         for i,l in enumerate(self.linedefs):
             l.ID = i
-            l.startVertex = self.vertices[l.startVertexID]
-            l.endVertex = self.vertices[l.endVertexID]
-            if l.frontSidedefID != Linedef.nullSideDefID:
-                l.frontSidedef = self.sidedefs[l.frontSidedefID]
-            if l.backSidedefID != Linedef.nullSideDefID:
-                l.backSidedef = self.sidedefs[l.backSidedefID]
+            self.linkLinedef(l)
         # SIDEDEFS
         for i,s in enumerate(self.sidedefs):
             s.ID = i
-            s.sector = self.sectors[s.sectorID]
+            self.linkSidedef(s)
         # SECTORS
         for i,s in enumerate(self.sectors):
             s.ID = i
+            self.linkSector(s)
         # SUBSECTORS
         for i,s in enumerate(self.subsectors):
             s.ID = i
-            s.firstSeg = self.segs[s.firstSegID]
+            self.linkSubsector(s)
         # THINGS
         for i,t in enumerate(self.things):
             t.ID = i
+            self.linkThing(t)
         # NODES
         for i,n in enumerate(self.nodes):
             n.ID = i
-            if self.isNodeIDSubsector(n.frontChildID) is False:
-                n.frontChildNode = self.nodes[n.frontChildID]
-            else:
-                n.frontSubsector = self.subsectors[self.getNodeSubsector(n.frontChildID)]
-            if self.isNodeIDSubsector(n.backChildID) is False:
-                n.backChildNode = self.nodes[n.backChildID]
-            else:
-                n.backSubsector = self.subsectors[self.getNodeSubsector(n.backChildID)]
+            self.linkNode(n)
         # SEGS
         for i,s in enumerate(self.segs):
             s.ID = i
-            s.startVertex = self.vertices[s.startVertexID]
-            s.endVertex = self.vertices[s.endVertexID]
-            s.linedef = self.linedefs[s.linedefID]
-            # pointer to front and back sectors
-            # direction: 0 same as linedef, 1 opposite
-            # set our linked sectors relative to their
-            # direction
-            if s.direction == 0: # (same)
-                if s.linedef.frontSidedef != None:
-                    s.frontSector = s.linedef.frontSidedef.sector
-                if s.linedef.backSidedef != None:
-                    s.backSector = s.linedef.backSidedef.sector
-            else: # if 1 (opposite)
-                if s.linedef.frontSidedef != None:
-                    s.backSector = s.linedef.frontSidedef.sector
-                if s.linedef.backSidedef != None:
-                    s.frontSector = s.linedef.backSidedef.sector
+            self.linkSeg(s)
+
+    # per object linkers, used by assignPointerData
+    # and by MapList when it builds an object
+    def linkVertex(self, v):
+        pass
+
+    def linkLinedef(self, l):
+        l.startVertex = self.vertices[l.startVertexID]
+        l.endVertex = self.vertices[l.endVertexID]
+        if l.frontSidedefID != Linedef.nullSideDefID:
+            l.frontSidedef = self.sidedefs[l.frontSidedefID]
+        if l.backSidedefID != Linedef.nullSideDefID:
+            l.backSidedef = self.sidedefs[l.backSidedefID]
+
+    def linkSidedef(self, s):
+        s.sector = self.sectors[s.sectorID]
+
+    def linkSector(self, s):
+        pass
+
+    def linkSubsector(self, s):
+        s.firstSeg = self.segs[s.firstSegID]
+
+    def linkThing(self, t):
+        pass
+
+    def linkNode(self, n):
+        if self.isNodeIDSubsector(n.frontChildID) is False:
+            n.frontChildNode = self.nodes[n.frontChildID]
+        else:
+            n.frontSubsector = self.subsectors[self.getNodeSubsector(n.frontChildID)]
+        if self.isNodeIDSubsector(n.backChildID) is False:
+            n.backChildNode = self.nodes[n.backChildID]
+        else:
+            n.backSubsector = self.subsectors[self.getNodeSubsector(n.backChildID)]
+
+    def linkSeg(self, s):
+        s.startVertex = self.vertices[s.startVertexID]
+        s.endVertex = self.vertices[s.endVertexID]
+        s.linedef = self.linedefs[s.linedefID]
+        # pointer to front and back sectors
+        # direction: 0 same as linedef, 1 opposite
+        # set our linked sectors relative to their
+        # direction
+        if s.direction == 0: # (same)
+            if s.linedef.frontSidedef != None:
+                s.frontSector = s.linedef.frontSidedef.sector
+            if s.linedef.backSidedef != None:
+                s.backSector = s.linedef.backSidedef.sector
+        else: # if 1 (opposite)
+            if s.linedef.frontSidedef != None:
+                s.backSector = s.linedef.frontSidedef.sector
+            if s.linedef.backSidedef != None:
+                s.frontSector = s.linedef.backSidedef.sector
 
     def getRootNode(self):
         return self.nodes[len(self.nodes) - 1]
@@ -157,11 +385,114 @@ class Map(object):
         nodeId = len(self.nodes) - 1
         return self.subsectors[self.recurseFindSubsector(x, y, nodeId)]
 
+    # things by the subsector they stand in, for renderers that
+    # only draw the things of subsectors they reached
+    def getSubsectorThings(self):
+        if self.subsectorThings is None:
+            self.subsectorThings = {}
+            for thing in self.things:
+                subsector = self.getSubsectorAtPosition(thing.x, thing.y)
+                self.subsectorThings.setdefault(subsector.ID, []).append(thing)
+        return self.subsectorThings
+
     def getSectorAtPosition(self, x, y):
         subsector = self.getSubsectorAtPosition(x, y)
         seg = subsector.firstSeg
         return seg.frontSector
 
+    # REJECT lookup, a and b can be sector ids or arrays of
+    # them. False means the sectors can never see each other,
+    # True only means a sight trace is worth doing
+    def sectorsCanSee(self, a, b):
+        bit = np.asarray(a, dtype=np.int64) * len(self.sector_floor) + np.asarray(b, dtype=np.int64)
+        blocked = (self.reject[bit >> 3] >> (bit & 7)) & 1
+        if blocked.ndim == 0:
+            return bool(blocked == 0)
+        return blocked == 0
+
+    # bool array of which of sectors the sector can see
+    def canSeeMany(self, sector, sectors):
+        return self.sectorsCanSee(np.full(len(sectors), sector), sectors)
+
+    # Sight check from an eye at x1,y1,z1 to a target at
+    # x2,y2 spanning bottomZ to topZ, like doom's P_CheckSight:
+    # the REJECT table first, then a walk of the BSP nodes the
+    # sight line crosses narrowing the visible slope window at
+    # every two sided line and stopping at any solid one
+    def hasLineOfSight(self, x1, y1, z1, x2, y2, bottomZ, topZ):
+        fromSector = self.getSectorAtPosition(x1, y1)
+        toSector = self.getSectorAtPosition(x2, y2)
+        if self.sectorsCanSee(fromSector.ID, toSector.ID) is False:
+            return False
+
+        # slopes are in height per whole sight line
+        slopes = [bottomZ - z1, topZ - z1]
+        checkedLines = set()
+        stack = [len(self.nodes) - 1]
+        while len(stack) > 0:
+            nodeId = stack.pop()
+            if self.isNodeIDSubsector(nodeId):
+                subsector = self.subsectors[self.getNodeSubsector(nodeId)]
+                if self.crossSubsector(subsector, x1, y1, z1, x2, y2, slopes, checkedLines) is False:
+                    return False
+                continue
+            node = self.nodes[nodeId]
+            startOnBack = self.isOnBackSide(x1, y1, node)
+            endOnBack = self.isOnBackSide(x2, y2, node)
+            nearId = node.backChildID if startOnBack else node.frontChildID
+            farId = node.frontChildID if startOnBack else node.backChildID
+            if startOnBack != endOnBack:
+                stack.append(farId)
+            stack.append(nearId)
+        return True
+
+    def crossSubsector(self, subsector, x1, y1, z1, x2, y2, slopes, checkedLines):
+        dx = x2 - x1
+        dy = y2 - y1
+        for i in range(subsector.segCount):
+            linedef = self.segs[subsector.firstSegID + i].linedef
+            if linedef.ID in checkedLines:
+                continue
+            checkedLines.add(linedef.ID)
+            v1 = linedef.startVertex
+            v2 = linedef.endVertex
+            # line endpoints on both sides of the sight line
+            s1 = (v1.x - x1) * dy - (v1.y - y1) * dx
+            s2 = (v2.x - x1) * dy - (v2.y - y1) * dx
+            if (s1 > 0 and s2 > 0) or (s1 < 0 and s2 < 0):
+                continue
+            # and sight endpoints on both sides of the line
+            lx = v2.x - v1.x
+            ly = v2.y - v1.y
+            t1 = (x1 - v1.x) * ly - (y1 - v1.y) * lx
+            t2 = (x2 - v1.x) * ly - (y2 - v1.y) * lx
+            if (t1 > 0 and t2 > 0) or (t1 < 0 and t2 < 0):
+                continue
+            if linedef.backSidedef is None:
+                return False # solid wall
+            front = linedef.frontSidedef.sector
+            back = linedef.backSidedef.sector
+            if front.floorHeight == back.floorHeight and front.ceilingHeight == back.ceilingHeight:
+                continue # no height change
+            openTop = min(front.ceilingHeight, back.ceilingHeight)
+            openBottom = max(front.floorHeight, back.floorHeight)
+            if openBottom >= openTop:
+                return False # closed door
+            # how far along the sight line the line is crossed
+            den = dx * ly - dy * lx
+            if den == 0:
+                continue
+            frac = ((v1.x - x1) * ly - (v1.y - y1) * lx) / den
+            if frac <= 0:
+                continue
+            if front.floorHeight != back.floorHeight:
+                slopes[0] = max(slopes[0], (openBottom - z1) / frac)
+            if front.ceilingHeight != back.ceilingHeight:
+                slopes[1] = min(slopes[1], (openTop - z1) / frac)
+            if slopes[1] <= slopes[0]:
+                return False
+        return True
+
     def isNodeIDSubsector(self, nodeId):
         return (nodeId & Map.SUBSECTORIDENTIFIER) > 0
 
@@ -189,9 +520,88 @@ class Map(object):
         else:
             return self.recurseFindSubsector(x, y, node.frontChildID)
 
-    def renderBspNodes(self, x, y, renderSubsector):
-        rootNode = self.nodes[len(self.nodes) - 1]
-        return self.recurseRenderBspNodes2(x, y, rootNode, renderSubsector)
+    # walks the BSP front to back from x,y calling renderSubsector
+    # for every subsector reached. The walk uses its own stack
+    # instead of recursing and, like doom's R_RenderBSPNode, when
+    # checkBox is given the far child's bounding box (top,
+    # bottom, left, right) is passed to it once the near child
+    # is done, if it returns False the whole far subtree is
+    # skipped. isDone is asked after every subsector and ends
+    # the walk when it returns True, e.g. once the screen is
+    # fully covered. Counts of the walk are left in bspStats
+    def renderBspNodes(self, x, y, renderSubsector, checkBox=None, isDone=None):
+        stats = self.bspStats
+        stats.reset()
+        if len(self.nodes) == 0:
+            # single subsector maps have no nodes
+            stats.subsectorsVisited += 1
+            renderSubsector(self.subsectors[0])
+            return
+        tree = self.getBspTree()
+        rootId = len(tree) - 1
+        # (child id, box to check first, subsectors below it)
+        stack = [(rootId, None, tree[rootId][8] + tree[rootId][9])]
+        while stack:
+            childId, box, subsectorCount = stack.pop()
+            if box is not None:
+                stats.boxesChecked += 1
+                if checkBox(box) is False:
+                    stats.boxesCulled += 1
+                    stats.subsectorsCulled += subsectorCount
+                    continue
+            if childId & Map.SUBSECTORIDENTIFIER:
+                stats.subsectorsVisited += 1
+                renderSubsector(self.subsectors[childId & (~Map.SUBSECTORIDENTIFIER)])
+                if isDone is not None and isDone():
+                    stats.stoppedEarly = True
+                    stats.subsectorsSkipped = sum(entry[2] for entry in stack)
+                    return
+                continue
+            stats.nodesVisited += 1
+            xPartition, yPartition, xChange, yChange, frontChild, backChild, frontBox, backBox, frontCount, backCount = tree[childId]
+            # far child goes on the stack first so the near
+            # one is popped and fully walked before it
+            if (x - xPartition) * yChange - (y - yPartition) * xChange <= 0:
+                stack.append((frontChild, frontBox if checkBox is not None else None, frontCount))
+                stack.append((backChild, None, backCount))
+            else:
+                stack.append((backChild, backBox if checkBox is not None else None, backCount))
+                stack.append((frontChild, None, frontCount))
+
+    # plain python tuples of the node columns, indexing these
+    # is far cheaper per visit than numpy or Node objects, each
+    # ends with the number of subsectors under either child.
+    # Maps built without loadLump have no node columns, their
+    # Node objects are read instead
+    def getBspTree(self):
+        if self.bspTree is None:
+            if self.node_partition is not None:
+                partitions = self.node_partition.tolist()
+                children = self.node_children.tolist()
+                boxes = self.node_boxes.tolist()
+            else:
+                partitions = [(n.xPartition, n.yPartition, n.xChangePartition, n.yChangePartition) for n in self.nodes]
+                children = [(n.frontChildID, n.backChildID) for n in self.nodes]
+                boxes = [((n.frontBoxTop, n.frontBoxBottom, n.frontBoxLeft, n.frontBoxRight),\
+                    (n.backBoxTop, n.backBoxBottom, n.backBoxLeft, n.backBoxRight)) for n in self.nodes]
+            # subsectors under each node, children first
+            counts = [None] * len(children)
+            def countOf(childId):
+                if childId & Map.SUBSECTORIDENTIFIER:
+                    return 1
+                return counts[childId][0] + counts[childId][1]
+            pending = [len(children) - 1]
+            while pending:
+                nodeId = pending[-1]
+                waiting = [c for c in children[nodeId] if not c & Map.SUBSECTORIDENTIFIER and counts[c] is None]
+                if waiting:
+                    pending.extend(waiting)
+                    continue
+                pending.pop()
+                counts[nodeId] = (countOf(children[nodeId][0]), countOf(children[nodeId][1]))
+            self.bspTree = [(p[0], p[1], p[2], p[3], c[0], c[1], tuple(b[0]), tuple(b[1]), n[0], n[1])\
+                for p, c, b, n in zip(partitions, children, boxes, counts)]
+        return self.bspTree
 
     def recurseRenderBspNodes2(self, x, y, node, renderSubsector):
         if self.isOnBackSide(x, y, node):
@@ -229,6 +639,55 @@ class Map(object):
             self.recurseRenderBspNodes(x, y, node.frontChildID, renderSubsector)
             self.recurseRenderBspNodes(x, y, node.backChildID, renderSubsector)
 
+# Counters filled in by Map.renderBspNodes for one frame
+class BspStats(object):
+    def __init__(self):
+        self.reset()
+    def reset(self):
+        self.nodesVisited = 0
+        self.subsectorsVisited = 0
+        self.boxesChecked = 0
+        self.boxesCulled = 0
+        self.subsectorsCulled = 0 # under culled boxes
+        self.subsectorsSkipped = 0 # left when the walk stopped early
+        self.stoppedEarly = False
+    def __str__(self):
+        return "nodes:{} subsectors:{} boxes checked:{} culled:{} subsectors culled:{} skipped:{}"\
+                .format(self.nodesVisited, self.subsectorsVisited, self.boxesChecked, self.boxesCulled,\
+                self.subsectorsCulled, self.subsectorsSkipped)
+
+# Read only list of map objects backed by a lump
+# buffer, objects are unpacked, given their ID and
+# linked on first access then kept
+class MapList(object):
+    def __init__(self, data, itemClass, reader, linker):
+        self.data = data
+        self.struct = struct.Struct(itemClass.structFormat())
+        self.reader = reader
+        self.linker = linker
+        self.items = [None] * (len(data) // self.struct.size)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self.items)))]
+        item = self.items[i]
+        if item is None:
+            if i < 0:
+                i += len(self.items)
+            item = self.reader(self.struct.unpack_from(self.data, i * self.struct.size))
+            item.ID = i
+            # store before linking, linking can walk back here
+            self.items[i] = item
+            self.linker(item)
+        return item
+
+    def __iter__(self):
+        for i in range(len(self.items)):
+            yield self[i]
+
 class Vertex(object):
     def __init__(self):
         # WAD Data
@@ -238,20 +697,24 @@ class Vertex(object):
         self.ID = 0 # id of self in list
     def sizeof():
         return 4
+    def structFormat():
+        return '<hh'
+    def dtype():
+        return np.dtype([('x', '<i2'), ('y', '<i2')])
     def __str__(self):
         return "{},{}".format(self.x, self.y)
 
 class Linedef(object):
     class Flags:
-        BLOCKING      = 0,
-        BLOCKMONSTERS = 1,
-        TWOSIDED      = 2,
-        DONTPEGTOP    = 4,
-        DONTPEGBOTTOM = 8,
-        SECRET        = 16,
-        SOUNDBLOCK    = 32,
-        DONTDRAW      = 64,
-        DRAW          = 128
+        BLOCKING      = 1
+        BLOCKMONSTERS = 2
+        TWOSIDED      = 4
+        DONTPEGTOP    = 8
+        DONTPEGBOTTOM = 16
+        SECRET        = 32
+        SOUNDBLOCK    = 64
+        DONTDRAW      = 128
+        DRAW          = 256
     nullSideDefID = 0xFFFF
     def __init__(self):
         # WAD DATA
@@ -272,6 +735,11 @@ class Linedef(object):
         self.backSidedef = None
     def sizeof():
         return 14
+    def structFormat():
+        return '<7H'
+    def dtype():
+        return np.dtype([('startVertexID', '<u2'), ('endVertexID', '<u2'), ('flags', '<u2'),\
+            ('lineType', '<u2'), ('sectorTag', '<u2'), ('frontSidedefID', '<u2'), ('backSidedefID', '<u2')])
     def isSolid(self):
         # a linedef wall is solid if it only has front side
         # and no back side
@@ -411,6 +879,10 @@ class Thing(object):
         self.ID = 0
     def sizeof():
         return 10
+    def structFormat():
+        return '<hhHHH'
+    def dtype():
+        return np.dtype([('x', '<i2'), ('y', '<i2'), ('angle', '<u2'), ('type', '<u2'), ('flags', '<u2')])
     def __str__(self):
         return "{},{} {} {} {}"\
                 .format(self.x, self.y, self.angle, self.type, self.flags)
@@ -447,6 +919,14 @@ class Node(object):
         self.backSubsector = None
     def sizeof():
         return 28
+    def structFormat():
+        return '<12h2H'
+    def dtype():
+        return np.dtype([('xPartition', '<i2'), ('yPartition', '<i2'),\
+            ('xChangePartition', '<i2'), ('yChangePartition', '<i2'),\
+            ('frontBoxTop', '<i2'), ('frontBoxBottom', '<i2'), ('frontBoxLeft', '<i2'), ('frontBoxRight', '<i2'),\
+            ('backBoxTop', '<i2'), ('backBoxBottom', '<i2'), ('backBoxLeft', '<i2'), ('backBoxRight', '<i2'),\
+            ('frontChildID', '<u2'), ('backChildID', '<u2')])
     def __str__(self):
         return "{},{} {},{} FTB:{},{} FLR:{},{}"\
                 .format(self.xPartition, self.yPartition,\
@@ -472,6 +952,10 @@ class Subsector(object):
         self.firstSeg = None
     def sizeof():
         return 4
+    def structFormat():
+        return '<HH'
+    def dtype():
+        return np.dtype([('segCount', '<u2'), ('firstSegID', '<u2')])
     def __str__(self):
         return "{} {}".format(self.segCount, self.firstSegID)
 
@@ -496,6 +980,11 @@ class Seg(object):
         self.backSector = None
     def sizeof():
         return 12
+    def structFormat():
+        return '<6H'
+    def dtype():
+        return np.dtype([('startVertexID', '<u2'), ('endVertexID', '<u2'), ('angle', '<u2'),\
+            ('linedefID', '<u2'), ('direction', '<u2'), ('offset', '<u2')])
     # Angle is stored in Binary Angles BAMS
     # need to downconvert to degrees
     def getAngle(self):
@@ -518,6 +1007,12 @@ class Sector(object):
     def sizeof():
         # 5 shorts, 2 char[8]
         return 10 + 8 + 8
+    def structFormat():
+        return '<hh8s8sHHH'
+    def dtype():
+        return np.dtype([('floorHeight', '<i2'), ('ceilingHeight', '<i2'),\
+            ('floorTexture', 'S8'), ('ceilingTexture', 'S8'),\
+            ('lightLevel', '<u2'), ('type', '<u2'), ('tag', '<u2')])
 
 class Sidedef(object):
     def __init__(self):
@@ -535,4 +1030,10 @@ class Sidedef(object):
     def sizeof():
         # 3 shorts and 3 char[8]
         return 6 + 8 + 8 + 8
+    def structFormat():
+        return '<hh8s8s8sH'
+    def dtype():
+        return np.dtype([('xOffset', '<i2'), ('yOffset', '<i2'),\
+            ('upperTexture', 'S8'), ('lowerTexture', 'S8'), ('middleTexture', 'S8'),\
+            ('sectorID', '<u2')])
 
@@ -0,0 +1,53 @@
+import os, glob
+import numpy as np
+
+# On disk cache of preprocessed maps
+#
+# Each map is stored as an uncompressed .npz holding its
+# raw lumps together with everything Map.createData derives
+# from them (bounds, player start, solid linedefs, resolved
+# seg sectors, ...), see Map.exportData/importData
+#
+# Entries are keyed by the WAD file name, the map name, a
+# hash of the WAD contents and SCHEMA_VERSION so editing the
+# WAD or changing what is cached makes old entries miss and
+# get rebuilt
+
+class MapCache(object):
+    # bump whenever Map.exportData changes what it stores
+    SCHEMA_VERSION = 3
+
+    def __init__(self, cacheDir):
+        self.cacheDir = cacheDir
+
+    def getPath(self, wadName, wadHash, mapName):
+        fileName = "{}_{}_{}_v{}.npz".format(wadName, mapName, wadHash[:16], MapCache.SCHEMA_VERSION)
+        return os.path.join(self.cacheDir, fileName)
+
+    # returns the stored arrays or None on a miss
+    def load(self, wadName, wadHash, mapName):
+        path = self.getPath(wadName, wadHash, mapName)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                return {key: npz[key] for key in npz.files}
+        except (OSError, ValueError):
+            # truncated or corrupt entry, treat as a miss
+            return None
+
+    def save(self, wadName, wadHash, mapName, data):
+        path = self.getPath(wadName, wadHash, mapName)
+        try:
+            os.makedirs(self.cacheDir, exist_ok=True)
+            # drop entries built from older versions of this WAD
+            for stale in glob.glob(os.path.join(glob.escape(self.cacheDir), glob.escape("{}_{}_".format(wadName, mapName)) + "*.npz")):
+                if stale != path:
+                    os.remove(stale)
+            # write then rename so readers never see half a file
+            tmpPath = path + ".tmp"
+            with open(tmpPath, 'wb') as f:
+                np.savez(f, **data)
+            os.replace(tmpPath, path)
+        except OSError as e:
+            print("WARNING: Failed to write map cache {}: {}".format(path, e))
@@ -0,0 +1,44 @@
+import numpy as np
+
+# Palette and light tables
+#
+#   PLAYPAL   14 palettes of 256 RGB triples, 0 is the normal
+#             one, the rest tint the screen for damage, pickups
+#             and the radiation suit
+#   COLORMAP  34 maps of 256 palette indices, 0 is full bright,
+#             31 darkest, 32 the invulnerability map and 33 is
+#             all black
+#
+# A pixel is drawn as palette[colormap[light][index]], the
+# combined (34, 256, 3) rgb table does both lookups in one
+# fancy index over a whole span
+
+class Palette(object):
+    def __init__(self, data):
+        count = len(data) // (256 * 3)
+        self.palettes = np.frombuffer(data[:count * 256 * 3], dtype=np.uint8).reshape(count, 256, 3)
+
+    # (256, 3) uint8 rgb table for a palette
+    def getRGB(self, index=0):
+        return self.palettes[index]
+
+class Colormap(object):
+    LIGHTLEVELS = 32 # maps fading from full bright to dark
+    INVULNERABILITY = 32
+    BLACK = 33
+
+    def __init__(self, data, palette, paletteIndex=0):
+        count = len(data) // 256
+        self.maps = np.frombuffer(data[:count * 256], dtype=np.uint8).reshape(count, 256)
+        self.setPalette(palette, paletteIndex)
+
+    # rebuilds the rgb table, call when the palette changes
+    def setPalette(self, palette, paletteIndex=0):
+        self.paletteIndex = paletteIndex
+        self.rgb = palette.getRGB(paletteIndex)[self.maps] # (34, 256, 3)
+
+    # rgb pixels for palette indices lit by colormap rows,
+    # lights broadcasts against indices so a span can pass
+    # one row for all pixels or one per pixel
+    def shade(self, lights, indices):
+        return self.rgb[lights, indices]
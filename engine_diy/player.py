@@ -1,4 +1,5 @@
 import math
+import numpy as np
 from engine_diy.angle import Angle
 from engine_diy.map import *
 
@@ -9,6 +10,9 @@ class Player(object):
         self.y = 0 # int32
         self.z = 0 # TODO needs to be set from floor he's on
         self.eyeHeight = 41 # from doom engine
+        self.radius = 16 # from doom engine
+        self.height = 56 # from doom engine
+        self.maxStep = 24 # from doom engine
         self.angle = Angle(0) # Angle object
 
         self.currentSector = None
@@ -27,6 +31,76 @@ class Player(object):
     def getEyeZ(self):
         return self.z + self.eyeHeight
 
+    # moves by dx,dy stopping at walls and sliding along
+    # them, lines are found through the map's blockmap so
+    # only the cells around the player are tested
+    def move(self, map, dx, dy):
+        if map.blockmap is None:
+            self.setPosition(self.x + dx, self.y + dy)
+            return
+        # step heights are measured from the floor we stand on
+        floorZ = map.getSectorAtPosition(self.x, self.y).floorHeight
+        blocker = self.findBlockingLine(map, self.x + dx, self.y + dy, floorZ)
+        if blocker is None:
+            self.setPosition(self.x + dx, self.y + dy)
+            return
+        # slide along the wall by keeping only the part
+        # of the move parallel to it
+        v1 = map.vertices_xy[map.linedef_v1[blocker]]
+        v2 = map.vertices_xy[map.linedef_v2[blocker]]
+        lx = float(v2[0]) - float(v1[0])
+        ly = float(v2[1]) - float(v1[1])
+        lengthSq = lx * lx + ly * ly
+        if lengthSq > 0:
+            along = (dx * lx + dy * ly) / lengthSq
+            sx = lx * along
+            sy = ly * along
+            if self.findBlockingLine(map, self.x + sx, self.y + sy, floorZ) is None:
+                self.setPosition(self.x + sx, self.y + sy)
+                return
+        # corners, fall back to stepping along one axis
+        if self.findBlockingLine(map, self.x + dx, self.y, floorZ) is None:
+            self.setPosition(self.x + dx, self.y)
+        elif self.findBlockingLine(map, self.x, self.y + dy, floorZ) is None:
+            self.setPosition(self.x, self.y + dy)
+
+    # first linedef that stops the player standing at x,y
+    # or None, follows doom's PIT_CheckLine
+    def findBlockingLine(self, map, x, y, floorZ):
+        r = self.radius
+        lines = map.blockmap.linesInBox(x - r, y - r, x + r, y + r)
+        if len(lines) == 0:
+            return None
+        a = map.vertices_xy[map.linedef_v1[lines]].astype(np.float64)
+        b = map.vertices_xy[map.linedef_v2[lines]].astype(np.float64)
+        # line bounding box must overlap the player box
+        touching = (np.minimum(a[:, 0], b[:, 0]) < x + r) & (np.maximum(a[:, 0], b[:, 0]) > x - r) &\
+            (np.minimum(a[:, 1], b[:, 1]) < y + r) & (np.maximum(a[:, 1], b[:, 1]) > y - r)
+        # and the box corners must not all be on one side of it
+        dx = b[:, 0] - a[:, 0]
+        dy = b[:, 1] - a[:, 1]
+        sides = np.stack([(cx - a[:, 0]) * dy - (cy - a[:, 1]) * dx\
+            for cx, cy in ((x - r, y - r), (x + r, y - r), (x - r, y + r), (x + r, y + r))])
+        touching &= (sides.min(axis=0) < 0) & (sides.max(axis=0) > 0)
+
+        for line in lines[touching].tolist():
+            backSidedef = int(map.linedef_back[line])
+            if backSidedef == Linedef.nullSideDefID:
+                return line # one sided
+            if map.linedef_flags[line] & Linedef.Flags.BLOCKING:
+                return line
+            front = map.sidedef_sector[map.linedef_front[line]]
+            back = map.sidedef_sector[backSidedef]
+            openTop = min(int(map.sector_ceiling[front]), int(map.sector_ceiling[back]))
+            openBottom = max(int(map.sector_floor[front]), int(map.sector_floor[back]))
+            if openTop - openBottom < self.height:
+                return line # doesn't fit
+            if openTop - floorZ < self.height:
+                return line # head hits the ceiling
+            if openBottom - floorZ > self.maxStep:
+                return line # step too high
+        return None
+
     def distanceToVertex(self, vertex):
         return math.sqrt((self.x - vertex.x) ** 2 + (self.y - vertex.y) ** 2)
 
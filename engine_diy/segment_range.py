@@ -1,3 +1,5 @@
+from bisect import bisect_left, bisect_right
+
 
 class SegmentNode(object):
     def __init__(self):
@@ -34,3 +36,95 @@ class SolidSegmentRange(object):
         return "{},{}".format(self.xStart, self.xEnd)
 
 
+
+# The solid wall clip list, doom's solidsegs
+#
+# Keeps the screen columns already covered by solid walls as
+# sorted, disjoint, non touching inclusive ranges held in two
+# parallel lists so lookups are a bisect instead of a scan.
+# Two sentinel ranges cap both sides of the screen, once walls
+# cover every column everything merges into a single range
+#
+# Walls are clipped against it front to back, a solid wall
+# marks its columns covered, a portal only asks what of it
+# is still visible. Both return the visible fragments as
+# (xStart, xEnd) pairs from left to right
+class SolidSegmentList(object):
+    def __init__(self, width):
+        self.width = width
+        self.clear()
+
+    def clear(self):
+        self.starts = [-100000, self.width]
+        self.ends = [-1, 100000]
+
+    def __len__(self):
+        return len(self.starts)
+
+    # SolidSegmentRange copies, for printing and debugging
+    def __iter__(self):
+        for xStart, xEnd in zip(self.starts, self.ends):
+            yield SolidSegmentRange(xStart, xEnd)
+
+    # every column is covered by solid walls
+    def isFull(self):
+        return len(self.starts) == 1
+
+    # x1 to x2 lies within a single covered range
+    def isRangeCovered(self, x1, x2):
+        i = bisect_left(self.ends, x2)
+        return i < len(self.starts) and self.starts[i] <= x1
+
+    # visible parts of a solid wall from x1 to x2, the whole
+    # of it is then marked covered
+    def clipSolid(self, x1, x2):
+        starts = self.starts
+        ends = self.ends
+        # first range ending at or touching x1
+        i = bisect_left(ends, x1 - 1)
+        fragments = []
+        if x1 < starts[i]:
+            if x2 < starts[i] - 1:
+                # clear of any range, insert it on its own
+                starts.insert(i, x1)
+                ends.insert(i, x2)
+                return [(x1, x2)]
+            # runs into this range, grow it to the left
+            fragments.append((x1, starts[i] - 1))
+            starts[i] = x1
+        if x2 <= ends[i]:
+            # rest already covered
+            return fragments
+        # last range starting at or touching x2, the gaps up to
+        # it are visible and everything in between merges
+        j = bisect_right(starts, x2 + 1) - 1
+        for k in range(i, j):
+            fragments.append((ends[k] + 1, starts[k + 1] - 1))
+        if x2 <= ends[j]:
+            ends[i] = ends[j]
+        else:
+            fragments.append((ends[j] + 1, x2))
+            ends[i] = x2
+        del starts[i + 1:j + 1]
+        del ends[i + 1:j + 1]
+        return fragments
+
+    # visible parts of a portal from x1 to x2, nothing is
+    # marked covered since walls behind show through it
+    def clipPortal(self, x1, x2):
+        starts = self.starts
+        ends = self.ends
+        i = bisect_left(ends, x1 - 1)
+        fragments = []
+        if x1 < starts[i]:
+            if x2 < starts[i] - 1:
+                return [(x1, x2)]
+            fragments.append((x1, starts[i] - 1))
+        if x2 <= ends[i]:
+            return fragments
+        j = bisect_right(starts, x2 + 1) - 1
+        for k in range(i, j):
+            fragments.append((ends[k] + 1, starts[k + 1] - 1))
+        if x2 > ends[j]:
+            fragments.append((ends[j] + 1, x2))
+        return fragments
@@ -0,0 +1,170 @@
+from engine_diy.map import Thing
+from engine_diy.textures import decodePatch
+
+# Thing sprites
+#
+# Sprites are patches between S_START and S_END (SS_START and
+# SS_END in PWADs) named by a 4 letter sprite, a frame letter
+# and a rotation digit
+#   POSSA1      frame A seen from the front
+#   POSSA2A8    frame A rotation 2, mirrored it is rotation 8
+#   BAR1A0      frame A the same from every side
+# Rotations go round the thing in 45 degree steps from rotation
+# 1 facing the viewer. Patches are decoded on first use
+
+class Sprite(object):
+    def __init__(self, name, data):
+        self.name = name
+        self.pixels, self.mask, self.leftOffset, self.topOffset = decodePatch(data) # [x, y]
+        self.width = self.pixels.shape[0]
+        self.height = self.pixels.shape[1]
+
+class SpriteManager(object):
+
+    # sprite and frame letter things spawn showing, doom's
+    # mobjinfo spawn states
+    THINGSPRITES = {
+        Thing.Types.K_BLUECARD: ("BKEY", "A"),
+        Thing.Types.K_YELLOWCARD: ("YKEY", "A"),
+        Thing.Types.K_REDCARD: ("RKEY", "A"),
+        Thing.Types.K_REDSKULL: ("RSKU", "A"),
+        Thing.Types.K_YELLOWSKULL: ("YSKU", "A"),
+        Thing.Types.K_BLUESKULL: ("BSKU", "A"),
+
+        Thing.Types.M_SPIDERDEMON: ("SPID", "A"),
+        Thing.Types.M_SHOTGUNGUY: ("SPOS", "A"),
+        Thing.Types.M_CYBERDEMON: ("CYBR", "A"),
+        Thing.Types.M_SPECTRE: ("SARG", "A"),
+        Thing.Types.M_IMP: ("TROO", "A"),
+        Thing.Types.M_DEMON: ("SARG", "A"),
+        Thing.Types.M_BARON: ("BOSS", "A"),
+        Thing.Types.M_ZOMBIEMAN: ("POSS", "A"),
+        Thing.Types.M_CACODEMON: ("HEAD", "A"),
+        Thing.Types.M_LOSTSOUL: ("SKUL", "A"),
+
+        Thing.Types.W_SHOTGUN: ("SHOT", "A"),
+        Thing.Types.W_CHAINGUN: ("MGUN", "A"),
+        Thing.Types.W_ROCKETLAUNCHER: ("LAUN", "A"),
+        Thing.Types.W_PLASMAGUN: ("PLAS", "A"),
+        Thing.Types.W_CHAINSAW: ("CSAW", "A"),
+        Thing.Types.W_BFG9000: ("BFUG", "A"),
+
+        Thing.Types.A_ENERGY_CELL_PACK: ("CELP", "A"),
+        Thing.Types.A_CLIP: ("CLIP", "A"),
+        Thing.Types.A_SHOTGUN_SHELLS: ("SHEL", "A"),
+        Thing.Types.A_ROCKET: ("ROCK", "A"),
+        Thing.Types.A_ROCKET_BOX: ("BROK", "A"),
+        Thing.Types.A_ENERGY_CELL: ("CELL", "A"),
+        Thing.Types.A_BULLET_BOX: ("AMMO", "A"),
+        Thing.Types.A_SHOTGUN_BOX: ("SBOX", "A"),
+
+        Thing.Types.R_SUPERCHARGE: ("SOUL", "A"),
+        Thing.Types.R_HEALTHBONUS: ("BON1", "A"),
+        Thing.Types.R_ARMORBONUS: ("BON2", "A"),
+        Thing.Types.R_INVULNERABILITY: ("PINV", "A"),
+        Thing.Types.R_BERSERK: ("PSTR", "A"),
+        Thing.Types.R_PARTIAL_INVISIBILITY: ("PINS", "A"),
+        Thing.Types.R_COMPUTER_AREA_MAP: ("PMAP", "A"),
+        Thing.Types.R_LIGHT_AMP_VISOR: ("PVIS", "A"),
+
+        Thing.Types.P_BACKPACK: ("BPAK", "A"),
+        Thing.Types.P_STIMPACK: ("STIM", "A"),
+        Thing.Types.P_MEDKIT: ("MEDI", "A"),
+        Thing.Types.P_ARMOR: ("ARM1", "A"),
+        Thing.Types.P_MEGAARMOR: ("ARM2", "A"),
+        Thing.Types.P_RADIATION_SUIT: ("SUIT", "A"),
+
+        Thing.Types.B_IMPALED_HUMAN: ("POL1", "A"),
+        Thing.Types.B_TWITCHING_IMPALED_HUMAN: ("POL6", "A"),
+        Thing.Types.B_SKULL_ON_POLE: ("POL4", "A"),
+        Thing.Types.B_FIVE_SKULLS: ("POL2", "A"),
+        Thing.Types.B_PILE_SKULLS: ("POL3", "A"),
+        Thing.Types.B_TALL_GREEN_PILLAR: ("COL1", "A"),
+        Thing.Types.B_SHORT_GREEN_PILLAR: ("COL2", "A"),
+        Thing.Types.B_TALL_RED_PILLAR: ("COL3", "A"),
+        Thing.Types.B_SHORT_RED_PILLAR: ("COL4", "A"),
+        Thing.Types.B_CANDELABRA: ("CBRA", "A"),
+        Thing.Types.B_SHORT_GREEN_PILLAR_HEART: ("COL5", "A"),
+        Thing.Types.B_SHORT_RED_PILLAR_SKULL: ("COL6", "A"),
+        Thing.Types.B_EVIL_EYE: ("CEYE", "A"),
+        Thing.Types.B_FLOATING_SKULL: ("FSKU", "A"),
+        Thing.Types.B_BURNT_TREE: ("TRE1", "A"),
+        Thing.Types.B_TALL_BLUE_FIRESTICK: ("TBLU", "A"),
+        Thing.Types.B_TALL_GREEN_FIRESTICK: ("TGRN", "A"),
+        Thing.Types.B_TALL_RED_FIRESTICK: ("TRED", "A"),
+        Thing.Types.B_BROWN_STUMP: ("SMIT", "A"),
+        Thing.Types.B_TALL_TECHNO_COLUMN: ("ELEC", "A"),
+        Thing.Types.B_HANGING_VICTIM_TWITCHING: ("GOR1", "A"),
+        Thing.Types.B_HANGING_VICTIM_ARMS: ("GOR2", "A"),
+        Thing.Types.B_HANGING_VICTIM_LEG: ("GOR3", "A"),
+        Thing.Types.B_HANGING_PAIR_LEGS: ("GOR4", "A"),
+        Thing.Types.B_HANGING_LEG: ("GOR5", "A"),
+        Thing.Types.B_LARGE_BROWN_TREE: ("TRE2", "A"),
+        Thing.Types.B_SHORT_BLUE_FIRESTICK: ("SMBT", "A"),
+        Thing.Types.B_SHORT_GREEN_FIRESTICK: ("SMGT", "A"),
+        Thing.Types.B_SHORT_RED_FIRESTICK: ("SMRT", "A"),
+        Thing.Types.B_FLOOR_LAMP: ("COLU", "A"),
+        Thing.Types.B_EXPLODING_BARREL: ("BAR1", "A"),
+
+        # corpses show the last frame of their death
+        Thing.Types.D_BLOODYMESS: ("PLAY", "W"),
+        Thing.Types.D_BLOODYMESS2: ("PLAY", "W"),
+        Thing.Types.D_DEAD_PLAYER: ("PLAY", "N"),
+        Thing.Types.D_DEAD_FORMER_HUMAN: ("POSS", "L"),
+        Thing.Types.D_DEAD_FORMER_SERGEANT: ("SPOS", "L"),
+        Thing.Types.D_DEAD_IMP: ("TROO", "M"),
+        Thing.Types.D_DEAD_DEMON: ("SARG", "N"),
+        Thing.Types.D_DEAD_CACODEMON: ("HEAD", "L"),
+        Thing.Types.D_DEAD_LOSTSOUL_INVIS: ("SKUL", "K"),
+        Thing.Types.D_POOL_BLOOD_FLESH: ("POL5", "A"),
+        Thing.Types.D_CANDLE: ("CAND", "A"),
+        Thing.Types.D_HANGING_VICTIM_ARMS: ("GOR2", "A"),
+        Thing.Types.D_HANGING_LEG: ("GOR5", "A"),
+        Thing.Types.D_HANGING_VICTIM_TWITCHING: ("GOR1", "A"),
+    }
+
+    def __init__(self, wad):
+        lumps = wad.getLumpsBetween(("S_START", "SS_START"), ("S_END", "SS_END"))
+        self.lumps = {name.upper(): data for name, data in lumps.items()}
+        self.sprites = {} # lump name -> Sprite, decoded on first use
+        self.frames = {} # (sprite, frame letter) -> 8 (lump name, flipped) by rotation
+        for name in self.lumps:
+            if len(name) < 6:
+                continue
+            self.addRotation(name, name[4], name[5], False)
+            # second frame and rotation draw the same patch mirrored
+            if len(name) >= 8:
+                self.addRotation(name, name[6], name[7], True)
+
+    def addRotation(self, name, frame, rotation, flipped):
+        if not rotation.isdigit() or int(rotation) > 8:
+            return
+        rotations = self.frames.setdefault((name[:4], frame), [None] * 8)
+        if rotation == "0":
+            for i in range(8):
+                rotations[i] = (name, flipped)
+        else:
+            rotations[int(rotation) - 1] = (name, flipped)
+
+    def hasSprite(self, name):
+        return name.upper() in self.lumps
+
+    # Sprite or None for unknown lump names
+    def getSprite(self, name):
+        name = name.upper()
+        if name not in self.sprites:
+            if name not in self.lumps:
+                return None
+            self.sprites[name] = Sprite(name, self.lumps[name])
+        return self.sprites[name]
+
+    # (Sprite, flipped) a thing of thingType shows at rotation
+    # 0 - 7, None for things without a sprite in this WAD
+    def getThingSprite(self, thingType, rotation):
+        if thingType not in SpriteManager.THINGSPRITES:
+            return None
+        rotations = self.frames.get(SpriteManager.THINGSPRITES[thingType])
+        if rotations is None or rotations[rotation] is None:
+            return None
+        name, flipped = rotations[rotation]
+        return self.getSprite(name), flipped
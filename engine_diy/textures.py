@@ -0,0 +1,180 @@
+import struct
+from collections import OrderedDict
+import numpy as np
+from engine_diy.palette import Palette
+
+# Wall textures
+#
+# Doom builds every wall texture at run time from patches:
+#   PNAMES    int32 count, char[8] patch lump names
+#   TEXTURE1  int32 count, int32 offsets[count], then per texture
+#   TEXTURE2    char[8] name, int32 masked, int16 width, int16 height,
+#               int32 unused, int16 patchcount, then per patch
+#               int16 originx, int16 originy, int16 pnames index,
+#               int16 unused, int16 unused
+#   patches   column based pictures, see decodePatch
+#
+# Composed textures are palette index arrays stored column major
+# (pixels[x] is one contiguous column) since walls are drawn a
+# column at a time
+
+class Texture(object):
+    def __init__(self, name, width, height):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.pixels = np.zeros((width, height), dtype=np.uint8) # palette indices, column major
+        self.mask = np.zeros((width, height), dtype=bool) # pixels covered by a patch
+        # start of each column in the flattened pixels, lets a
+        # whole span be sampled with a single gather
+        self.columnOffsets = np.arange(width, dtype=np.int64) * height
+        self.flat = self.pixels.reshape(-1)
+
+    def sizeof(self):
+        return self.pixels.nbytes + self.mask.nbytes
+
+    # palette indices for texture column u at rows vs,
+    # both wrap around the texture like doom's tiling
+    def sampleColumn(self, u, vs):
+        return self.flat[self.columnOffsets[int(u) % self.width] + np.mod(vs, self.height).astype(np.int64)]
+
+    # palette indices for many (u, v) pairs at once
+    def sample(self, us, vs):
+        return self.flat[self.columnOffsets[np.mod(us, self.width).astype(np.int64)] + np.mod(vs, self.height).astype(np.int64)]
+
+# Decodes a patch lump into (pixels, mask, leftOffset, topOffset)
+# with pixels and mask column major like Texture
+#   uint16 width, uint16 height, int16 leftoffset, int16 topoffset
+#   uint32 columnofs[width]
+#   columns are lists of posts ended by 0xFF:
+#     uint8 topdelta, uint8 length, uint8 pad, uint8 pixels[length], uint8 pad
+def decodePatch(data):
+    width, height, leftOffset, topOffset = struct.unpack_from('<HHhh', data, 0)
+    columnOffsets = struct.unpack_from('<{}I'.format(width), data, 8)
+    raw = np.frombuffer(data, dtype=np.uint8)
+    pixels = np.zeros((width, height), dtype=np.uint8)
+    mask = np.zeros((width, height), dtype=bool)
+    for x in range(width):
+        pos = columnOffsets[x]
+        topDelta = -1
+        while pos < len(raw) and raw[pos] != 0xFF:
+            delta = int(raw[pos])
+            # tall patches: a delta not below the previous one
+            # continues from it instead of the column top
+            topDelta = topDelta + delta if delta <= topDelta else delta
+            length = int(raw[pos + 1])
+            top = min(topDelta, height)
+            bottom = min(topDelta + length, height)
+            pixels[x, top:bottom] = raw[pos + 3:pos + 3 + bottom - top]
+            mask[x, top:bottom] = True
+            pos += length + 4
+    return pixels, mask, leftOffset, topOffset
+
+def readLumpName(raw):
+    return bytes(raw).split(b'\x00')[0].decode('ascii').upper()
+
+class TextureDef(object):
+    def __init__(self):
+        self.name = ''
+        self.width = 0
+        self.height = 0
+        self.patches = [] # (originX, originY, patch name)
+
+# Builds wall textures on demand from a lump source (WAD or
+# WadStack) and keeps them in an LRU cache that evicts the
+# least recently used textures once memoryBudget bytes are used
+class TextureManager(object):
+
+    # palette is only needed for getAverageColor, it is read
+    # from the WAD when not given
+    def __init__(self, wad, memoryBudget=32 * 1024 * 1024, palette=None):
+        self.wad = wad
+        self.memoryBudget = memoryBudget
+        self.memoryUsed = 0
+        self.cache = OrderedDict() # name -> Texture
+        self.averageColors = {} # name -> rgba
+        self.palette = palette
+        if palette is None and wad.hasLump("PLAYPAL"):
+            self.palette = Palette(wad.getLump("PLAYPAL"))
+        self.patchNames = self.readPatchNames()
+        self.textureDefs = {}
+        for lumpName in ("TEXTURE1", "TEXTURE2"):
+            if wad.hasLump(lumpName):
+                self.readTextureDefs(wad.getLump(lumpName))
+
+    def readPatchNames(self):
+        if not self.wad.hasLump("PNAMES"):
+            return []
+        data = self.wad.getLump("PNAMES")
+        count = struct.unpack_from('<i', data, 0)[0]
+        return [readLumpName(name) for (name,) in struct.iter_unpack('8s', data[4:4 + count * 8])]
+
+    def readTextureDefs(self, data):
+        count = struct.unpack_from('<i', data, 0)[0]
+        offsets = struct.unpack_from('<{}i'.format(count), data, 4)
+        for offset in offsets:
+            name, masked, width, height, unused, patchCount = struct.unpack_from('<8sihhih', data, offset)
+            textureDef = TextureDef()
+            textureDef.name = readLumpName(name)
+            textureDef.width = width
+            textureDef.height = height
+            patchData = data[offset + 22:offset + 22 + patchCount * 10]
+            for originX, originY, patchIndex, stepDir, colormap in struct.iter_unpack('<hhhhh', patchData):
+                if 0 <= patchIndex < len(self.patchNames):
+                    textureDef.patches.append((originX, originY, self.patchNames[patchIndex]))
+            self.textureDefs[textureDef.name] = textureDef
+
+    def hasTexture(self, name):
+        return name.upper() in self.textureDefs
+
+    # composed Texture or None for "-" and unknown names
+    def getTexture(self, name):
+        name = name.upper()
+        if name in self.cache:
+            self.cache.move_to_end(name)
+            return self.cache[name]
+        if name not in self.textureDefs:
+            return None
+        texture = self.composeTexture(self.textureDefs[name])
+        self.cache[name] = texture
+        self.memoryUsed += texture.sizeof()
+        # evict least recently used, always keep the new one
+        while self.memoryUsed > self.memoryBudget and len(self.cache) > 1:
+            oldName, old = self.cache.popitem(last=False)
+            self.memoryUsed -= old.sizeof()
+        return texture
+
+    def composeTexture(self, textureDef):
+        texture = Texture(textureDef.name, textureDef.width, textureDef.height)
+        for originX, originY, patchName in textureDef.patches:
+            data = self.wad.getLump(patchName)
+            if data is None:
+                continue
+            pixels, mask, leftOffset, topOffset = decodePatch(data)
+            # clip the patch rectangle to the texture
+            x1 = max(originX, 0)
+            x2 = min(originX + pixels.shape[0], texture.width)
+            y1 = max(originY, 0)
+            y2 = min(originY + pixels.shape[1], texture.height)
+            if x1 >= x2 or y1 >= y2:
+                continue
+            src = (slice(x1 - originX, x2 - originX), slice(y1 - originY, y2 - originY))
+            dst = (slice(x1, x2), slice(y1, y2))
+            # only opaque patch pixels overwrite the texture
+            np.copyto(texture.pixels[dst], pixels[src], where=mask[src])
+            texture.mask[dst] |= mask[src]
+        return texture
+
+    # mean color of a texture as an rgba tuple of floats, used
+    # when walls are drawn as flat colors, None if unknown
+    def getAverageColor(self, name):
+        name = name.upper()
+        if name in self.averageColors:
+            return self.averageColors[name]
+        rgba = None
+        texture = self.getTexture(name)
+        if texture is not None and self.palette is not None and texture.mask.any():
+            rgb = self.palette.getRGB()[texture.pixels[texture.mask]].mean(axis=0) / 255.0
+            rgba = (float(rgb[0]), float(rgb[1]), float(rgb[2]), 1)
+        self.averageColors[name] = rgba
+        return rgba
@@ -0,0 +1,69 @@
+import numpy as np
+from engine_diy.angle import *
+
+# Per frame view of every map vertex from the player
+#
+# The renderers need the angle and distance from the player to
+# both ends of every seg they visit and most vertices are shared
+# by several segs, so instead of an atan2 and sqrt per seg end
+# all vertices are transformed with a few numpy calls once the
+# player has moved. Results are kept as python lists indexed by
+# vertex ID since scalar reads from a list are much cheaper than
+# from a numpy array
+#   angles     degrees 0 - 360, as Player.angleToVertex
+#   bamArray   int64 BAM angles as doom's R_PointToAngle, kept
+#              as an array for batch work over segs
+#   distances  as Player.distanceToVertex
+
+class ViewTransform(object):
+
+    # base and sign of the BAM angle in each octant, indexed
+    # by (dx < 0) * 4 + (dy < 0) * 2 + (|dx| <= |dy|), the
+    # branches of R_PointToAngle. The 2^32 base wraps with the
+    # final mask
+    OCTANTBASE = np.array([0, ANG90 - 1, ANGLEMASK + 1, ANG270, ANG180 - 1, ANG90, ANG180, ANG270 - 1], dtype=np.int64)
+    OCTANTSIGN = np.array([1, -1, -1, 1, -1, 1, 1, -1], dtype=np.int64)
+    TANTOANGLE = np.array(tantoangle, dtype=np.int64)
+
+    def __init__(self, map):
+        self.map = map
+        self.x = None
+        self.y = None
+        self.angles = []
+        self.bamArray = np.zeros(0, dtype=np.int64)
+        self.distances = []
+
+    # recompute everything for a player at x,y, a no op while
+    # the player stands still
+    def update(self, x, y):
+        if x == self.x and y == self.y:
+            return
+        self.x = x
+        self.y = y
+        if self.map.vertices_xy is None or len(self.map.vertices_xy) == 0:
+            return
+        # float64 so int16 coordinates can't overflow
+        xy = self.map.vertices_xy.astype(np.float64)
+        dx = xy[:, 0] - x
+        dy = xy[:, 1] - y
+        self.angles = (np.arctan2(dy, dx) * 180 / np.pi % 360).tolist()
+        self.distances = np.sqrt(dx * dx + dy * dy).tolist()
+        self.bamArray = self.pointsToAngles(dx, dy)
+
+    # doom's R_PointToAngle over arrays of vectors, the atan of
+    # the smaller over the larger of |dx| and |dy| is looked up
+    # in tantoangle and turned into its octant
+    def pointsToAngles(self, dx, dy):
+        ax = np.abs(dx)
+        ay = np.abs(dy)
+        steep = ax <= ay
+        num = np.where(steep, ax, ay)
+        den = np.where(steep, ay, ax)
+        # SlopeDiv, den is 0 only for a vertex under the player
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = np.where(den == 0, SLOPERANGE, np.minimum(num * SLOPERANGE / den, SLOPERANGE))
+        t = ViewTransform.TANTOANGLE[slope.astype(np.int64)]
+        octant = (dx < 0) * 4 + (dy < 0) * 2 + steep
+        angles = (ViewTransform.OCTANTBASE[octant] + ViewTransform.OCTANTSIGN[octant] * t) & ANGLEMASK
+        # a vertex under the player has angle 0 like doom's
+        return np.where((dx == 0) & (dy == 0), 0, angles)
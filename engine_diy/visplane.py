@@ -0,0 +1,159 @@
+import math
+import numpy as np
+from engine_diy.wall_spans import WallSpans
+
+# Floors and ceilings, doom's visplanes
+#
+# While the walls render every seg marks the rows between its
+# wall and the clip arrays as open floor or ceiling of its front
+# sector. Openings with the same height, flat and light merge
+# into one Visplane holding a top and bottom row per column, an
+# opening on columns the plane already has starts a new plane of
+# the same key like R_CheckPlane. After the BSP walk every plane
+# is filled as horizontal spans in one numpy pass: its row gives
+# the distance to the plane, its column the direction and both
+# the world position that picks the flat pixel
+#
+# Rows are in the walls' line coordinates, a plane covers the
+# rows whose centers lie in [top, bottom) of its column so the
+# planes tile each column with the wall lines drawn around them.
+# The sky is skipped and shows whatever is behind the view
+
+class Visplane(object):
+    def __init__(self, height, flat, light, width):
+        self.height = height # world z
+        self.flat = flat # flat name
+        self.light = light # sector light level 0 - 255
+        self.minX = width
+        self.maxX = -1
+        self.top = np.zeros(width) # top >= bottom for unused columns
+        self.bottom = np.zeros(width)
+
+    # true when none of the columns x1 - x2 are used yet
+    def isOpen(self, x1, x2):
+        return not (self.top[x1:x2 + 1] < self.bottom[x1:x2 + 1]).any()
+
+    def mark(self, x1, tops, bottoms):
+        used = np.flatnonzero(tops < bottoms)
+        if len(used) == 0:
+            return
+        self.top[x1:x1 + len(tops)] = tops
+        self.bottom[x1:x1 + len(bottoms)] = bottoms
+        self.minX = min(self.minX, x1 + int(used[0]))
+        self.maxX = max(self.maxX, x1 + int(used[-1]))
+
+class VisplaneList(object):
+    SKYFLAT = "F_SKY1"
+
+    def __init__(self, width, height, distancePlayerToScreen, lighting):
+        self.width = int(width)
+        self.height = int(height)
+        self.f_halfWidth = width / 2
+        self.f_halfHeight = height / 2
+        self.f_distancePlayerToScreen = distancePlayerToScreen
+        self.lighting = lighting # Lighting, planes darken with distance
+        self.planes = []
+        self.planesByKey = {} # (height, flat, light) -> planes, newest last
+        self.pixels = np.zeros((self.height, self.width, 4), dtype=np.uint8) # [y, x] rgba
+        # view of the current frame
+        self.x = 0
+        self.y = 0
+        self.z = 0
+        self.angle = 0
+
+    # start a frame seen from x, y at eye height z looking at
+    # angle degrees
+    def clear(self, x, y, z, angle):
+        self.planes = []
+        self.planesByKey = {}
+        self.x = x
+        self.y = y
+        self.z = z
+        self.angle = angle
+
+    # plane to mark columns x1 - x2 in, None for the sky
+    def findPlane(self, height, flat, light, x1, x2):
+        if flat.upper() == VisplaneList.SKYFLAT:
+            return None
+        key = (height, flat, light)
+        planes = self.planesByKey.setdefault(key, [])
+        if len(planes) > 0 and planes[-1].isOpen(x1, x2):
+            return planes[-1]
+        plane = Visplane(height, flat, light, self.width)
+        planes.append(plane)
+        self.planes.append(plane)
+        return plane
+
+    # marks the openings a wall fragment leaves above and below
+    # itself, RD as for WallSpans and the clip arrays as they
+    # were before the wall updates them
+    def markWall(self, RD, x1, x2, ceilingClip, floorClip, ceilingPlane, floorPlane):
+        count = x2 - x1 + 1
+        if count <= 0 or (ceilingPlane is None and floorPlane is None):
+            return
+        ceilingClips = np.array(ceilingClip[x1:x2 + 1], dtype=np.float64)
+        floorClips = np.array(floorClip[x1:x2 + 1], dtype=np.float64)
+        # the wall's clamped ends, as the renderers work them out
+        ceilingEnd = np.trunc(WallSpans.steps(RD.f_ceilingEnd, RD.f_ceilingStep, count))
+        floorStart = np.trunc(WallSpans.steps(RD.f_floorStart, RD.f_floorStep, count))
+        ceilingEnd = np.maximum(ceilingEnd, ceilingClips + 1)
+        floorStart = np.where(floorStart >= floorClips, floorClips - 1, floorStart)
+        if ceilingPlane is not None:
+            ceilingPlane.mark(x1, ceilingClips, np.minimum(ceilingEnd, floorClips))
+        if floorPlane is not None:
+            floorPlane.mark(x1, np.maximum(floorStart, ceilingClips), floorClips)
+
+    # fills every plane into pixels, getColor(flat, light) gives
+    # a flat rgba for planes graphics can't texture. Without
+    # pixels the planes go into a cleared array of their own.
+    # Returns the pixels, alpha 0 where nothing was drawn
+    def draw(self, graphics, getColor, pixels=None):
+        if pixels is None:
+            pixels = self.pixels
+            pixels.fill(0)
+        radians = math.radians(self.angle)
+        cos = math.cos(radians)
+        sin = math.sin(radians)
+        for plane in self.planes:
+            if plane.maxX < plane.minX:
+                continue
+            xs = np.arange(plane.minX, plane.maxX + 1)
+            # rows with centers in [top, bottom), like the wall lines
+            rowStart = np.clip(np.ceil(plane.top[plane.minX:plane.maxX + 1] - 0.5), 0, self.height).astype(np.int64)
+            rowEnd = np.clip(np.ceil(plane.bottom[plane.minX:plane.maxX + 1] - 0.5), 0, self.height).astype(np.int64)
+            yStart = int(rowStart.min())
+            yEnd = int(rowEnd.max())
+            if yStart >= yEnd:
+                continue
+            rows = np.arange(yStart, yEnd)
+            spans = (rows[:, None] >= rowStart[None, :]) & (rows[:, None] < rowEnd[None, :])
+            rowIndex, columnIndex = np.nonzero(spans)
+            if len(rowIndex) == 0:
+                continue
+            ys = rows[rowIndex]
+            xs = xs[columnIndex]
+
+            # distance along the view direction to the plane seen
+            # through each row, then out sideways for the column
+            rowHeights = self.f_halfHeight - (ys + 0.5)
+            rowHeights = np.where(rowHeights == 0, 0.5, rowHeights)
+            distances = np.abs((plane.height - self.z) * self.f_distancePlayerToScreen / rowHeights)
+            sides = (self.f_halfWidth - xs) / self.f_distancePlayerToScreen
+            worldXs = self.x + distances * (cos - sides * sin)
+            worldYs = self.y + distances * (sin + sides * cos)
+
+            rgb = None
+            if graphics is not None:
+                # flats run down the map's y axis
+                lights = self.lighting.getPlaneLights(self.lighting.getLightNum(plane.light), distances)
+                rgb = graphics.shadeFlat(plane.flat, np.floor(worldXs), np.floor(-worldYs), lights)
+            if rgb is None:
+                rgba = getColor(plane.flat, plane.light)
+                rgb = np.array([int(round(min(max(c, 0), 1) * 255)) for c in rgba[:3]], dtype=np.uint8)
+            # a wall line at x lands in pixel column x - 1, GL puts
+            # lines on a column boundary in the left column
+            columns = xs - 1
+            inside = columns >= 0
+            pixels[ys[inside], columns[inside], :3] = rgb[inside] if rgb.ndim > 1 else rgb
+            pixels[ys[inside], columns[inside], 3] = 255
+        return pixels
@@ -28,181 +28,265 @@
 #
 # BIG-ENDIAN format
 
-import struct
+import mmap, struct, hashlib, os
+from concurrent.futures import ProcessPoolExecutor
 from engine_diy.map import *
+from engine_diy.map_cache import MapCache
+from engine_diy.graphics import Graphics
 
 class WAD(object):
 
-    def __init__(self, wadpath):
+    # cacheDir defaults to a .mapcache folder next to the WAD
+    def __init__(self, wadpath, useCache=True, cacheDir=None):
         self.wadpath = wadpath;
+        self.hash = None
+        self.cache = None
+        self.graphics = None
+        if useCache:
+            if cacheDir is None:
+                cacheDir = os.path.join(os.path.dirname(os.path.abspath(wadpath)), ".mapcache")
+            self.cache = MapCache(cacheDir)
         self.f = open(self.wadpath, 'rb') # read-binary
+        # map the whole file into memory, the OS pages lumps
+        # in on demand and every read below is a slice of
+        # this buffer instead of a seek + read syscall
+        self.data = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.data)
 
         self.loadHeader()
         self.loadDirs()
 
+    # content hash of the whole file, used to key caches
+    def getHash(self):
+        if self.hash is None:
+            self.hash = hashlib.sha1(self.data).hexdigest()
+        return self.hash
+
+    def close(self):
+        # maps loaded from this WAD keep views into the
+        # mapping, if any are still alive the mapping is
+        # released once the last of them is collected
+        try:
+            self.view.release()
+            self.data.close()
+        except BufferError:
+            pass
+        self.f.close()
+
     def loadHeader(self):
         # The header has a total of 12 bytes (0x00 to 0x0b)
         # this 12-bytes is divided to 3 groups
         # first 4 bytes is the WAD type as CHAR
         # second 4 is count of directories as Int
         # third 4 is Int offset of directories
-        self.type = self.load_string(0, 4) # char[]
-        self.dircount = self.load_uint32(4) # uint32
-        self.diroffset = self.load_uint32(8) # unit32
+        wadType, self.dircount, self.diroffset = struct.unpack_from('<4sII', self.data, 0)
+        self.type = toString(wadType) # char[]
 
     def loadDirs(self):
         self.dirs = []
         self.dirMap = {}
-        for i in range(0, self.dircount):
-            offset = self.diroffset + 16 * i
+        self.mapMarkers = {}
+        # each directory entry is 16 bytes: uint32 offset,
+        # uint32 size and char[8] name, decode the whole
+        # table in one pass
+        start = self.diroffset
+        end = self.diroffset + 16 * self.dircount
+        for lumpOffset, lumpSize, lumpName in struct.iter_unpack('<II8s', self.view[start:end]):
             # get dir info
             directory = Directory()
-            directory.lumpOffset = self.load_uint32(offset)
-            directory.lumpSize = self.load_uint32(offset + 4)
-            directory.lumpName = self.load_string(offset + 8, 8)
+            directory.lumpOffset = lumpOffset
+            directory.lumpSize = lumpSize
+            directory.lumpName = toString(lumpName)
             self.dirs.append(directory)
             # keep hashmap of directory name to its index
             self.dirMap[directory.lumpName] = len(self.dirs) - 1
 
+        # a map is a marker lump followed by its data lumps,
+        # index markers separately since names like THINGS
+        # repeat for every map and collide in dirMap
+        for i in range(0, len(self.dirs) - Map.Indices.THINGS):
+            if self.dirs[i + Map.Indices.THINGS].lumpName == "THINGS":
+                self.mapMarkers[self.dirs[i].lumpName] = i
+
+    # returns a zero copy view of a lump's bytes
+    def getLumpData(self, directory):
+        return self.view[directory.lumpOffset:directory.lumpOffset + directory.lumpSize]
+
+    def hasLump(self, lumpName):
+        return lumpName in self.dirMap
+
+    # view of the last lump with this name or None
+    def getLump(self, lumpName):
+        if lumpName not in self.dirMap:
+            return None
+        return self.getLumpData(self.dirs[self.dirMap[lumpName]])
+
+    # non empty lumps between any of the start and end markers,
+    # like the flats between F_START and F_END, as name -> view
+    # where later lumps replace earlier ones of the same name
+    def getLumpsBetween(self, startMarkers, endMarkers):
+        lumps = {}
+        inside = False
+        for directory in self.dirs:
+            if directory.lumpName in startMarkers:
+                inside = True
+            elif directory.lumpName in endMarkers:
+                inside = False
+            elif inside and directory.lumpSize > 0:
+                lumps[directory.lumpName] = self.getLumpData(directory)
+        return lumps
+
+    # palette, colormap, textures, flats and sprites, decoded
+    # on first use and shared by everything rendering from this WAD
+    def getGraphics(self):
+        if self.graphics is None:
+            self.graphics = Graphics(self)
+        return self.graphics
+
+    # names of all maps in this WAD in directory order
+    def getMapNames(self):
+        return list(self.mapMarkers.keys())
+
+    # indices of the lumps belonging to maps, WadStack
+    # leaves these out of its global lump index
+    def getMapLumpIndices(self):
+        mapLumpNames = ["THINGS", "LINEDEFS", "SIDEDEFS", "VERTEXES", "SEGS",\
+            "SSECTORS", "NODES", "SECTORS", "REJECT", "BLOCKMAP"]
+        indices = set()
+        for mapIndex in self.mapMarkers.values():
+            indices.add(mapIndex)
+            i = mapIndex + 1
+            while i < len(self.dirs) and self.dirs[i].lumpName in mapLumpNames:
+                indices.add(i)
+                i += 1
+        return indices
+
     # OBJECT LOADERS
     # objects are stored in lists in the WAD
-    # and these methods take a single object
-    # and create our map object
-    def readVertexData(self, offset):
+    # and these methods take the unpacked fields
+    # of a single object and create our map object
+    def readVertexData(self, fields):
         v = Vertex()
-        v.x = self.load_sshort(offset)
-        v.y = self.load_sshort(offset + 2)
+        v.x, v.y = fields
         return v
 
-    def readLinedefData(self, offset):
+    def readLinedefData(self, fields):
         l = Linedef()
-        l.startVertexID = self.load_ushort(offset)
-        l.endVertexID = self.load_ushort(offset + 2)
-        l.flags = self.load_ushort(offset + 4)
-        l.lineType = self.load_ushort(offset + 6)
-        l.sectorTag = self.load_ushort(offset + 8)
-        l.frontSidedefID = self.load_ushort(offset + 10)
-        l.backSidedefID = self.load_ushort(offset + 12)
+        l.startVertexID, l.endVertexID, l.flags, l.lineType, \
+            l.sectorTag, l.frontSidedefID, l.backSidedefID = fields
         return l
 
-    def readThingData(self, offset):
+    def readThingData(self, fields):
         t = Thing()
-        t.x = self.load_sshort(offset)
-        t.y = self.load_sshort(offset + 2)
-        t.angle = self.load_ushort(offset + 4)
-        t.type = self.load_ushort(offset + 6)
-        t.flags = self.load_ushort(offset + 8)
+        t.x, t.y, t.angle, t.type, t.flags = fields
         return t
 
-    def readNodeData(self, offset):
+    def readNodeData(self, fields):
         n = Node()
-        n.xPartition = self.load_sshort(offset)
-        n.yPartition = self.load_sshort(offset + 2)
-        n.xChangePartition = self.load_sshort(offset + 4)
-        n.yChangePartition = self.load_sshort(offset + 6)
-
-        n.frontBoxTop = self.load_sshort(offset + 8)
-        n.frontBoxBottom = self.load_sshort(offset + 10)
-        n.frontBoxLeft = self.load_sshort(offset + 12)
-        n.frontBoxRight = self.load_sshort(offset + 14)
-
-        n.backBoxTop = self.load_sshort(offset + 16)
-        n.backBoxBottom = self.load_sshort(offset + 18)
-        n.backBoxLeft = self.load_sshort(offset + 20)
-        n.backBoxRight = self.load_sshort(offset + 22)
-
-        n.frontChildID = self.load_ushort(offset + 24)
-        n.backChildID = self.load_ushort(offset + 26)
+        n.xPartition, n.yPartition, n.xChangePartition, n.yChangePartition, \
+            n.frontBoxTop, n.frontBoxBottom, n.frontBoxLeft, n.frontBoxRight, \
+            n.backBoxTop, n.backBoxBottom, n.backBoxLeft, n.backBoxRight, \
+            n.frontChildID, n.backChildID = fields
         return n
 
-    def readSubsectorData(self, offset):
+    def readSubsectorData(self, fields):
         ss = Subsector()
-        ss.segCount = self.load_ushort(offset)
-        ss.firstSegID = self.load_ushort(offset + 2)
+        ss.segCount, ss.firstSegID = fields
         return ss
 
-    def readSegData(self, offset):
+    def readSegData(self, fields):
         s = Seg()
-        s.startVertexID = self.load_ushort(offset)
-        s.endVertexID = self.load_ushort(offset + 2)
-        s.angle = self.load_ushort(offset + 4)
-        s.linedefID = self.load_ushort(offset + 6)
-        s.direction = self.load_ushort(offset + 8)
-        s.offset = self.load_ushort(offset + 10)
+        s.startVertexID, s.endVertexID, s.angle, s.linedefID, s.direction, s.offset = fields
         return s
 
-    def readSectorData(self, offset):
+    def readSectorData(self, fields):
         s = Sector()
-        s.floorHeight = self.load_sshort(offset)
-        s.ceilingHeight = self.load_sshort(offset + 2)
-        s.floorTexture = self.load_string(offset + 4, 8)
-        s.ceilingTexture = self.load_string(offset + 12, 8)
-        s.lightLevel = self.load_ushort(offset + 20)
-        s.type = self.load_ushort(offset + 22)
-        s.tag = self.load_ushort(offset + 24)
+        s.floorHeight = fields[0]
+        s.ceilingHeight = fields[1]
+        s.floorTexture = toString(fields[2])
+        s.ceilingTexture = toString(fields[3])
+        s.lightLevel = fields[4]
+        s.type = fields[5]
+        s.tag = fields[6]
         return s
 
-    def readSidedefData(self, offset):
+    def readSidedefData(self, fields):
         s = Sidedef()
-        s.xOffset = self.load_sshort(offset)
-        s.yOffset = self.load_sshort(offset + 2)
-        s.upperTexture = self.load_string(offset + 4, 8)
-        s.lowerTexture = self.load_string(offset + 12, 8)
-        s.middleTexture = self.load_string(offset + 20, 8)
-        s.sectorID = self.load_ushort(offset + 28)
+        s.xOffset = fields[0]
+        s.yOffset = fields[1]
+        s.upperTexture = toString(fields[2])
+        s.lowerTexture = toString(fields[3])
+        s.middleTexture = toString(fields[4])
+        s.sectorID = fields[5]
         return s
 
     def findMapIndex(self, map):
-        if map.name in self.dirMap:
-            return self.dirMap[map.name] # get index
+        if map.name in self.mapMarkers:
+            return self.mapMarkers[map.name] # get index
         return -1
 
     # LIST LOADER
     # Takes a pointer to a list location in
-    # the WAD and loads the data into the
-    # relevant map list
-    def readMapDataList(self, map, indexOffset, lumpName, byteSize, reader, mapList):
+    # the WAD and hands the lump bytes to the
+    # map, which keeps numpy views over them and
+    # builds the relevant objects on demand
+    def readMapDataList(self, map, indexOffset, lumpIndex, lumpName, itemClass, reader):
+        if indexOffset >= len(self.dirs):
+            return False
         directory = self.dirs[indexOffset]
         if directory.lumpName != lumpName:
             return False
 
-        count = int(directory.lumpSize / byteSize)
-        for i in range(0, count):
-            item = reader(directory.lumpOffset + i * byteSize)
-            mapList.append(item)
-
+        map.loadLump(lumpIndex, self.getLumpData(directory), itemClass, reader)
         return True
 
+    # which object class and reader builds each map lump
+    def getMapReaders(self):
+        return {
+            Map.Indices.VERTEXES: (Vertex, self.readVertexData),
+            Map.Indices.LINEDEFS: (Linedef, self.readLinedefData),
+            Map.Indices.THINGS: (Thing, self.readThingData),
+            Map.Indices.NODES: (Node, self.readNodeData),
+            Map.Indices.SSECTORS: (Subsector, self.readSubsectorData),
+            Map.Indices.SEGS: (Seg, self.readSegData),
+            Map.Indices.SECTORS: (Sector, self.readSectorData),
+            Map.Indices.SIDEDEFS: (Sidedef, self.readSidedefData),
+        }
+
+    def readOptionalMapLump(self, indexOffset, lumpName):
+        if indexOffset < len(self.dirs):
+            directory = self.dirs[indexOffset]
+            if directory.lumpName == lumpName:
+                return self.getLumpData(directory)
+        return b''
+
     def loadMapData(self, map):
         mapIndex = self.findMapIndex(map)
         if mapIndex == -1:
             return False
 
         # load map data
-        if self.readMapDataList(map, mapIndex + Map.Indices.VERTEXES, "VERTEXES", Vertex.sizeof(), self.readVertexData, map.vertices) is False:
-            print("ERROR: Failed to load map vertices " + map.name)
-            return False
-        if self.readMapDataList(map, mapIndex + Map.Indices.LINEDEFS, "LINEDEFS", Linedef.sizeof(), self.readLinedefData, map.linedefs) is False:
-            print("ERROR: Failed to load map linedefs " + map.name)
-            return False
-        if self.readMapDataList(map, mapIndex + Map.Indices.THINGS, "THINGS", Thing.sizeof(), self.readThingData, map.things) is False:
-            print("ERROR: Failed to load map things " + map.name)
-            return False
-        if self.readMapDataList(map, mapIndex + Map.Indices.NODES, "NODES", Node.sizeof(), self.readNodeData, map.nodes) is False:
-            print("ERROR: Failed to load map nodes " + map.name)
-            return False
-        if self.readMapDataList(map, mapIndex + Map.Indices.SSECTORS, "SSECTORS", Subsector.sizeof(), self.readSubsectorData, map.subsectors) is False:
-            print("ERROR: Failed to load map subsectors " + map.name)
-            return False
-        if self.readMapDataList(map, mapIndex + Map.Indices.SEGS, "SEGS", Seg.sizeof(), self.readSegData, map.segs) is False:
-            print("ERROR: Failed to load map segs " + map.name)
-            return False
-        if self.readMapDataList(map, mapIndex + Map.Indices.SECTORS, "SECTORS", Sector.sizeof(), self.readSectorData, map.sectors) is False:
-            print("ERROR: Failed to load map sectors " + map.name)
-            return False
-        if self.readMapDataList(map, mapIndex + Map.Indices.SIDEDEFS, "SIDEDEFS", Sidedef.sizeof(), self.readSidedefData, map.sidedefs) is False:
-            print("ERROR: Failed to load map sidedefs " + map.name)
-            return False
+        lists = [
+            (Map.Indices.VERTEXES, "VERTEXES", "vertices"),
+            (Map.Indices.LINEDEFS, "LINEDEFS", "linedefs"),
+            (Map.Indices.THINGS, "THINGS", "things"),
+            (Map.Indices.NODES, "NODES", "nodes"),
+            (Map.Indices.SSECTORS, "SSECTORS", "subsectors"),
+            (Map.Indices.SEGS, "SEGS", "segs"),
+            (Map.Indices.SECTORS, "SECTORS", "sectors"),
+            (Map.Indices.SIDEDEFS, "SIDEDEFS", "sidedefs"),
+        ]
+        readers = self.getMapReaders()
+        for lumpIndex, lumpName, label in lists:
+            itemClass, reader = readers[lumpIndex]
+            if self.readMapDataList(map, mapIndex + lumpIndex, lumpIndex, lumpName, itemClass, reader) is False:
+                print("ERROR: Failed to load map " + label + " " + map.name)
+                return False
+
+        # optional lumps, an empty REJECT sees everything and
+        # an empty BLOCKMAP is rebuilt from the linedefs
+        map.loadReject(self.readOptionalMapLump(mapIndex + Map.Indices.REJECT, "REJECT"))
+        map.loadBlockmap(self.readOptionalMapLump(mapIndex + Map.Indices.BLOCKMAP, "BLOCKMAP"))
 
         # run some helpers to define the map
         map.createData()
@@ -212,36 +296,48 @@ class WAD(object):
     def loadMap(self, mapName):
         map = Map()
         map.name = mapName
+
+        # reuse a preprocessed copy of this map if
+        # we built one from this exact WAD before
+        wadName = os.path.basename(self.wadpath)
+        if self.cache is not None:
+            data = self.cache.load(wadName, self.getHash(), mapName)
+            if data is not None:
+                map.importData(data, self.getMapReaders())
+                return map
+
         if self.loadMapData(map):
+            if self.cache is not None:
+                self.cache.save(wadName, self.getHash(), mapName, map.exportData())
             return map
         return None
 
+    # loads every map in the WAD, with workers > 1 each
+    # map is parsed in its own process
+    def loadAllMaps(self, workers=None):
+        jobs = [(self, mapName) for mapName in self.getMapNames()]
+        return loadMaps(jobs, self.getMapReaders(), workers)
+
+    # folder this WAD caches its maps in, None without a cache
+    def getCacheDir(self):
+        if self.cache is None:
+            return None
+        return self.cache.cacheDir
+
     # DATA TYPE LOADERS
     # Gets raw byte data from WAD
     # in expected format
     def load_string(self, offset, length, preserveNull = False):
-        self.f.seek(offset)
-        sss = ''
-        for i in range(0, length):
-            c = struct.unpack('<c', self.f.read(1))[0]
-            if ord(c) != 0:
-                sss += str(c, 'ascii')
-        return sss
+        return toString(self.data[offset:offset + length])
 
     def load_sshort(self, offset):
-        self.f.seek(offset)
-        f = self.f.read(2)
-        return struct.unpack('<h', f)[0]
+        return struct.unpack_from('<h', self.data, offset)[0]
 
     def load_ushort(self, offset):
-        self.f.seek(offset)
-        f = self.f.read(2)
-        return struct.unpack('<H', f)[0]
+        return struct.unpack_from('<H', self.data, offset)[0]
 
     def load_uint32(self, offset):
-        self.f.seek(offset)
-        f = self.f.read(4)
-        return struct.unpack('<I', f)[0]
+        return struct.unpack_from('<I', self.data, offset)[0]
 
     def info(self, dirs=False):
         wad = "\
@@ -272,3 +368,51 @@ class Directory(object):
             " size ......... {}\n" + \
             " name ......... {}\n"\
         ).format(self.lumpOffset, self.lumpSize, self.lumpName)
+
+
+# char[] fields are null padded, drop the
+# padding and decode the rest as ascii
+def toString(raw):
+    return bytes(raw).replace(b'\x00', b'').decode('ascii')
+
+
+# Loads (wad, mapName) jobs and returns an ordered dict of map
+# name to Map, each map cached beside the open WAD it comes
+# from. One worker loads through the open WADs, with more every
+# map is parsed in a process pool and sent back as the plain
+# arrays of Map.exportData, which the parent rebuilds without
+# reparsing. The parent hashes each WAD once for all its jobs
+def loadMaps(jobs, readers, workers=None):
+    maps = {}
+    if workers is not None and workers <= 1:
+        for wad, mapName in jobs:
+            maps[mapName] = wad.loadMap(mapName)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for wad, mapName in jobs:
+                wadHash = wad.getHash() if wad.cache is not None else None
+                futures.append(executor.submit(exportMapData, wad.wadpath, mapName, wad.getCacheDir(), wadHash))
+            for future in futures:
+                mapName, data = future.result()
+                map = None
+                if data is not None:
+                    map = Map()
+                    map.name = mapName
+                    map.importData(data, readers)
+                maps[mapName] = map
+    return maps
+
+# process pool entry point, must stay at module level
+# so it can be pickled. cacheDir None loads without a cache,
+# wadHash is the parent's hash of the WAD
+def exportMapData(wadpath, mapName, cacheDir, wadHash):
+    wad = WAD(wadpath, cacheDir is not None, cacheDir)
+    wad.hash = wadHash
+    try:
+        map = wad.loadMap(mapName)
+        if map is None:
+            return mapName, None
+        return mapName, map.exportData()
+    finally:
+        wad.close()
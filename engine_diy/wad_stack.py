@@ -0,0 +1,84 @@
+from engine_diy.wad import WAD, loadMaps
+from engine_diy.graphics import Graphics
+
+# A stack of WAD files searched like doom's -file
+#
+# The first path is normally the IWAD and every path after it
+# a PWAD layered on top. Lumps and maps resolve to the last
+# WAD in load order that defines them
+#
+# Only headers and directories are read when a WAD is added,
+# lump bodies stay in each WAD's memory map until asked for
+
+class WadStack(object):
+
+    def __init__(self, wadpaths, useCache=True, cacheDir=None):
+        self.useCache = useCache
+        self.cacheDir = cacheDir
+        self.wads = []
+        self.lumpIndex = {} # lump name -> (wad, directory index)
+        self.mapIndex = {} # map name -> wad
+        self.graphics = None
+        for wadpath in wadpaths:
+            self.addWad(wadpath)
+
+    def addWad(self, wadpath):
+        wad = WAD(wadpath, self.useCache, self.cacheDir)
+        self.wads.append(wad)
+        # map lumps repeat per map so keep them out of the
+        # global index, maps are found through mapIndex
+        mapLumps = wad.getMapLumpIndices()
+        for i, directory in enumerate(wad.dirs):
+            if i not in mapLumps:
+                self.lumpIndex[directory.lumpName] = (wad, i)
+        for mapName in wad.getMapNames():
+            self.mapIndex[mapName] = wad
+        return wad
+
+    def close(self):
+        for wad in self.wads:
+            wad.close()
+
+    def hasLump(self, lumpName):
+        return lumpName in self.lumpIndex
+
+    # view of the winning lump with this name or None
+    def getLump(self, lumpName):
+        if lumpName not in self.lumpIndex:
+            return None
+        wad, i = self.lumpIndex[lumpName]
+        return wad.getLumpData(wad.dirs[i])
+
+    # WAD that provides a lump, useful for debugging mods
+    def getLumpSource(self, lumpName):
+        if lumpName not in self.lumpIndex:
+            return None
+        return self.lumpIndex[lumpName][0]
+
+    # marker ranges merged over the stack so a PWAD's flats
+    # join and replace the IWAD's, see WAD.getLumpsBetween
+    def getLumpsBetween(self, startMarkers, endMarkers):
+        lumps = {}
+        for wad in self.wads:
+            lumps.update(wad.getLumpsBetween(startMarkers, endMarkers))
+        return lumps
+
+    # see WAD.getGraphics
+    def getGraphics(self):
+        if self.graphics is None:
+            self.graphics = Graphics(self)
+        return self.graphics
+
+    def getMapNames(self):
+        return list(self.mapIndex.keys())
+
+    def loadMap(self, mapName):
+        if mapName not in self.mapIndex:
+            return None
+        return self.mapIndex[mapName].loadMap(mapName)
+
+    # loads every map the stack resolves, see WAD.loadAllMaps
+    def loadAllMaps(self, workers=None):
+        # every map caches beside the WAD it comes from, as loadMap does
+        jobs = [(wad, mapName) for mapName, wad in self.mapIndex.items()]
+        return loadMaps(jobs, self.wads[0].getMapReaders(), workers)
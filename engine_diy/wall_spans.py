@@ -0,0 +1,104 @@
+import numpy as np
+
+# Per column heights of one wall fragment [x1, x2] in one go
+#
+# The portal renderers step the ceiling, floor, upper and lower
+# heights of a seg a column at a time and clamp each column
+# against the ceiling and floor clip arrays. WallSpans does the
+# same for the whole fragment with numpy on slices of the clip
+# arrays and writes the updated slices back, giving the very
+# same values as the scalar loop:
+#   heights are stepped with a sequential add like +=, not
+#   start + i * step, so rounding matches column for column
+#   upper and lower heights only step on columns that are not
+#   fully clipped, as the scalar draw sections do
+#
+# Results only hold the columns left visible, as lists for the
+# draw loops
+#   xs                      screen x of each visible column
+#   ceilingEnd, floorStart  middle section or upper/lower limits
+#   upper, upperDrawn       bottom of the upper section, drawn if
+#                           it is at or under ceilingEnd
+#   lower, lowerDrawn       top of the lower section, drawn if it
+#                           is at or over floorStart
+
+class WallSpans(object):
+
+    # numpy's call overhead outweighs the scalar loop on narrow
+    # fragments, renderers keep stepping those column by column
+    MINCOLUMNS = 48
+
+    # RD is the FrameRenderData of the seg, the clip arrays are
+    # the renderer's lists and are updated in place
+    def __init__(self, RD, x1, x2, portal, ceilingClip, floorClip, fullHeight):
+        self.xs = []
+        self.ceilingEnd = []
+        self.floorStart = []
+        self.upper = []
+        self.upperDrawn = []
+        self.lower = []
+        self.lowerDrawn = []
+        count = x2 - x1 + 1
+        if count <= 0:
+            return
+
+        ceilingClips = np.array(ceilingClip[x1:x2 + 1], dtype=np.float64)
+        floorClips = np.array(floorClip[x1:x2 + 1], dtype=np.float64)
+
+        # int() of the stepped heights, then validateRange
+        ceilingEnd = np.trunc(WallSpans.steps(RD.f_ceilingEnd, RD.f_ceilingStep, count))
+        floorStart = np.trunc(WallSpans.steps(RD.f_floorStart, RD.f_floorStep, count))
+        ceilingEnd = np.maximum(ceilingEnd, ceilingClips + 1)
+        floorStart = np.where(floorStart >= floorClips, floorClips - 1, floorStart)
+        visible = np.flatnonzero(ceilingEnd <= floorStart)
+        if len(visible) == 0:
+            return
+        ceilingEnd = ceilingEnd[visible]
+        floorStart = floorStart[visible]
+
+        if portal:
+            # upper section, clamped by the floor clip. Without one
+            # the clip only moves when the ceiling plane is marked
+            ceilings = ceilingClips[visible]
+            if RD.b_updateCeiling:
+                ceilings = ceilingEnd - 1
+            if RD.b_drawUpperSection:
+                floors = floorClips[visible]
+                upper = WallSpans.steps(RD.i_upperHeight, RD.f_upperHeightStep, len(visible))
+                upper = np.where(upper >= floors, floors - 1, upper)
+                upperDrawn = upper >= ceilingEnd
+                ceilings = np.where(upperDrawn, upper, ceilingEnd - 1)
+                self.upper = upper.tolist()
+                self.upperDrawn = upperDrawn.tolist()
+            ceilingClips[visible] = ceilings
+
+            # lower section, clamped by the ceiling clip just set
+            floors = floorClips[visible]
+            if RD.b_updateFloor:
+                floors = floorStart + 1
+            if RD.b_drawLowerSection:
+                lower = WallSpans.steps(RD.i_lowerHeight, RD.f_lowerHeightStep, len(visible))
+                lower = np.where(lower <= ceilings, ceilings + 1, lower)
+                lowerDrawn = lower <= floorStart
+                floors = np.where(lowerDrawn, lower, floorStart + 1)
+                self.lower = lower.tolist()
+                self.lowerDrawn = lowerDrawn.tolist()
+            floorClips[visible] = floors
+        else:
+            # solid walls fully clip their columns
+            ceilingClips[visible] = fullHeight
+            floorClips[visible] = -1
+
+        ceilingClip[x1:x2 + 1] = ceilingClips.tolist()
+        floorClip[x1:x2 + 1] = floorClips.tolist()
+        self.xs = (visible + x1).tolist()
+        self.ceilingEnd = ceilingEnd.tolist()
+        self.floorStart = floorStart.tolist()
+
+    # start, start + step, ... added up one by one like the
+    # scalar loop's += so every value rounds the same way
+    @staticmethod
+    def steps(start, step, count):
+        values = np.full(count, step, dtype=np.float64)
+        values[0] = start
+        return np.add.accumulate(values)
@@ -1,5 +1,6 @@
 import sys, engine_diy, pygame, random, math
 from engine_diy.wad import WAD
+from engine_diy.wad_stack import WadStack
 from engine_diy.game2d import Game2D
 from engine_diy.map import *
 from engine_diy.player import Player
@@ -65,6 +66,25 @@ def drawSubsector(subsectorId, rgba=None):
         ex, ey = pl.ot(endVertex.x, endVertex.y)
         game.drawLine([sx,sy], [ex,ey], rgba, 2)
 
+# static automap layers are compiled once into display lists
+# and only rebuilt when the map or the plot's zoom/pan changes
+def automapKey():
+    return (id(map), pl.scale, pl.xoff, pl.yoff)
+
+def drawLinedefs():
+    for i, ld in enumerate(map.linedefs):
+        start = map.vertices[ld.startVertexID]
+        end = map.vertices[ld.endVertexID]
+        # map is in cartesian, flip to screen y
+        sx, sy = pl.ot(start.x, start.y)
+        ex, ey = pl.ot(end.x, end.y)
+        # draw the line
+        game.drawLine([sx, sy], [ex, ey], (1,1,1,1), 1)
+
+def drawAllNodes():
+    for i, n in enumerate(map.nodes):
+        drawNode(game, n)
+
 def drawPlayer(game, pl, player, rgba=(0,1,0,1)):
     px, py = pl.ot(player.x, player.y)
     # player pointer
@@ -91,8 +111,11 @@ if len(sys.argv) > 2:
 else:
     mapname = "E1M1"
 
-# load WAD
-wad = WAD(path)
+# load WAD, any further paths are PWADs layered over it
+if len(sys.argv) > 3:
+    wad = WadStack([path] + sys.argv[3:])
+else:
+    wad = WAD(path)
 
 # choose a map
 map = wad.loadMap(mapname)
@@ -121,6 +144,7 @@ fpsWinHeight = 200
 fpsWinOffX = 20
 fpsWinOffY = 20
 fpsRenderer = FpsRenderer(map, player, game, fov, fpsWinWidth, fpsWinHeight, fpsWinOffX, fpsWinOffY)
+fpsRenderer.graphics = wad.getGraphics()
 
 # render helpers
 mode = 0
@@ -143,23 +167,19 @@ def on_right():
 game.onKeyHold(pygame.K_RIGHT, on_right)
 def on_w():
     global player
-    player.x += player.angle.getCos() * 5
-    player.y += player.angle.getSin() * 5
+    player.move(map, player.angle.getCos() * 5, player.angle.getSin() * 5)
 game.onKeyHold(pygame.K_w, on_w)
 def on_s():
     global player
-    player.x -= player.angle.getCos() * 5
-    player.y -= player.angle.getSin() * 5
+    player.move(map, -player.angle.getCos() * 5, -player.angle.getSin() * 5)
 game.onKeyHold(pygame.K_s, on_s)
 def on_a():
     global player
-    player.x += player.angle.addF(90).getCos() * 5
-    player.y += player.angle.addF(90).getSin() * 5
+    player.move(map, player.angle.addF(90).getCos() * 5, player.angle.addF(90).getSin() * 5)
 game.onKeyHold(pygame.K_a, on_a)
 def on_d():
     global player
-    player.x -= player.angle.addF(90).getCos() * 5
-    player.y -= player.angle.addF(90).getSin() * 5
+    player.move(map, -player.angle.addF(90).getCos() * 5, -player.angle.addF(90).getSin() * 5)
 game.onKeyHold(pygame.K_d, on_d)
 def on_z():
     global player
@@ -174,6 +194,26 @@ def on_space():
     player.x = 1291
     player.y = -3011
 game.onKeyUp(pygame.K_SPACE, on_space)
+def on_b():
+    # bsp walk counts of the last rendered frame
+    print(map.bspStats)
+game.onKeyUp(pygame.K_b, on_b)
+def on_f():
+    # toggle drawing the fps view into a software framebuffer
+    fpsRenderer.useFramebuffer(fpsRenderer.framebuffer is None)
+game.onKeyUp(pygame.K_f, on_f)
+def on_p():
+    # toggle floors and ceilings of the portal modes
+    fpsRenderer.drawPlanes = not fpsRenderer.drawPlanes
+game.onKeyUp(pygame.K_p, on_p)
+def on_t():
+    # toggle textured walls in doomhistory
+    fpsRenderer.doomhistory_textured = not fpsRenderer.doomhistory_textured
+game.onKeyUp(pygame.K_t, on_t)
+def on_o():
+    # toggle things in doomhistory
+    fpsRenderer.drawSprites = not fpsRenderer.drawSprites
+game.onKeyUp(pygame.K_o, on_o)
 
 
 ###############
@@ -194,15 +234,8 @@ while True:
     # draw
     game.drawStart()
 
-    # loop over linedefs
-    for i, ld in enumerate(map.linedefs):
-        start = map.vertices[ld.startVertexID]
-        end = map.vertices[ld.endVertexID]
-        # map is in cartesian, flip to screen y
-        sx, sy = pl.ot(start.x, start.y)
-        ex, ey = pl.ot(end.x, end.y)
-        # draw the line
-        game.drawLine([sx, sy], [ex, ey], (1,1,1,1), 1)
+    # linedefs
+    game.drawCached("linedefs", automapKey(), drawLinedefs)
 
     # MODE LOOPS
     game.setFPS(60)
@@ -223,8 +256,7 @@ while True:
 
     # RENDER ALL NODE BSP BOXES
     if mode == 3:
-        for i, n in enumerate(map.nodes):
-            drawNode(game, n)
+        game.drawCached("nodes", automapKey(), drawAllNodes)
 
     # RENDER SUBSECTORS VIA BSP TRAVERSAL
     if mode == 4:
@@ -0,0 +1,87 @@
+import sys, time
+import numpy as np
+from engine_diy.wad import WAD
+from engine_diy.wad_stack import WadStack
+from engine_diy.headless import HeadlessGame
+from engine_diy.player import Player
+from engine_diy.fps_renderer import FpsRenderer
+
+# Renders the fps view without a window for benchmarks and CI
+#
+# usage: python main_headless.py [wad] [map] [mode] [frames] [out.ppm] [pwads...]
+#   mode    edges, wallcull, wolfenstein, doomsolids,
+#           doomportals or doomhistory (default)
+#   frames  the player turns a full circle over the frames
+#   out.ppm optional image of the last frame, "-" for none
+
+
+#############
+## HELPERS ##
+#############
+#############
+
+MODES = ["edges", "wallcull", "wolfenstein", "doomsolids", "doomportals", "doomhistory"]
+
+# binary ppm needs no image library
+def savePPM(path, pixels):
+    height, width = pixels.shape[0], pixels.shape[1]
+    with open(path, 'wb') as f:
+        f.write("P6 {} {} 255\n".format(width, height).encode('ascii'))
+        f.write(np.ascontiguousarray(pixels[:, :, :3]).tobytes())
+
+
+#############
+##  START  ##
+#############
+#############
+
+path = sys.argv[1] if len(sys.argv) > 1 else "wads/DOOM.WAD"
+mapname = sys.argv[2] if len(sys.argv) > 2 else "E1M1"
+mode = sys.argv[3] if len(sys.argv) > 3 else "doomhistory"
+frames = int(sys.argv[4]) if len(sys.argv) > 4 else 36
+outPath = sys.argv[5] if len(sys.argv) > 5 else "-"
+if mode not in MODES:
+    print("ERROR: invalid mode {}, one of {}".format(mode, ", ".join(MODES)))
+    quit()
+
+# load WAD, any further paths are PWADs layered over it
+if len(sys.argv) > 6:
+    wad = WadStack([path] + sys.argv[6:])
+else:
+    wad = WAD(path)
+
+map = wad.loadMap(mapname)
+if map == None:
+    print("ERROR: invalid map {}".format(mapname))
+    quit()
+
+player = Player()
+player.id = 1
+player.setPosition(map.playerThing.x, map.playerThing.y)
+player.setAngle(map.playerThing.angle)
+player.setSector(map.getSectorAtPosition(player.x, player.y))
+
+game = HeadlessGame()
+game.setupWindow(360, 240)
+fpsRenderer = FpsRenderer(map, player, game, 90, 320, 200, 20, 20)
+fpsRenderer.graphics = wad.getGraphics()
+
+
+###############
+## GAME LOOP ##
+###############
+###############
+
+renderTime = 0
+for frame in range(frames):
+    game.drawStart()
+    start = time.perf_counter()
+    getattr(fpsRenderer, mode + "_render")()
+    renderTime += time.perf_counter() - start
+    game.drawEnd()
+    player.angle.iaddF(360 / frames)
+
+print("{} {} {}: {} frames, {:.2f} ms/frame".format(path, mapname, mode, frames, renderTime / max(frames, 1) * 1000))
+print(map.bspStats)
+if outPath != "-":
+    savePPM(outPath, game.getPixels())
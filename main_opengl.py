@@ -261,16 +261,31 @@ def drawLine(start, end, width, r, g, b, a):
     glVertex2f(end[0], end[1])
     glEnd()
 
+# unit circle display lists by segment count, built on first use
+circleLists = {}
+def getCircleList(radius):
+    # enough segments for edges about 2 pixels long, rounded to a
+    # multiple of 4 so nearby radii share a list
+    segments = min(max(int(math.ceil(math.pi * radius / 4)) * 4, 8), 128)
+    if segments not in circleLists:
+        circleLists[segments] = glGenLists(1)
+        glNewList(circleLists[segments], GL_COMPILE)
+        glBegin(GL_TRIANGLE_FAN)
+        glVertex2f(0, 0)
+        for i in range(0, segments + 1):
+            angle = i * 2 * math.pi / segments
+            glVertex2f(math.cos(angle), math.sin(angle))
+        glEnd()
+        glEndList()
+    return circleLists[segments]
+
 def drawPoint(pos, radius, r, g, b, a):
     glColor4f(r, g, b, a)
-    glBegin(GL_TRIANGLE_FAN)
-    glVertex2f(pos[0], pos[1]);
-    for angle in range(10, 3610, 2):
-        angle = angle / 10 # convert back down to degrees
-        x2 = pos[0] + math.sin(angle) * radius;
-        y2 = pos[1] + math.cos(angle) * radius;
-        glVertex2f(x2, y2);
-    glEnd()
+    glPushMatrix()
+    glTranslatef(pos[0], pos[1], 0)
+    glScalef(radius, radius, 1)
+    glCallList(getCircleList(radius))
+    glPopMatrix()
 
 def drawHud(offsetX, offsetY, width, height, mode, camera, allLineDefs, walls):
     # wall lines